@@ -0,0 +1,93 @@
+"""
+Script: dashboard_aggs.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose:
+Aggregations behind the dashboard page.
+All dashboard numbers come from one size-0 search with several aggregations, so they are exact for any
+time range instead of being computed in pandas on the first few thousand documents:
+- over_time       date_histogram on @timestamp (hourly up to a week, then daily, then weekly)
+- top_source_ips  terms on source_ip
+- score_hist      histogram on model_score
+- feedback        filters per feedback label
+- avg_score / unique_source_ips / total hits for the metrics row
+"""
+
+from datetime import datetime, timedelta, timezone
+
+SCORE_BUCKET = 0.05
+TOP_IPS = 10
+
+FEEDBACK_FILTERS = {
+    "correct": {"term": {"user_feedback.keyword": "correct"}},
+    "incorrect": {"term": {"user_feedback.keyword": "incorrect"}},
+    "unknown": {"bool": {"should": [
+        {"term": {"user_feedback.keyword": "unknown"}},
+        {"bool": {"must_not": {"exists": {"field": "user_feedback"}}}},
+    ]}},
+}
+
+
+def pick_interval(start_time, end_time):
+    """Histogram bucket width that keeps the chart readable: at most a few hundred bars."""
+    span = end_time - start_time
+    if span <= timedelta(days=7):
+        return timedelta(hours=1)
+    if span <= timedelta(days=120):
+        return timedelta(days=1)
+    return timedelta(days=7)
+
+
+def _fixed_interval(interval):
+    hours = int(interval.total_seconds() // 3600)
+    return f"{hours}h" if hours < 24 else f"{hours // 24}d"
+
+
+def build_dashboard_query(start_time, end_time, min_score=0.0, only_with_feedback=False, interval=None):
+    """One search body with every aggregation the dashboard shows."""
+    interval = interval or pick_interval(start_time, end_time)
+    must = [{"range": {"@timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}]
+    must.append({"range": {"model_score": {"gte": min_score}}})
+    if only_with_feedback:
+        must.append({"exists": {"field": "user_feedback"}})
+
+    return {
+        "size": 0,
+        "track_total_hits": True,
+        "query": {"bool": {"must": must}},
+        "aggs": {
+            "over_time": {"date_histogram": {
+                "field": "@timestamp", "fixed_interval": _fixed_interval(interval), "min_doc_count": 0,
+                "extended_bounds": {"min": start_time.isoformat(), "max": end_time.isoformat()},
+            }},
+            "top_source_ips": {"terms": {"field": "source_ip.keyword", "size": TOP_IPS}},
+            "score_hist": {"histogram": {
+                "field": "model_score", "interval": SCORE_BUCKET, "min_doc_count": 0,
+                "extended_bounds": {"min": 0, "max": 1 - SCORE_BUCKET},
+            }},
+            "feedback": {"filters": {"filters": FEEDBACK_FILTERS}},
+            "avg_score": {"avg": {"field": "model_score"}},
+            "unique_source_ips": {"cardinality": {"field": "source_ip.keyword"}},
+        },
+    }
+
+
+def parse_dashboard_response(response):
+    """Plain lists and numbers for the charts."""
+    aggs = response["aggregations"]
+    total = response["hits"]["total"]
+    return {
+        "total": total["value"] if isinstance(total, dict) else total,
+        "took_ms": response.get("took"),
+        "avg_score": aggs["avg_score"]["value"],
+        "unique_source_ips": aggs["unique_source_ips"]["value"],
+        "over_time": [
+            {"time": datetime.fromtimestamp(b["key"] / 1000, tz=timezone.utc), "count": b["doc_count"]}
+            for b in aggs["over_time"]["buckets"]
+        ],
+        "top_source_ips": [{"source_ip": b["key"], "count": b["doc_count"]} for b in aggs["top_source_ips"]["buckets"]],
+        "score_hist": [{"score": round(b["key"], 2), "count": b["doc_count"]} for b in aggs["score_hist"]["buckets"]],
+        "feedback": [{"Feedback": label, "Count": b["doc_count"]}
+                     for label, b in aggs["feedback"]["buckets"].items() if b["doc_count"]],
+    }
@@ -0,0 +1,160 @@
+"""
+Script: diagnostics.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose:
+Performance diagnostics for the review app, shown when the reviewer turns them on.
+For every rerun it records:
+- each Elasticsearch call: query body, server-side took, round-trip time, hit count and response size,
+- time spent in the phases of the page (grouping, rendering, ...),
+- query cache hits and misses.
+The last reruns are kept per session. A search slower than the profile threshold can be run a
+second time with "profile": true to see which query clauses cost the time.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+MAX_RERUNS = 20
+SLOW_QUERY_MS = 1000
+MAX_BODY_CHARS = 5000
+
+
+def _to_dict(response):
+    # The 8.x client returns ObjectApiResponse; .body is the plain dict
+    return getattr(response, "body", response)
+
+
+def profile_summary(profile, top_n=5):
+    """Most expensive query clauses over all shards of a profiled search."""
+    nodes = []
+
+    def walk(node):
+        nodes.append({"type": node.get("type"), "description": (node.get("description") or "")[:200],
+                      "time_ms": round(node.get("time_in_nanos", 0) / 1e6, 2)})
+        for child in node.get("children", []):
+            walk(child)
+
+    for shard in profile.get("shards", []):
+        for search in shard.get("searches", []):
+            for node in search.get("query", []):
+                walk(node)
+    nodes.sort(key=lambda n: n["time_ms"], reverse=True)
+    return nodes[:top_n]
+
+
+class Diagnostics:
+    """Per-session recorder. start_rerun() at the top of the page, finish_rerun() at the bottom."""
+
+    def __init__(self, max_reruns=MAX_RERUNS, slow_query_ms=SLOW_QUERY_MS, profile_slow=False):
+        self.reruns = deque(maxlen=max_reruns)
+        self.current = None
+        self.slow_query_ms = slow_query_ms
+        self.profile_slow = profile_slow
+        self._lock = threading.Lock()
+        # Elasticsearch time per thread, so a phase can leave out the calls it made itself
+        self._local = threading.local()
+
+    def start_rerun(self):
+        # A rerun cut short by st.rerun() never reached finish_rerun(); keep it, marked as interrupted
+        if self.current is not None:
+            self.current["interrupted"] = True
+            self.finish_rerun()
+        self.current = {"started_at": time.time(), "_start": time.perf_counter(), "queries": [],
+                        "phases": {}, "cache_hits": 0, "cache_misses": 0, "interrupted": False}
+        return self.current
+
+    def finish_rerun(self):
+        rerun, self.current = self.current, None
+        if rerun is None:
+            return None
+        rerun["total_ms"] = round((time.perf_counter() - rerun.pop("_start")) * 1000, 1)
+        with self._lock:
+            queries = list(rerun["queries"])
+        rerun["es_ms"] = round(sum(q["round_trip_ms"] for q in queries), 1)
+        rerun["es_took_ms"] = sum(q["took_ms"] or 0 for q in queries)
+        rerun["payload_bytes"] = sum(q["payload_bytes"] for q in queries)
+        self.reruns.append(rerun)
+        return rerun
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block of the page, without the Elasticsearch calls made inside it (those are listed apart)."""
+        start = time.perf_counter()
+        es_start = getattr(self._local, "es_ms", 0.0)
+        try:
+            yield
+        finally:
+            if self.current is not None:
+                es_ms = getattr(self._local, "es_ms", 0.0) - es_start
+                elapsed = (time.perf_counter() - start) * 1000 - es_ms
+                self.current["phases"][name] = round(self.current["phases"].get(name, 0) + elapsed, 1)
+
+    def cache_lookup(self, hit):
+        if self.current is not None:
+            self.current["cache_hits" if hit else "cache_misses"] += 1
+
+    def record(self, operation, index, body, response, round_trip_ms):
+        self._local.es_ms = getattr(self._local, "es_ms", 0.0) + round_trip_ms
+        if self.current is None:
+            return None
+        response = _to_dict(response) or {}
+        hits = response.get("hits", {})
+        total = hits.get("total")
+        entry = {
+            "operation": operation,
+            "index": index,
+            "body": json.dumps(body, default=str)[:MAX_BODY_CHARS] if body is not None else None,
+            "took_ms": response.get("took"),
+            "round_trip_ms": round(round_trip_ms, 1),
+            "hits": len(hits.get("hits", [])) if hits else (1 if response.get("found") else 0),
+            "total_hits": total.get("value") if isinstance(total, dict) else total,
+            "payload_bytes": len(json.dumps(response, default=str)),
+            "profile": None,
+        }
+        with self._lock:
+            self.current["queries"].append(entry)
+        return entry
+
+
+class InstrumentedES:
+    """Wraps the Elasticsearch client; search and get calls are timed and recorded, the rest passes through."""
+
+    def __init__(self, es, diagnostics):
+        self._es = es
+        self._diagnostics = diagnostics
+
+    def __getattr__(self, name):
+        return getattr(self._es, name)
+
+    def search(self, **params):
+        start = time.perf_counter()
+        response = self._es.search(**params)
+        round_trip_ms = (time.perf_counter() - start) * 1000
+        # Callers pass either index + body or the request as keyword arguments (PIT searches)
+        request = params.get("body") or {k: v for k, v in params.items() if k != "index"}
+        entry = self._diagnostics.record("search", params.get("index"), request, response, round_trip_ms)
+        if entry and self._diagnostics.profile_slow and round_trip_ms >= self._diagnostics.slow_query_ms:
+            entry["profile"] = self._profile(params)
+        return response
+
+    def get(self, index, id, **params):
+        start = time.perf_counter()
+        response = self._es.get(index=index, id=id, **params)
+        self._diagnostics.record("get", index, {"id": id}, response, (time.perf_counter() - start) * 1000)
+        return response
+
+    def _profile(self, params):
+        """Run the same search again with the profile API; costs one extra search, so only for slow ones."""
+        try:
+            if "body" in params:
+                response = self._es.search(**{**params, "body": {**params["body"], "profile": True}})
+            else:
+                response = self._es.search(**params, profile=True)
+            return profile_summary(_to_dict(response).get("profile", {}))
+        except Exception as e:
+            return [{"type": "error", "description": str(e), "time_ms": None}]
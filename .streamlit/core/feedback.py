@@ -0,0 +1,149 @@
+"""
+Script: feedback.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose:
+Bulk feedback writes for the review app.
+Every feedback click on a group becomes one bulk request instead of one update per document.
+The request is only split when it passes the client's max_chunk_bytes (100 MB, ~500k updates).
+False negatives are promoted with index + update pairs in the same request.
+
+Writes can optionally go through a background write-behind queue (FeedbackWriter)
+so the UI returns immediately. Each write reports its latency and any failed items.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from elasticsearch.helpers import bulk
+
+# Reviewer choice -> user_feedback value the retraining export reads
+FEEDBACK_LABELS = {"suspicious": "correct", "normal": "incorrect"}
+
+
+# One partial update per document with the reviewer label
+def build_feedback_actions(items, index_name, user_feedback, feedback_time):
+    if user_feedback not in FEEDBACK_LABELS.values():
+        raise ValueError(f"Unknown feedback label: {user_feedback}")
+    return [
+        {
+            "_op_type": "update",
+            "_index": index_name,
+            "_id": doc_id,
+            "doc": {"user_feedback": user_feedback, "reviewed": True, "feedback_timestamp": feedback_time},
+        }
+        for doc_id, _ in items
+    ]
+
+
+# Copy missed anomalies into the anomaly index and label the original log
+def build_promotion_actions(items, anomaly_index, all_logs_index, feedback_time):
+    actions = []
+    for doc_id, log in items:
+        source = {k: v for k, v in log.items() if not k.startswith("_")}
+        actions.append({
+            "_op_type": "index",
+            "_index": anomaly_index,
+            "_source": {**source, "user_feedback": "correct", "reviewed": True, "feedback_timestamp": feedback_time},
+        })
+        actions.append({
+            "_op_type": "update",
+            "_index": all_logs_index,
+            "_id": doc_id,
+            "doc": {"user_feedback": "correct", "reviewed": True, "feedback_timestamp": feedback_time},
+        })
+    return actions
+
+
+def _failed_item(error):
+    # Bulk errors are keyed by operation type, e.g. {"update": {...}}
+    op_type, info = next(iter(error.items()))
+    reason = info.get("error")
+    if isinstance(reason, dict):
+        reason = reason.get("reason") or reason.get("type")
+    return {"op": op_type, "index": info.get("_index"), "id": info.get("_id"), "status": info.get("status"), "reason": reason}
+
+
+def submit_feedback(es, actions, label, refresh=False):
+    """Send all actions for one feedback click in a single bulk request.
+
+    Args:
+        es (Elasticsearch): Client used for the bulk call.
+        actions (list): Bulk actions from build_feedback_actions or build_promotion_actions.
+        label (str): Name of the feedback action, used in the latency log.
+        refresh (bool or str, optional): Passed to the bulk API. "wait_for" makes the
+            change visible to the next search.
+
+    Returns:
+        dict: Result with number of succeeded and failed items, the failures and the latency in ms.
+    """
+    start = time.perf_counter()
+    try:
+        # One chunk for the whole click, however large the group
+        success, errors = bulk(es, actions, chunk_size=max(len(actions), 1), raise_on_error=False,
+                               raise_on_exception=False, refresh=refresh)
+        failed = [_failed_item(err) for err in errors]
+    except Exception as e:
+        success = 0
+        failed = [{"op": "bulk", "index": None, "id": None, "status": None, "reason": str(e)}]
+
+    return {
+        "action": label,
+        "items": len(actions),
+        "succeeded": success,
+        "failed": failed,
+        "doc_ids": [a["_id"] for a in actions if "_id" in a],
+        "indexes": sorted({a["_index"] for a in actions}),
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        "finished_at": time.time(),
+    }
+
+
+class FeedbackWriter:
+    """Write-behind queue that sends feedback bulk requests from a daemon thread.
+
+    The UI thread only enqueues and later collects results with drain_results().
+    """
+
+    def __init__(self, es, refresh="wait_for", max_results=200):
+        self.es = es
+        self.refresh = refresh
+        self._queue = queue.Queue()
+        self._results = deque(maxlen=max_results)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, actions, label):
+        self._queue.put((actions, label, time.perf_counter()))
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def drain_results(self):
+        with self._lock:
+            results = list(self._results)
+            self._results.clear()
+        return results
+
+    def flush(self, timeout=None):
+        """Block until every queued write has been sent. Mainly for tests and shutdown."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _run(self):
+        while True:
+            actions, label, queued_at = self._queue.get()
+            try:
+                result = submit_feedback(self.es, actions, label, refresh=self.refresh)
+                result["queue_wait_ms"] = round((time.perf_counter() - queued_at) * 1000 - result["latency_ms"], 1)
+                with self._lock:
+                    self._results.append(result)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,211 @@
+"""
+Script: grouping.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose:
+Server-side grouping for the review app.
+Logs are grouped per (source ip, destination ip, protocol, minute) by an Elasticsearch composite
+aggregation. Each bucket carries the group summary: number of logs, average RF/ISO/XGB/LOG score
+and the first and last timestamp. Groups are paged with the after_key of the previous page, so
+listing groups costs the same for an hour or a month of logs.
+
+The member documents of a group are only fetched when the reviewer opens it (fetch_group_members).
+Feedback on a whole group needs all of them: without a size they are read under a point in time
+with search_after, so groups beyond the 10,000 hit window of one search are not cut off.
+Score thresholds are part of the query (score_filter), so only qualifying logs are grouped or fetched.
+Log lists only carry LIST_FIELDS (_source filtering); the full document is fetched per log on request.
+"""
+
+from datetime import datetime, timedelta, timezone
+from core.pagination import pit_hits
+
+GROUP_PAGE_SIZE = 50
+
+# Composite source name -> indexed field
+GROUP_FIELDS = {
+    "source_ip": "source_ip.keyword",
+    "destination_ip": "destination_ip.keyword",
+    "network_transport": "network_transport.keyword",
+}
+
+# Score name in the UI -> indexed field; "Average of all" is the mean of these four
+SCORE_FIELDS = {
+    "RF": "RF_score",
+    "ISO": "isoforest_score",
+    "XGBoost": "XGB_score",
+    "Logistic": "LOG_score",
+}
+
+# Scores that can be filtered on; model_score is the mean of the RF, LOG and XGB scores from the scan
+FILTER_FIELDS = {**SCORE_FIELDS, "Model score": "model_score"}
+
+# Fields shown in the log table of a group; the full document is only loaded on request
+LIST_FIELDS = [
+    "@timestamp", "source_ip", "source_port", "destination_ip", "destination_port", "network_transport",
+    "event_action", "session_iflow_bytes", "model_score", "RF_score", "XGB_score", "LOG_score", "isoforest_score",
+]
+
+# Painless: mean of the four scores with missing values as 0, compared to the threshold
+AVERAGE_SCORE_SCRIPT = """
+double total = 0;
+for (String field : params.fields) {
+    if (doc.containsKey(field) && doc[field].size() > 0) { total += doc[field].value; }
+}
+return total / params.fields.size() >= params.min_score;
+"""
+
+
+def score_filter(score_type, min_score):
+    """Query clause that keeps the logs whose selected score is at least min_score, or None."""
+    if score_type in FILTER_FIELDS:
+        return {"range": {FILTER_FIELDS[score_type]: {"gte": min_score}}}
+    if score_type == "Average of all":
+        return {"script": {"script": {"source": AVERAGE_SCORE_SCRIPT, "lang": "painless",
+                                      "params": {"fields": list(SCORE_FIELDS.values()), "min_score": min_score}}}}
+    return None
+
+
+def build_group_aggregation(page_size=GROUP_PAGE_SIZE, after_key=None):
+    """Composite aggregation with one bucket per group and the score and time summaries."""
+    sources = [{name: {"terms": {"field": field, "missing_bucket": True}}} for name, field in GROUP_FIELDS.items()]
+    sources.append({"minute": {"date_histogram": {"field": "@timestamp", "fixed_interval": "1m"}}})
+    composite = {"size": page_size, "sources": sources}
+    if after_key:
+        composite["after"] = after_key
+
+    # Missing scores count as 0, the same as the old per-group averages in Python
+    summaries = {score: {"avg": {"field": field, "missing": 0}} for score, field in FILTER_FIELDS.items()}
+    summaries["first_seen"] = {"min": {"field": "@timestamp"}}
+    summaries["last_seen"] = {"max": {"field": "@timestamp"}}
+    return {"groups": {"composite": composite, "aggs": summaries}}
+
+
+def _millis_to_datetime(value):
+    # Naive UTC, like the timestamps the app parses from the documents
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).replace(tzinfo=None) if value is not None else None
+
+
+def parse_group_buckets(response, page_size=None):
+    """Group summaries and the after_key for the next page (None on the last page)."""
+    agg = response["aggregations"]["groups"]
+    groups = []
+    for bucket in agg["buckets"]:
+        key = bucket["key"]
+        scores = {score: bucket[score]["value"] or 0 for score in FILTER_FIELDS}
+        scores["Average of all"] = sum(scores[s] for s in SCORE_FIELDS) / len(SCORE_FIELDS)
+        groups.append({
+            "source_ip": key["source_ip"],
+            "destination_ip": key["destination_ip"],
+            "network_transport": key["network_transport"],
+            "minute": _millis_to_datetime(key["minute"]),
+            "count": bucket["doc_count"],
+            "scores": scores,
+            "first_seen": _millis_to_datetime(bucket["first_seen"]["value"]),
+            "last_seen": _millis_to_datetime(bucket["last_seen"]["value"]),
+        })
+    # The last page can still return an after_key; a short page means there is nothing after it
+    last_page = not agg["buckets"] or (page_size is not None and len(agg["buckets"]) < page_size)
+    after_key = None if last_page else agg.get("after_key")
+    return groups, after_key
+
+
+def fetch_group_page(es, index_name, base_query, page_size=GROUP_PAGE_SIZE, after_key=None):
+    """One page of group summaries for the logs matching base_query.
+
+    Returns:
+        tuple: (list of group dicts, after_key for the next page or None)
+    """
+    body = {"size": 0, "query": base_query, "aggs": build_group_aggregation(page_size, after_key)}
+    return parse_group_buckets(es.search(index=index_name, body=body), page_size)
+
+
+def group_member_query(base_query, group):
+    """base_query narrowed to the documents of one group."""
+    filters = [{"range": {"@timestamp": {
+        "gte": group["minute"].isoformat() + "Z",
+        "lt": (group["minute"] + timedelta(minutes=1)).isoformat() + "Z",
+    }}}]
+    for name, field in GROUP_FIELDS.items():
+        if group[name] is None:
+            filters.append({"bool": {"must_not": {"exists": {"field": field}}}})
+        else:
+            filters.append({"term": {field: group[name]}})
+    return {"bool": {"must": [base_query], "filter": filters}}
+
+
+def fetch_group_members(es, index_name, base_query, group, size=None):
+    """Documents of one group, newest first, as (doc_id, source) pairs with the origin index.
+
+    With size only the first size documents (one search); without it every member (PIT walk).
+    """
+    query = group_member_query(base_query, group)
+    if size is None:
+        hits = pit_hits(es, index_name, query)
+    else:
+        body = {
+            "query": query,
+            "size": size,
+            "sort": [{"@timestamp": {"order": "desc", "unmapped_type": "date"}}],
+        }
+        hits = es.search(index=index_name, body=body)["hits"]["hits"]
+    items = []
+    for hit in hits:
+        source = hit["_source"]
+        source["_origin_index"] = hit["_index"]
+        items.append((hit["_id"], source))
+    return items
+
+
+def parse_timestamp(raw_ts):
+    """Exported timestamps have up to nine fraction digits, strptime accepts six."""
+    if "." not in raw_ts:
+        return datetime.strptime(raw_ts, "%Y-%m-%dT%H:%M:%SZ")
+    raw_ts = raw_ts.split(".")[0] + "." + raw_ts.split(".")[1][:6].rstrip("Z") + "Z"
+    return datetime.strptime(raw_ts, "%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def groups_from_hits(hits):
+    """Group a handful of already fetched hits (e.g. a search on log ID) the same way, members included."""
+    groups = {}
+    for hit in hits:
+        source = hit["_source"]
+        source["_origin_index"] = hit["_index"]
+        minute = parse_timestamp(source["@timestamp"]).replace(second=0, microsecond=0)
+        key = (source.get("source_ip"), source.get("destination_ip"), source.get("network_transport"), minute)
+        group = groups.setdefault(key, {
+            "source_ip": key[0], "destination_ip": key[1], "network_transport": key[2], "minute": minute,
+            "count": 0, "items": [], "first_seen": None, "last_seen": None,
+        })
+        group["count"] += 1
+        group["items"].append((hit["_id"], source))
+    for group in groups.values():
+        sources = [source for _, source in group["items"]]
+        scores = {}
+        for score, field in FILTER_FIELDS.items():
+            values = [s.get(field, 0) for s in sources if isinstance(s.get(field, 0), (int, float))]
+            scores[score] = sum(values) / len(values) if values else 0
+        scores["Average of all"] = sum(scores[s] for s in SCORE_FIELDS) / len(SCORE_FIELDS)
+        group["scores"] = scores
+    return list(groups.values())
+
+
+def log_table_rows(items, all_logs_index):
+    """One compact row per log for st.dataframe."""
+    rows = []
+    for doc_id, source in items:
+        index_name = source.get("_origin_index", "?")
+        row = {"id": doc_id, "status": "Unflagged (evaluated)" if index_name == all_logs_index else "Flagged (anomaly)"}
+        row.update({field: source.get(field) for field in LIST_FIELDS})
+        rows.append(row)
+    return rows
+
+
+def fetch_log(es, index_name, doc_id):
+    """Full document of one log."""
+    return es.get(index=index_name, id=doc_id)["_source"]
+
+
+def group_id(group):
+    return (f"{group['source_ip']}_{group['destination_ip']}_{group['network_transport']}_"
+            f"{group['minute'].strftime('%Y-%m-%d_%H:%M:%S')}")
@@ -0,0 +1,135 @@
+"""
+Script: incidents.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose:
+Incident review for the Streamlit app.
+The export coalesces alerts with the same signature into one incident document (src/incidents.py)
+with counters, first/last seen, max scores and references to its member logs. Reviewers label the
+incident once; the label is written to the incident and, with one update_by_query, to every flagged
+log with its signature in its time range, so the feedback loop for retraining keeps working on log
+level. The query also reaches the members past the capped references.
+"""
+
+import os
+import time
+from core.feedback import FEEDBACK_LABELS, submit_feedback
+from core.grouping import LIST_FIELDS
+
+INCIDENT_INDEX = os.getenv("INCIDENT_INDEX", "network-incidents")
+INCIDENT_PAGE_SIZE = 50
+# Members are anomaly documents, or flagged logs in the all logs index (overflow, EXPORT_ALERT_DOCS=0)
+MEMBER_INDEXES = ["network-anomalies", "network-anomalies-all"]
+
+# Same fields as a feedback click, marked so the feedback export also picks up members in the all logs index
+LABEL_SCRIPT = """
+ctx._source.user_feedback = params.user_feedback;
+ctx._source.reviewed = true;
+ctx._source.feedback_timestamp = params.feedback_time;
+ctx._source.feedback_source = 'incident';
+ctx._source.incident_id = params.incident_id;
+"""
+
+
+def build_incident_query(start, end, only_unreviewed=True, min_score=0.0, size=INCIDENT_PAGE_SIZE):
+    """Incidents active in [start, end], most recently seen first."""
+    filters = [
+        {"range": {"last_seen": {"gte": start.isoformat()}}},
+        {"range": {"first_seen": {"lte": end.isoformat()}}},
+    ]
+    if only_unreviewed:
+        filters.append({"term": {"reviewed": False}})
+    if min_score > 0:
+        filters.append({"range": {"max_scores.model_score": {"gte": min_score}}})
+    return {
+        "size": size,
+        "query": {"bool": {"filter": filters}},
+        "sort": [{"last_seen": {"order": "desc", "unmapped_type": "date"}}],
+        "_source": {"excludes": ["batch_ids"]},
+        "track_total_hits": True,
+    }
+
+
+def members_by_index(incident):
+    """Member document ids of an incident grouped by the index they live in."""
+    grouped = {}
+    for ref in incident.get("members", []):
+        grouped.setdefault(ref["index"], []).append(ref["id"])
+    return grouped
+
+
+def fetch_incident_members(es, incident, source_fields=LIST_FIELDS):
+    """(doc_id, source) of the referenced member logs, with the index they came from."""
+    items = []
+    for index_name, ids in members_by_index(incident).items():
+        body = {"query": {"ids": {"values": ids}}, "size": len(ids), "_source": source_fields,
+                "sort": [{"@timestamp": {"order": "desc", "unmapped_type": "date"}}]}
+        for hit in es.search(index=index_name, body=body)["hits"]["hits"]:
+            items.append((hit["_id"], {**hit["_source"], "_origin_index": hit["_index"]}))
+    return items
+
+
+def incident_member_query(incident):
+    """Every flagged log with the signature of the incident between its first and last alert."""
+    filters = [
+        {"term": {"predicted_anomaly": True}},
+        # Incidents keep whole seconds; the last second is included
+        {"range": {"@timestamp": {"gte": incident["first_seen"], "lt": f"{incident['last_seen']}||+1s"}}},
+    ]
+    for field, value in incident.get("signature", {}).items():
+        # The export stores missing values as "unknown"
+        value = "unknown" if value is None else value
+        filters.append({"term": {f"{field}.keyword" if isinstance(value, str) else field: value}})
+    return {"bool": {"filter": filters}}
+
+
+def incident_feedback_actions(incident_id, user_feedback, feedback_time, incident_index=INCIDENT_INDEX):
+    """Bulk action that labels the incident document itself."""
+    if user_feedback not in FEEDBACK_LABELS.values():
+        raise ValueError(f"Unknown feedback label: {user_feedback}")
+    return [{
+        "_op_type": "update",
+        "_index": incident_index,
+        "_id": incident_id,
+        "doc": {"user_feedback": user_feedback, "reviewed": True, "feedback_timestamp": feedback_time,
+                "alerts_since_review": 0},
+    }]
+
+
+def submit_incident_feedback(es, incident_id, incident, user_feedback, feedback_time, label,
+                             member_indexes=MEMBER_INDEXES, incident_index=INCIDENT_INDEX):
+    """Label the incident, then all of its member logs by query.
+
+    Returns:
+        dict: Result in the format of submit_feedback, with the member updates added to the counts.
+    """
+    start = time.perf_counter()
+    result = submit_feedback(es, incident_feedback_actions(incident_id, user_feedback, feedback_time, incident_index),
+                             label, refresh="wait_for")
+    if result["failed"]:
+        return result
+
+    try:
+        response = es.update_by_query(
+            index=",".join(member_indexes),
+            query=incident_member_query(incident),
+            script={"source": LABEL_SCRIPT, "lang": "painless", "params": {
+                "user_feedback": user_feedback, "feedback_time": feedback_time, "incident_id": incident_id}},
+            # A member updated by another click in the meantime keeps that update instead of failing this one
+            conflicts="proceed",
+            refresh=True,
+            ignore_unavailable=True,
+        )
+        result["items"] += response.get("total", 0)
+        result["succeeded"] += response.get("updated", 0)
+        for failure in response.get("failures", []):
+            cause = failure.get("cause", {})
+            result["failed"].append({"op": "update_by_query", "index": failure.get("index"), "id": failure.get("id"),
+                                     "status": failure.get("status"), "reason": cause.get("reason") or cause.get("type")})
+    except Exception as e:
+        result["failed"].append({"op": "update_by_query", "index": None, "id": None, "status": None, "reason": str(e)})
+
+    result["indexes"] = sorted(set(result["indexes"]) | set(member_indexes))
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
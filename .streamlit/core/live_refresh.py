@@ -0,0 +1,149 @@
+"""
+Script: live_refresh.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose:
+Live mode for the review app.
+A LiveView holds the groups of the page the reviewer is looking at and a cursor: the newest
+@timestamp seen plus the ids seen at the end of the stream. The cursor is the hit's sort value
+(epoch millis), not the _source string, so one instant written as "...:00Z" or "...:00.000Z" is
+one cursor position. Every poll only asks Elasticsearch for
+documents at or after the cursor, drops the ids it already merged and adds the rest to the groups
+(count, score averages, first/last seen). New groups are listed on top.
+
+The page itself is loaded once, capped at the cursor, so a document is counted either by the page
+or by a poll, never both. The ids at the cursor are read with a PIT walk, so a burst of documents
+sharing the newest timestamp is skipped completely by the first poll. Elasticsearch load per poll
+follows the number of new documents.
+"""
+
+import time
+from collections import OrderedDict, deque
+from core.grouping import FILTER_FIELDS, SCORE_FIELDS, LIST_FIELDS, fetch_group_page, parse_timestamp
+from core.pagination import pit_hits
+
+LIVE_INTERVAL_S = 30
+POLL_BATCH_SIZE = 500
+MAX_POLL_BATCHES = 10
+MAX_SEEN_IDS = 5000
+MAX_NEW_GROUPS = 200
+
+
+def group_key(group):
+    return (group["source_ip"], group["destination_ip"], group["network_transport"], group["minute"])
+
+
+def _with_range(base_query, range_clause):
+    # Cursor bounds are epoch millis
+    range_clause = {**range_clause, "format": "epoch_millis"}
+    return {"bool": {"must": [base_query], "filter": [{"range": {"@timestamp": range_clause}}]}}
+
+
+def newest_cursor(es, index_name, base_query, page_size=POLL_BATCH_SIZE):
+    """@timestamp (epoch millis) of the newest matching document and the ids of all documents at that instant."""
+    body = {"query": base_query, "size": 1, "_source": ["@timestamp"],
+            "sort": [{"@timestamp": {"order": "desc", "unmapped_type": "date"}}]}
+    hits = es.search(index=index_name, body=body)["hits"]["hits"]
+    if not hits:
+        return None, []
+    newest = hits[0]["sort"][0]
+    at_newest = _with_range(base_query, {"gte": newest, "lte": newest})
+    return newest, [hit["_id"] for hit in pit_hits(es, index_name, at_newest, page_size=page_size,
+                                                    source_fields=["@timestamp"])]
+
+
+class LiveView:
+    """Groups of one page kept up to date with documents newer than the cursor."""
+
+    def __init__(self, signature, groups, next_after_key, cursor, cursor_ids=()):
+        self.signature = signature
+        self.next_after_key = next_after_key
+        self.groups = OrderedDict((group_key(g), g) for g in groups)
+        self.new_keys = deque(maxlen=MAX_NEW_GROUPS)
+        self.cursor = cursor
+        self._seen = set()
+        self._seen_order = deque()
+        # Documents at the cursor that the page already counted
+        for doc_id in cursor_ids:
+            self._remember(doc_id)
+        self.new_docs = 0
+        self.polls = 0
+        self.last_poll_at = None
+
+    @classmethod
+    def start(cls, es, index_name, base_query, signature, page_size, after_key):
+        """Take the cursor first, then load the page up to it."""
+        cursor, cursor_ids = newest_cursor(es, index_name, base_query)
+        page_query = _with_range(base_query, {"lte": cursor}) if cursor else base_query
+        groups, next_after_key = fetch_group_page(es, index_name, page_query, page_size, after_key)
+        return cls(signature, groups, next_after_key, cursor, cursor_ids)
+
+    def _remember(self, doc_id):
+        self._seen.add(doc_id)
+        self._seen_order.append(doc_id)
+        while len(self._seen_order) > MAX_SEEN_IDS:
+            self._seen.discard(self._seen_order.popleft())
+
+    def poll(self, es, index_name, base_query, batch_size=POLL_BATCH_SIZE, max_batches=MAX_POLL_BATCHES):
+        """Fetch and merge the documents at or after the cursor. Returns the number of new documents."""
+        new_docs = 0
+        for _ in range(max_batches):
+            body = {
+                "query": _with_range(base_query, {"gte": self.cursor}) if self.cursor else base_query,
+                "size": batch_size,
+                "_source": LIST_FIELDS,
+                "sort": [{"@timestamp": {"order": "asc", "unmapped_type": "date"}}],
+            }
+            hits = es.search(index=index_name, body=body)["hits"]["hits"]
+            fresh = [hit for hit in hits if hit["_id"] not in self._seen]
+            for hit in fresh:
+                self.merge(hit)
+            new_docs += len(fresh)
+            # A full batch of already seen documents at one timestamp cannot move the cursor any further
+            if len(hits) < batch_size or not fresh:
+                break
+        self.new_docs += new_docs
+        self.polls += 1
+        self.last_poll_at = time.time()
+        return new_docs
+
+    def merge(self, hit):
+        """Add one document to its group, creating the group when it is new."""
+        source = hit["_source"]
+        timestamp = parse_timestamp(source["@timestamp"])
+        key = (source.get("source_ip"), source.get("destination_ip"), source.get("network_transport"),
+               timestamp.replace(second=0, microsecond=0))
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = {
+                "source_ip": key[0], "destination_ip": key[1], "network_transport": key[2], "minute": key[3],
+                "count": 0, "scores": {score: 0 for score in FILTER_FIELDS},
+                "first_seen": timestamp, "last_seen": timestamp, "live_new": True,
+            }
+            if len(self.new_keys) == self.new_keys.maxlen:
+                self.groups.pop(self.new_keys[0], None)
+            self.new_keys.append(key)
+
+        # Running averages with missing scores as 0, like the composite aggregation
+        count = group["count"]
+        for score, field in FILTER_FIELDS.items():
+            value = source.get(field)
+            value = value if isinstance(value, (int, float)) else 0
+            group["scores"][score] = (group["scores"][score] * count + value) / (count + 1)
+        group["scores"]["Average of all"] = sum(group["scores"][s] for s in SCORE_FIELDS) / len(SCORE_FIELDS)
+        group["count"] = count + 1
+        group["first_seen"] = min(filter(None, [group.get("first_seen"), timestamp]))
+        group["last_seen"] = max(filter(None, [group.get("last_seen"), timestamp]))
+        group["live_updates"] = group.get("live_updates", 0) + 1
+
+        if self.cursor is None or hit["sort"][0] > self.cursor:
+            self.cursor = hit["sort"][0]
+        self._remember(hit["_id"])
+
+    def new_groups(self):
+        """Groups created by polls, newest first."""
+        return [self.groups[key] for key in reversed(self.new_keys) if key in self.groups]
+
+    def page_groups(self):
+        return [group for group in self.groups.values() if not group.get("live_new")]
@@ -0,0 +1,234 @@
+"""
+Script: pagination.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose:
+Cursor-based paging through the logs of the review app.
+LogPager opens a point in time (PIT) on the index and pages with search_after on @timestamp with
+_shard_doc as tiebreaker, so pages don't shift while feedback changes the index. The next page is
+fetched on a background thread while the reviewer reads the current one.
+
+Memory stays bounded however deep a reviewer goes: a pager holds the current page, at most one
+prefetched page and the cursors of the last few pages (for going back). PagerCache limits the
+number of open pagers per session. A pager it drops is closed (PIT and pages released) but its
+cursors are kept, so when the reviewer comes back to that group it resumes on the same page.
+
+pit_hits() walks all hits of a query the same way, for callers that need every document
+(bulk feedback on a whole group) rather than one page.
+"""
+
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from elasticsearch.exceptions import NotFoundError
+
+PAGE_SIZE = 50
+PIT_KEEP_ALIVE = "5m"
+MAX_CURSOR_HISTORY = 20
+MAX_OPEN_PAGERS = 3
+# Closed pagers whose cursors are kept for resuming; only a few cursors each
+MAX_IDLE_PAGERS = 50
+
+# Newest first; _shard_doc is the cheap unique tiebreaker that comes with a PIT
+LOG_SORT = [
+    {"@timestamp": {"order": "desc", "unmapped_type": "date"}},
+    {"_shard_doc": "desc"},
+]
+
+
+def pit_hits(es, index, query, page_size=1000, keep_alive=PIT_KEEP_ALIVE, sort=LOG_SORT, source_fields=None):
+    """Every hit of query, in sort order, read page by page under one point in time.
+
+    Not limited by the 10,000 hit window of a single search; the PIT is closed when the walk ends.
+    """
+    pit_id = es.open_point_in_time(index=index, keep_alive=keep_alive)["id"]
+    cursor = None
+    try:
+        while True:
+            params = {"query": query, "size": page_size, "pit": {"id": pit_id, "keep_alive": keep_alive}, "sort": sort}
+            if cursor is not None:
+                params["search_after"] = cursor
+            if source_fields is not None:
+                params["_source"] = source_fields
+            resp = es.search(**params)
+            pit_id = resp.get("pit_id", pit_id)
+            hits = resp["hits"]["hits"]
+            yield from hits
+            if len(hits) < page_size:
+                return
+            cursor = hits[-1]["sort"]
+    finally:
+        try:
+            es.close_point_in_time(id=pit_id)
+        except Exception as e:
+            print(f"Could not close point in time: {e}")
+
+
+class LogPager:
+    """Pages through the hits of one query under a point in time."""
+
+    def __init__(self, es, index, query, page_size=PAGE_SIZE, keep_alive=PIT_KEEP_ALIVE,
+                 max_history=MAX_CURSOR_HISTORY, prefetch=True, source_fields=None):
+        self.es = es
+        self.index = index
+        self.query = query
+        # Only these _source fields cross the wire when set
+        self.source_fields = source_fields
+        self.page_size = page_size
+        self.keep_alive = keep_alive
+        self.prefetch = prefetch
+        self.page_number = 0
+        self.pit_id = None
+        self._lock = threading.Lock()
+        # search_after cursor that starts each of the last pages; None starts page 0
+        self._cursors = deque([(0, None)], maxlen=max_history)
+        self._hits = None
+        self._next = None
+        # Created on the first prefetch, again after close()
+        self._executor = None
+        self.searches = 0
+
+    def _open_pit(self):
+        with self._lock:
+            if self.pit_id is None:
+                self.pit_id = self.es.open_point_in_time(index=self.index, keep_alive=self.keep_alive)["id"]
+            return self.pit_id
+
+    def _fetch(self, cursor, retry=True):
+        params = {
+            "query": self.query,
+            "size": self.page_size,
+            "pit": {"id": self._open_pit(), "keep_alive": self.keep_alive},
+            "sort": LOG_SORT,
+        }
+        if cursor is not None:
+            params["search_after"] = cursor
+        if self.source_fields is not None:
+            params["_source"] = self.source_fields
+        try:
+            resp = self.es.search(**params)
+        except NotFoundError:
+            # The PIT expired while the reviewer was away: open a new one and continue from the same cursor
+            if not retry:
+                raise
+            with self._lock:
+                self.pit_id = None
+            return self._fetch(cursor, retry=False)
+        with self._lock:
+            self.pit_id = resp.get("pit_id", self.pit_id)
+            self.searches += 1
+        return resp["hits"]["hits"]
+
+    def _cursor_for(self, page_number):
+        for number, cursor in self._cursors:
+            if number == page_number:
+                return cursor
+        return None
+
+    def _schedule_prefetch(self):
+        self._next = None
+        if self.prefetch and self.has_next():
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-pager")
+            self._next = self._executor.submit(self._fetch, self._hits[-1]["sort"])
+
+    def page(self):
+        """Hits of the current page."""
+        if self._hits is None:
+            self._hits = self._fetch(self._cursor_for(self.page_number))
+            self._schedule_prefetch()
+        return self._hits
+
+    def has_next(self):
+        return self._hits is not None and len(self._hits) == self.page_size
+
+    def has_previous(self):
+        return self.page_number > 0 and any(number == self.page_number - 1 for number, _ in self._cursors)
+
+    def next(self):
+        """Move to the next page, using the prefetched hits when they are ready."""
+        if not self.has_next():
+            return self.page()
+        cursor = self._hits[-1]["sort"]
+        hits = self._next.result() if self._next is not None else self._fetch(cursor)
+        self.page_number += 1
+        self._cursors.append((self.page_number, cursor))
+        self._hits = hits
+        self._schedule_prefetch()
+        return hits
+
+    def previous(self):
+        """Move back one page. Only the last few pages can be revisited."""
+        if not self.has_previous():
+            return self.page()
+        self._cancel_prefetch()
+        self.page_number -= 1
+        # Forget cursors after the page we return to
+        while self._cursors and self._cursors[-1][0] > self.page_number:
+            self._cursors.pop()
+        self._hits = None
+        return self.page()
+
+    def _cancel_prefetch(self):
+        if self._next is not None:
+            self._next.cancel()
+            self._next = None
+
+    def close(self):
+        """Release the PIT, the pages and the prefetch thread. The cursors stay: page() reopens on the same page."""
+        self._cancel_prefetch()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._hits = None
+        with self._lock:
+            pit_id, self.pit_id = self.pit_id, None
+        if pit_id:
+            try:
+                self.es.close_point_in_time(id=pit_id)
+            except Exception as e:
+                print(f"Could not close point in time: {e}")
+
+
+class PagerCache:
+    """The open pagers of one session, least recently used closed first.
+
+    Closed pagers are kept idle (cursors only, no PIT) up to max_idle, so more groups than
+    max_open can be paged at once without falling back to page 0 on every rerun.
+    """
+
+    def __init__(self, max_open=MAX_OPEN_PAGERS, max_idle=MAX_IDLE_PAGERS):
+        self.max_open = max_open
+        self.max_idle = max_idle
+        self._pagers = OrderedDict()
+        self._idle = OrderedDict()
+
+    def get(self, key, factory):
+        pager = self._pagers.get(key)
+        if pager is None:
+            # Resume a closed pager on its page, or start a new one
+            pager = self._idle.pop(key, None) or factory()
+            self._pagers[key] = pager
+        self._pagers.move_to_end(key)
+        while len(self._pagers) > self.max_open:
+            dropped_key, dropped = self._pagers.popitem(last=False)
+            dropped.close()
+            self._idle[dropped_key] = dropped
+        while len(self._idle) > self.max_idle:
+            self._idle.popitem(last=False)
+        return pager
+
+    def discard(self, key):
+        self._idle.pop(key, None)
+        pager = self._pagers.pop(key, None)
+        if pager is not None:
+            pager.close()
+
+    def clear(self):
+        self._idle.clear()
+        for key in list(self._pagers):
+            self.discard(key)
+
+    def __len__(self):
+        return len(self._pagers)
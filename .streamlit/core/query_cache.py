@@ -0,0 +1,116 @@
+"""
+Script: query_cache.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose:
+Query cache for the review app and the dashboard.
+Streamlit reruns the whole page on every widget change, which used to repeat every Elasticsearch search.
+Search responses are now cached per (index, query body) with a TTL. The body is normalized
+(sorted keys) so the same filters always give the same key.
+
+Feedback writes invalidate the entries of the indexes they touched, so a reviewer sees the
+change on the next rerun instead of after the TTL. Hits, misses and the latency of the searches
+that did reach Elasticsearch are kept for the debug panel.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+DEFAULT_TTL_S = 300
+
+
+def normalize_indexes(index):
+    return tuple(sorted(index)) if isinstance(index, (list, tuple, set)) else (index,)
+
+
+def cache_key(index, body):
+    return json.dumps([normalize_indexes(index), body], sort_keys=True, default=str)
+
+
+class QueryCache:
+    """Thread-safe TTL cache for search responses, shared by all sessions of the app."""
+
+    def __init__(self, ttl_s=DEFAULT_TTL_S, max_entries=256, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, indexes, response)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.latencies_ms = deque(maxlen=100)
+
+    def search(self, es, index, body, ttl_s=None, on_lookup=None):
+        """es.search(index=index, body=body), answered from the cache while the entry is fresh.
+        on_lookup(hit) is called per lookup, so a caller can count its own hits and misses."""
+        key = cache_key(index, body)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = bool(entry and entry[0] > now)
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if on_lookup is not None:
+            on_lookup(hit)
+        if hit:
+            return entry[2]
+
+        start = time.perf_counter()
+        response = es.search(index=index, body=body)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self.latencies_ms.append(latency_ms)
+            self._entries[key] = (now + (self.ttl_s if ttl_s is None else ttl_s), normalize_indexes(index), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return response
+
+    def invalidate(self, indexes=None):
+        """Drop the entries that searched any of indexes, or everything when indexes is None."""
+        with self._lock:
+            if indexes is None:
+                dropped = list(self._entries)
+            else:
+                indexes = set(indexes)
+                dropped = [key for key, (_, entry_indexes, _) in self._entries.items() if indexes & set(entry_indexes)]
+            for key in dropped:
+                del self._entries[key]
+            self.invalidations += len(dropped)
+        return len(dropped)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            latencies = sorted(self.latencies_ms)
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidated": self.invalidations,
+                "es_last_ms": round(self.latencies_ms[-1], 1) if latencies else None,
+                "es_p50_ms": round(latencies[len(latencies) // 2], 1) if latencies else None,
+                "es_max_ms": round(latencies[-1], 1) if latencies else None,
+            }
+
+
+class CachedSearch:
+    """Stands in for the Elasticsearch client where only search() is used, e.g. in core/grouping.py."""
+
+    def __init__(self, es, cache, ttl_s=None, on_lookup=None):
+        self.es = es
+        self.cache = cache
+        self.ttl_s = ttl_s
+        self.on_lookup = on_lookup
+
+    def search(self, index, body):
+        return self.cache.search(self.es, index, body, ttl_s=self.ttl_s, on_lookup=self.on_lookup)
@@ -0,0 +1,88 @@
+"""
+Script: resources.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose:
+Long-lived objects shared by all pages and sessions of the Streamlit app.
+The Elasticsearch client (and its connection pool) and the query cache are created once per
+server process with st.cache_resource instead of on every rerun.
+"""
+
+import os
+from datetime import datetime
+import streamlit as st
+from elasticsearch import Elasticsearch
+from core.query_cache import QueryCache
+
+QUERY_CACHE_TTL_S = int(os.getenv("QUERY_CACHE_TTL_S", 300))
+
+
+def _setting(name):
+    value = os.getenv(name)
+    if value:
+        return value
+    try:
+        return st.secrets[name]
+    except Exception:
+        return None
+
+
+@st.cache_resource
+def get_es_client():
+    return Elasticsearch(
+        hosts=[_setting("ES_HOST")],
+        api_key=_setting("ES_API_KEY"),
+        headers={"Accept": "application/vnd.elasticsearch+json; compatible-with=8"},
+        request_timeout=30
+    )
+
+
+@st.cache_resource
+def get_query_cache():
+    return QueryCache(ttl_s=QUERY_CACHE_TTL_S)
+
+
+def show_debug_panel(cache):
+    """Sidebar panel with cache hit rate and Elasticsearch latency."""
+    stats = cache.stats()
+    with st.sidebar.expander("Debug: query cache"):
+        st.caption(f"Hit rate {stats['hit_rate']:.0%} ({stats['hits']} hits, {stats['misses']} misses), "
+                   f"{stats['entries']} cached queries, {stats['invalidated']} invalidated")
+        if stats["es_last_ms"] is not None:
+            st.caption(f"Elasticsearch: last {stats['es_last_ms']} ms, median {stats['es_p50_ms']} ms, "
+                       f"max {stats['es_max_ms']} ms")
+        if st.button("Clear query cache", key="clear_query_cache"):
+            cache.invalidate()
+            st.rerun()
+
+
+def show_diagnostics_panel(diagnostics):
+    """Timings of the last reruns and the Elasticsearch calls of the latest one."""
+    if not diagnostics.reruns:
+        return
+    with st.expander("Performance diagnostics", expanded=True):
+        st.dataframe([{
+            "time": datetime.fromtimestamp(rerun["started_at"]).strftime("%H:%M:%S"),
+            "total ms": rerun["total_ms"],
+            "ES round trip ms": rerun["es_ms"],
+            "ES took ms": rerun["es_took_ms"],
+            **{f"{name} ms": ms for name, ms in rerun["phases"].items()},
+            "ES calls": len(rerun["queries"]),
+            "KB received": round(rerun["payload_bytes"] / 1024, 1),
+            "cache hits": rerun["cache_hits"],
+            "cache misses": rerun["cache_misses"],
+            "interrupted": rerun["interrupted"],
+        } for rerun in reversed(diagnostics.reruns)], hide_index=True)
+
+        latest = diagnostics.reruns[-1]
+        st.caption(f"Elasticsearch calls of the latest rerun ({len(latest['queries'])})")
+        for number, query in enumerate(latest["queries"], start=1):
+            slow = "🐢 " if query["round_trip_ms"] >= diagnostics.slow_query_ms else ""
+            st.markdown(f"{slow}**{number}. {query['operation']}** `{query['index'] or 'point in time'}`: "
+                        f"took {query['took_ms']} ms, round trip {query['round_trip_ms']} ms, "
+                        f"{query['hits']} hits (total {query['total_hits']}), {query['payload_bytes']} bytes")
+            if query["body"]:
+                st.code(query["body"], language="json")
+            if query["profile"]:
+                st.dataframe(query["profile"], hide_index=True)
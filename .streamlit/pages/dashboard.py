@@ -1,8 +1,7 @@
 import streamlit as st
 import pandas as pd
-from elasticsearch import Elasticsearch
-from datetime import datetime, timedelta
-import os
+from datetime import datetime, timedelta, time as dt_time
+import time
 from dotenv import load_dotenv
 import altair as alt
 from urllib.parse import urlencode
@@ -15,129 +14,120 @@ from core.auth import check_login
 check_login()
 
 # ──────────────────────────────────────────────
-# ES Setup
-ES_HOST = os.getenv("ES_HOST")
-ES_API_KEY = os.getenv("ES_API_KEY")
-
-es = Elasticsearch(
-    hosts=[ES_HOST],
-    api_key=ES_API_KEY,
-    headers={"Accept": "application/vnd.elasticsearch+json; compatible-with=8"},
-    request_timeout=30
-)
+# ES Setup: shared client and query cache (see core/resources.py)
+from core.resources import get_es_client, get_query_cache, show_debug_panel
+from core.dashboard_aggs import build_dashboard_query, parse_dashboard_response, pick_interval
+from core.incidents import INCIDENT_INDEX, build_incident_query
+from elasticsearch.exceptions import NotFoundError
+es = get_es_client()
+query_cache = get_query_cache()
 
 INDEX = "network-anomalies"
-MAX_DOCS = 5000
 
 # ──────────────────────────────────────────────
 # Sidebar Filters
 st.sidebar.header("🔍 Query Filters")
-max_logs = st.sidebar.slider("Max logs to fetch", min_value=100, max_value=5000, value=1000, step=100)
+TIME_RANGES = {"Last 24 hours": 1, "Last 5 days": 5, "Last 30 days": 30, "Last 90 days": 90, "Last year": 365}
+range_option = st.sidebar.selectbox("Time range", list(TIME_RANGES) + ["Custom"], index=1)
 min_score = st.sidebar.slider("Minimum model score", 0.0, 1.0, 0.0, 0.01)
 only_with_feedback = st.sidebar.checkbox("Only logs with user feedback")
 
-# Time range (fixed to last 5 days)
-end_time = datetime.utcnow()
-start_time = end_time - timedelta(days=5)
+# Time range on whole minutes so reruns within a minute share the cached query
+if range_option == "Custom":
+    today = datetime.utcnow().date()
+    start_date = st.sidebar.date_input("Start date", value=today - timedelta(days=30))
+    end_date = st.sidebar.date_input("End date", value=today)
+    start_time = datetime.combine(start_date, dt_time(0, 0))
+    end_time = max(datetime.combine(end_date, dt_time(23, 59)), start_time)
+else:
+    end_time = datetime.utcnow().replace(second=0, microsecond=0)
+    start_time = end_time - timedelta(days=TIME_RANGES[range_option])
+interval = pick_interval(start_time, end_time)
 
 # ──────────────────────────────────────────────
-# Query Elasticsearch
-@st.cache_data(ttl=300)
-def fetch_logs():
-    query = {
-        "size": max_logs,
-        "sort": [{"@timestamp": {"order": "desc"}}],
-        "query": {
-            "bool": {
-                "must": [
-                    {"range": {"@timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}},
-                    {"range": {"model_score": {"gte": min_score}}}
-                ]
-            }
-        }
-    }
-    if only_with_feedback:
-        query["query"]["bool"]["must"].append({"exists": {"field": "user_feedback"}})
-    try:
-        res = es.search(index=INDEX, body=query)
-        return [hit["_source"] for hit in res["hits"]["hits"]]
-    except Exception as e:
-        st.error(f"Elasticsearch query failed: {e}")
-        return []
-
-records = fetch_logs()
-if not records:
-    st.warning("No logs found for the selected filters.")
+# Query Elasticsearch: every chart comes from one size-0 aggregation request
+render_start = time.perf_counter()
+try:
+    query = build_dashboard_query(start_time, end_time, min_score, only_with_feedback, interval)
+    summary = parse_dashboard_response(query_cache.search(es, INDEX, query))
+except Exception as e:
+    st.error(f"Elasticsearch query failed: {e}")
     st.stop()
 
-# DataFrame
-df = pd.DataFrame(records)
-df["@timestamp"] = pd.to_datetime(df["@timestamp"], errors="coerce")
-df = df.dropna(subset=["@timestamp"])
-df["@timestamp"] = pd.to_datetime(df["@timestamp"], utc=True, errors="coerce")
-df = df[df["@timestamp"] >= pd.Timestamp(start_time).tz_localize("UTC")]
+show_debug_panel(query_cache)
+if not summary["total"]:
+    # Only an empty range costs a second request: with EXPORT_ALERT_DOCS=0 the anomalies can exist as incidents only
+    try:
+        incident_query = {**build_incident_query(start_time, end_time, only_unreviewed=False), "size": 0}
+        incidents_total = query_cache.search(es, INCIDENT_INDEX, incident_query)["hits"]["total"]["value"]
+    except NotFoundError:
+        # The export runs without incidents
+        incidents_total = 0
+    if incidents_total:
+        # EXPORT_ALERT_DOCS=0: the anomalies only exist as incidents
+        st.info(f"No anomaly documents in range, but {incidents_total} incidents: review them on the Incidents page.")
+    else:
+        st.warning("No logs found for the selected filters.")
+    st.stop()
 
 # ──────────────────────────────────────────────
 # METRICS
 col1, col2, col3 = st.columns(3)
-col1.metric("Logs loaded", len(df))
-col2.metric("Avgerage model score", round(df["model_score"].mean(), 4))
-col3.metric("Unique Source IPs", df["source_ip"].nunique() if "source_ip" in df else "N/A")
+col1.metric("Anomalies in range", summary["total"])
+col2.metric("Avgerage model score", round(summary["avg_score"], 4) if summary["avg_score"] is not None else "N/A")
+col3.metric("Unique Source IPs", summary["unique_source_ips"])
 
 # ──────────────────────────────────────────────
 # CHART: Anomalies Over Time with click support
+bucket_label = {timedelta(hours=1): "Hour", timedelta(days=1): "Day"}.get(interval, "Week")
 st.markdown("### ⏱️ Anomalies Over Time (Click to review)")
-if not df.empty:
-    df["hour"] = df["@timestamp"].dt.floor("H")
-    time_hist = df.groupby("hour").size().reset_index(name="count")
-    time_hist["hour_str"] = time_hist["hour"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+time_hist = pd.DataFrame(summary["over_time"])
+if not time_hist.empty:
+    time_hist["bucket_str"] = time_hist["time"].dt.strftime("%Y-%m-%dT%H:%M:%S")
 
-    click = alt.selection_single(fields=["hour_str"], empty="none", on="click")
+    click = alt.selection_single(fields=["bucket_str"], empty="none", on="click")
     chart = alt.Chart(time_hist).mark_bar().encode(
-        x=alt.X("hour:T", title="Hour"),
+        x=alt.X("time:T", title=bucket_label),
         y=alt.Y("count:Q", title="# Anomalies"),
-        tooltip=["hour:T", "count:Q"],
+        tooltip=["time:T", "count:Q"],
         opacity=alt.condition(click, alt.value(1), alt.value(0.5))
     ).add_selection(click).properties(height=250)
-
-if not df.empty:
     st.altair_chart(chart, use_container_width=True)
 
-    # Show top 10 busiest hours with links
-    st.markdown("###Explore busiest hours")
-    top_hours = time_hist.sort_values("count", ascending=False).head(10)
-    for _, row in top_hours.iterrows():
-        from_ts = row["hour"].isoformat()
-        to_ts = (row["hour"] + timedelta(hours=1)).isoformat()
-        hour_str = row["hour"].strftime("%Y-%m-%d %H:%M")
-        query = urlencode({"from_ts": from_ts, "to_ts": to_ts})
-        link = f"/?{query}"
-        st.markdown(f"🕒 **{hour_str}** — {row['count']} logs &nbsp;&nbsp; [🔍 View logs]({link})", unsafe_allow_html=True)
+    # Show top 10 busiest buckets with links to the review page
+    st.markdown(f"###Explore busiest {bucket_label.lower()}s")
+    top_buckets = time_hist[time_hist["count"] > 0].sort_values("count", ascending=False).head(10)
+    for _, row in top_buckets.iterrows():
+        bucket_start = row["time"]
+        from_ts = bucket_start.isoformat()
+        to_ts = (bucket_start + interval).isoformat()
+        bucket_str = bucket_start.strftime("%Y-%m-%d %H:%M")
+        link_query = urlencode({"from_ts": from_ts, "to_ts": to_ts})
+        link = f"/?{link_query}"
+        st.markdown(f"🕒 **{bucket_str}** — {row['count']} logs &nbsp;&nbsp; [🔍 View logs]({link})", unsafe_allow_html=True)
 else:
     st.info("No data to plot.")
 
 # ──────────────────────────────────────────────
-if "source_ip" in df:
+if summary["top_source_ips"]:
     st.markdown("###Top 10 Source IPs")
-    top_ips = df["source_ip"].value_counts().head(10).reset_index()
-    top_ips.columns = ["source_ip", "count"]
+    top_ips = pd.DataFrame(summary["top_source_ips"])
     st.bar_chart(top_ips.set_index("source_ip"))
 
 # ──────────────────────────────────────────────
-if "model_score" in df:
+if summary["score_hist"]:
     st.markdown("### Model Score Distribution")
-    hist = alt.Chart(df).mark_bar().encode(
-        alt.X("model_score:Q", bin=alt.Bin(maxbins=20), title="Model Score"),
-        y=alt.Y("count():Q", title="Count"),
-        tooltip=["count():Q"]
+    hist = alt.Chart(pd.DataFrame(summary["score_hist"])).mark_bar().encode(
+        alt.X("score:Q", bin=alt.Bin(step=0.05, extent=[0, 1]), title="Model Score"),
+        y=alt.Y("sum(count):Q", title="Count"),
+        tooltip=["score:Q", "count:Q"]
     ).properties(height=250)
     st.altair_chart(hist, use_container_width=True)
 
 # ──────────────────────────────────────────────
-if "user_feedback" in df:
+if summary["feedback"]:
     st.markdown("### User Feedback Overview")
-    fb_counts = df["user_feedback"].fillna("unknown").value_counts().reset_index()
-    fb_counts.columns = ["Feedback", "Count"]
+    fb_counts = pd.DataFrame(summary["feedback"])
     chart = alt.Chart(fb_counts).mark_arc(innerRadius=40).encode(
         theta="Count:Q",
         color="Feedback:N",
@@ -147,3 +137,5 @@ if "user_feedback" in df:
 
 # ──────────────────────────────────────────────
 st.markdown("---")
+st.caption(f"Rendered in {(time.perf_counter() - render_start) * 1000:.0f} ms "
+           f"(Elasticsearch took {summary['took_ms']} ms, cached responses report the original time)")
@@ -0,0 +1,102 @@
+import streamlit as st
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from elasticsearch.exceptions import NotFoundError
+
+load_dotenv()
+
+# ──────────────────────────────────────────────
+# AUTH CHECK
+from core.auth import check_login
+check_login()
+
+# ──────────────────────────────────────────────
+# ES Setup: shared client and query cache (see core/resources.py)
+from core.resources import get_es_client, get_query_cache, show_debug_panel
+from core.grouping import log_table_rows
+from core.query_cache import CachedSearch
+from core.incidents import INCIDENT_INDEX, build_incident_query, fetch_incident_members, submit_incident_feedback
+es = get_es_client()
+query_cache = get_query_cache()
+
+# ──────────────────────────────────────────────
+# Sidebar Filters
+st.sidebar.header("🚨 Incident Filters")
+TIME_RANGES = {"Last 24 hours": 1, "Last 5 days": 5, "Last 30 days": 30, "Last 90 days": 90}
+range_option = st.sidebar.selectbox("Active in", list(TIME_RANGES), index=1)
+only_unreviewed = st.sidebar.checkbox("Only unreviewed incidents", value=True)
+min_score = st.sidebar.slider("Minimum max model score", 0.0, 1.0, 0.0, 0.01)
+
+# Whole minutes so reruns within a minute share the cached query
+end_time = datetime.utcnow().replace(second=0, microsecond=0)
+start_time = end_time - timedelta(days=TIME_RANGES[range_option])
+
+st.title("Incidents")
+st.caption("Alerts with the same source, destination and protocol are coalesced into one incident while they keep "
+           "coming. Labeling an incident labels all of its flagged logs, also those past the referenced members.")
+
+# ──────────────────────────────────────────────
+# Query Elasticsearch
+try:
+    response = query_cache.search(es, INCIDENT_INDEX,
+                                  build_incident_query(start_time, end_time, only_unreviewed, min_score))
+except NotFoundError:
+    st.info(f"No incidents yet: index '{INCIDENT_INDEX}' is created by the first export with anomalies.")
+    st.stop()
+except Exception as e:
+    st.error(f"Elasticsearch query failed: {e}")
+    st.stop()
+
+hits = response["hits"]["hits"]
+total = response["hits"]["total"]["value"]
+if not hits:
+    st.success("✅ No incidents found for the selected filters.")
+    show_debug_panel(query_cache)
+    st.stop()
+st.caption(f"Showing {len(hits)} of {total} incidents, most recently active first.")
+
+# ──────────────────────────────────────────────
+# One expander per incident
+for hit in hits:
+    incident_id, incident = hit["_id"], hit["_source"]
+    max_score = incident.get("max_scores", {}).get("model_score")
+    color = "🟢"
+    if max_score is not None and max_score > 0.9:
+        color = "🔴"
+    elif max_score is not None and max_score > 0.75:
+        color = "🟠"
+    reviewed = f" | ✔️ {incident.get('user_feedback')}" if incident.get("reviewed") else ""
+    since_review = f" (+{incident['alerts_since_review']} since review)" if incident.get("alerts_since_review") else ""
+    title = (f"{color} {incident.get('signature_text')} | alerts: {incident.get('alert_count')}{since_review} | "
+             f"{incident.get('first_seen')} → {incident.get('last_seen')}{reviewed}")
+
+    with st.expander(title):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Alerts", incident.get("alert_count"))
+        col2.metric("Batches", incident.get("batches"))
+        col3.metric("Max model score", f"{max_score:.2f}" if max_score is not None else "N/A")
+        st.caption("Max scores: " + ", ".join(f"{name} {value:.2f}" for name, value in incident.get("max_scores", {}).items()))
+        if incident.get("member_overflow"):
+            st.caption(f"{incident['member_overflow']} alerts beyond the first {len(incident.get('members', []))} "
+                       "are counted but not listed below; feedback labels them too.")
+
+        feedback_time = datetime.now(timezone.utc).isoformat()
+        col_yes, col_no = st.columns(2)
+        for column, label, user_feedback, key in ((col_yes, "🕵️ Mark incident as suspicious", "correct", "yes"),
+                                                  (col_no, "✅ Mark incident as normal", "incorrect", "no")):
+            with column:
+                if st.button(label, key=f"incident_{key}_{incident_id}"):
+                    result = submit_incident_feedback(es, incident_id, incident, user_feedback, feedback_time, label)
+                    query_cache.invalidate(result["indexes"])
+                    if result["failed"]:
+                        st.error(f"{len(result['failed'])} of {result['items']} updates failed: {result['failed'][0]['reason']}")
+                    else:
+                        st.rerun()
+
+        # Member logs are only fetched for the incidents a reviewer opens
+        if st.checkbox(f"Show member logs ({len(incident.get('members', []))})", key=f"incident_logs_{incident_id}"):
+            items = fetch_incident_members(CachedSearch(es, query_cache), incident)
+            # Every member is a flagged log, wherever it is stored
+            st.dataframe(log_table_rows(items, all_logs_index=None), hide_index=True, use_container_width=True)
+
+show_debug_panel(query_cache)
@@ -6,20 +6,28 @@ Project: Bachelor thesis — data-driven anomaly detection
 Purpose:
 This is the Streamlit frontend used to review logs evaluated by the ML models.
 Users can filter logs, inspect grouped anomalies and give feedback.
+Groups are built by Elasticsearch (see core/grouping.py) and paged, the logs of a group are loaded on demand.
 False negatives can be promoted to the anomaly index.
 All interactions update Elasticsearch in real time.
 """
 
 import streamlit as st
-from elasticsearch import Elasticsearch
 from elasticsearch.exceptions import NotFoundError
 import os
+import time
 from pathlib import Path
 from datetime import datetime, timezone, time as dt_time
-from collections import defaultdict
 import json
 from PIL import Image
 from core.auth import check_login
+from core.feedback import FeedbackWriter, build_feedback_actions, build_promotion_actions, submit_feedback
+from core.grouping import GROUP_PAGE_SIZE, fetch_group_page, fetch_group_members, group_member_query, groups_from_hits, group_id, score_filter
+from core.grouping import LIST_FIELDS, log_table_rows, fetch_log
+from core.pagination import LogPager, PagerCache
+from core.diagnostics import SLOW_QUERY_MS, Diagnostics, InstrumentedES
+from core.live_refresh import LIVE_INTERVAL_S, LiveView
+from core.query_cache import CachedSearch
+from core.resources import get_es_client, get_query_cache, show_debug_panel, show_diagnostics_panel
 
 # Check login session
 check_login()
@@ -54,10 +62,10 @@ doc_id_filter = st.sidebar.text_input("Search on unique log ID", key="doc_id_fil
 source_ip = st.sidebar.text_input("Filter on Source IP", key="source_ip")
 destination_ip = st.sidebar.text_input("Filter on Destination IP", key="destination_ip")
 protocol = st.sidebar.text_input("Filter on Network Protocol", key="protocol")
-score_type = st.sidebar.selectbox("Select ML-modelscore for filtering", options=["No filtering", "RF", "ISO", "XGBoost", "Logistic", "Average of all"], index=0, key="score_type")
+score_type = st.sidebar.selectbox("Select ML-modelscore for filtering", options=["No filtering", "RF", "ISO", "XGBoost", "Logistic", "Model score", "Average of all"], index=0, key="score_type")
 
 score_threshold = st.sidebar.slider("Minimum average score", min_value=0.0, max_value=1.0, step=0.01, key="score_threshold")
-max_logs = st.sidebar.slider("Maximum shown logs", min_value=1, max_value=1000, value=100)
+max_logs = st.sidebar.slider("Maximum shown logs per group", min_value=1, max_value=1000, value=100)
 MAX_SAFE_LOGS = 200
 if max_logs > MAX_SAFE_LOGS:
     st.warning(f"Showing more than {MAX_SAFE_LOGS} logs may slow down performance.")
@@ -111,15 +119,86 @@ if st.sidebar.button("Logout"):
 ANOMALY_INDEX = "network-anomalies"
 ALL_LOGS_INDEX = "network-anomalies-all"
 
-ES_HOST = os.getenv("ES_HOST") or st.secrets["ES_HOST"]
-ES_API_KEY = os.getenv("ES_API_KEY") or st.secrets["ES_API_KEY"]
+# One client per server process; searches go through the shared query cache so reruns don't repeat them
+es = get_es_client()
+query_cache = get_query_cache()
+search_es = CachedSearch(es, query_cache)
+
+# Performance diagnostics: only recorded while the toggle is on, the last reruns are kept per session
+show_diagnostics = st.sidebar.toggle("Performance diagnostics", value=False, key="show_diagnostics")
+diagnostics = st.session_state.setdefault("diagnostics", Diagnostics())
+if show_diagnostics:
+    diagnostics.profile_slow = st.sidebar.checkbox("Profile slow searches", value=False, key="diagnostics_profile")
+    diagnostics.slow_query_ms = st.sidebar.number_input("Slow search threshold (ms)", min_value=10,
+                                                        value=SLOW_QUERY_MS, step=100, key="diagnostics_slow_ms")
+    diagnostics.start_rerun()
+    es = InstrumentedES(es, diagnostics)
+    search_es = CachedSearch(es, query_cache, on_lookup=diagnostics.cache_lookup)
+
+# Feedback writes: one bulk request per click, optionally handed to a background writer
+FEEDBACK_LOG_SIZE = 20
+write_behind = st.sidebar.checkbox("Write feedback in background", value=False, key="write_behind")
+st.session_state.setdefault("feedback_log", [])
+st.session_state.setdefault("feedback_errors", [])
+st.session_state.setdefault("pending_feedback_ids", set())
+# Open log pagers of this session; each holds a point in time and at most two pages of logs
+st.session_state.setdefault("log_pagers", PagerCache())
+# Every rerun except the ones started by live refresh counts as reviewer activity
+if not st.session_state.pop("live_rerun", False):
+    st.session_state["last_interaction"] = time.time()
+if write_behind and "feedback_writer" not in st.session_state:
+    st.session_state["feedback_writer"] = FeedbackWriter(es)
+
+
+def record_feedback_result(result):
+    st.session_state["feedback_log"] = (st.session_state["feedback_log"] + [result])[-FEEDBACK_LOG_SIZE:]
+    st.session_state["pending_feedback_ids"].difference_update(result["doc_ids"])
+    # Cached searches on the touched indexes are stale now, and so are the point-in-time log pages
+    query_cache.invalidate(result["indexes"])
+    st.session_state["log_pagers"].clear()
+    st.session_state.pop("live_view", None)
+    if result["failed"]:
+        st.session_state["feedback_errors"].append(result)
+
+
+def send_feedback(actions, label):
+    st.session_state["pending_feedback_ids"].update(a["_id"] for a in actions if "_id" in a)
+    writer = st.session_state.get("feedback_writer") if write_behind else None
+    if writer:
+        writer.submit(actions, label)
+        return None
+    result = submit_feedback(es, actions, label, refresh="wait_for")
+    record_feedback_result(result)
+    return result
+
+
+# Collect results of background writes finished since the last rerun
+if "feedback_writer" in st.session_state:
+    for finished in st.session_state["feedback_writer"].drain_results():
+        record_feedback_result(finished)
+
+with st.sidebar.expander("Feedback writes"):
+    writer = st.session_state.get("feedback_writer")
+    if writer and writer.pending():
+        st.caption(f"{writer.pending()} feedback action(s) still being written")
+    for entry in reversed(st.session_state["feedback_log"]):
+        st.caption(
+            f"{entry['action']}: {entry['succeeded']}/{entry['items']} ok, "
+            f"{len(entry['failed'])} failed, {entry['latency_ms']:.0f} ms"
+            + (f" (+{entry['queue_wait_ms']:.0f} ms queued)" if "queue_wait_ms" in entry else "")
+        )
 
-es = Elasticsearch(
-    hosts=[ES_HOST],
-    api_key=ES_API_KEY,
-    headers={"Accept": "application/vnd.elasticsearch+json; compatible-with=8"},
-    request_timeout=30
-)
+# Surface failed feedback items until the reviewer dismisses them
+if st.session_state["feedback_errors"]:
+    failed_total = sum(len(r["failed"]) for r in st.session_state["feedback_errors"])
+    st.error(f"{failed_total} feedback item(s) could not be written to Elasticsearch.")
+    with st.expander("Show failed feedback items"):
+        for result in st.session_state["feedback_errors"]:
+            for item in result["failed"]:
+                st.markdown(f"`{result['action']}` — `{item['op']}` `{item['id']}` in `{item['index']}`: {item['reason']}")
+    if st.button("Dismiss feedback errors"):
+        st.session_state["feedback_errors"] = []
+        st.rerun()
 
 # Load logo
 logo_path = Path(__file__).resolve().parent.parent / "images" / "logo_vives.png"
@@ -127,19 +206,25 @@ if not logo_path.exists():
     st.error(f"Logo not found at: {logo_path}")
     st.stop()
 
-logo = Image.open(logo_path).convert("RGBA")
-white_bg = Image.new("RGBA", logo.size, (255, 255, 255, 255))
-white_logo = Image.alpha_composite(white_bg, logo)
+with diagnostics.phase("header"):
+    logo = Image.open(logo_path).convert("RGBA")
+    white_bg = Image.new("RGBA", logo.size, (255, 255, 255, 255))
+    white_logo = Image.alpha_composite(white_bg, logo)
 
-col1, col2 = st.columns([2, 10])
-with col1:
-    st.image(white_logo, use_container_width=True)
-with col2:
-    st.title("Network logging anomalies review")
+    col1, col2 = st.columns([2, 10])
+    with col1:
+        st.image(white_logo, use_container_width=True)
+    with col2:
+        st.title("Network logging anomalies review")
 
 # Show all logs incl false negatives
 show_unflagged_logs = st.sidebar.checkbox("Show all evaluated logs", value=False)
 
+# Live mode: poll for logs newer than the ones on screen and merge them into the groups
+live_mode = st.sidebar.checkbox("Live refresh", value=False, key="live_mode")
+live_interval = st.sidebar.number_input("Refresh every (seconds)", min_value=10, max_value=600,
+                                        value=LIVE_INTERVAL_S, step=10, key="live_interval", disabled=not live_mode)
+
 if show_unflagged_logs:
     st.info("Showing logs that were not flagged by the model. You can mark them as false negatives to move them to the anomaly index for retraining.")
     INDEX_NAME = ALL_LOGS_INDEX
@@ -172,14 +257,158 @@ else:
     st.info("Showing logs flagged by the model as an anomaly. Once feedback is given the log disappears from this view.")
     INDEX_NAME = ANOMALY_INDEX
 
+# Score threshold as a query clause: only qualifying logs are grouped and fetched
+FALSE_NEGATIVE_MIN_SCORE = 0.7
+filter_score_type, filter_min_score = score_type, score_threshold
+if show_unflagged_logs:
+    # The full evaluated index is large: false negatives are only listed from a minimum score on
+    if filter_score_type == "No filtering":
+        filter_score_type = "Model score"
+    if filter_min_score < FALSE_NEGATIVE_MIN_SCORE:
+        filter_min_score = FALSE_NEGATIVE_MIN_SCORE
+        st.caption(f"False negatives are listed from a {filter_score_type} of {FALSE_NEGATIVE_MIN_SCORE} on.")
+score_clause = score_filter(filter_score_type, filter_min_score)
+
+
+@st.fragment(run_every=live_interval if live_mode else None)
+def live_poller(base_query):
+    """Runs on its own every live_interval seconds. Skips while the reviewer is active or feedback is pending."""
+    live = st.session_state.get("live_view")
+    if live is None:
+        return
+    now = time.time()
+    writer = st.session_state.get("feedback_writer")
+    busy = now - st.session_state["last_interaction"] < live_interval or (writer and writer.pending())
+    due = live.last_poll_at is None or now - live.last_poll_at >= live_interval * 0.9
+    if due and not busy:
+        if live.poll(es, INDEX_NAME, base_query):
+            st.session_state["live_rerun"] = True
+            st.rerun()
+    checked = datetime.fromtimestamp(live.last_poll_at).strftime("%H:%M:%S") if live.last_poll_at else "not yet"
+    status = "paused while you are reviewing" if busy else f"every {live_interval} s"
+    st.caption(f"🔴 Live ({status}): last check {checked}, {live.new_docs} new logs since this view was loaded.")
+
 
 # Query Elasticsearch based on current filter settings
+def render_group(group, base_query):
+    """One expander per group. Members come with the group (log ID search) or are fetched when asked for."""
+    src_ip, dst_ip, proto, group_time = group["source_ip"], group["destination_ip"], group["network_transport"], group["minute"]
+    selected_score = None if score_type == "No filtering" else group["scores"].get(score_type)
+
+    color = "🟢"
+    if selected_score is not None and selected_score > 0.9:
+        color = "🔴"
+    elif selected_score is not None and selected_score > 0.75:
+        color = "🟠"
+
+    orphan_label = "Single log | " if group["count"] == 1 else "Grouped logs | "
+    if group.get("live_new"):
+        orphan_label = "🆕 " + orphan_label
+    elif group.get("live_updates"):
+        orphan_label = f"🆕 +{group['live_updates']} | " + orphan_label
+    if selected_score is not None:
+        score_text = f"{score_type}: {selected_score:.2f}"
+    else:
+        score_text = "No score filtering"
+
+    group_title = (
+        f"{orphan_label}{color} {group_time.strftime('%Y-%m-%d %H:%M')} | "
+        f"{proto} | {src_ip} ➜ {dst_ip} | logs: {group['count']} | {score_text}"
+    )
+
+    with st.expander(group_title):
+        group_key = group_id(group)
+
+        def all_members():
+            if "items" in group:
+                return group["items"]
+            # All members, also past the 10,000 hit window of a single search
+            return fetch_group_members(es, INDEX_NAME, base_query, group)
+
+        feedback_time = datetime.now(timezone.utc).isoformat()
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            if st.button(f"🕵️ Mark as suspicious", key=f"group_yes_{group_key}"):
+                send_feedback(build_feedback_actions(all_members(), INDEX_NAME, "correct", feedback_time), "Mark as suspicious")
+                st.success("✔️ Marked as suspicious")
+                st.rerun()
+        with col2:
+            if st.button(f"✅ Mark as normal", key=f"group_no_{group_key}"):
+                send_feedback(build_feedback_actions(all_members(), INDEX_NAME, "incorrect", feedback_time), "Mark as normal")
+                st.warning("✔️ Marked as normal")
+                st.rerun()
+
+        if show_unflagged_logs:
+            if st.button(f"🕵️ Mark as missed anomaly", key=f"group_fn_{group_key}"):
+                send_feedback(build_promotion_actions(all_members(), ANOMALY_INDEX, ALL_LOGS_INDEX, feedback_time), "Mark as missed anomaly")
+                st.success("✔️ False negative promoted to anomaly index.")
+                st.rerun()
+
+        # Member documents are only loaded for the groups a reviewer actually inspects
+        pagers = st.session_state["log_pagers"]
+        pager_key = (INDEX_NAME, group_key, max_logs, json.dumps(base_query, sort_keys=True))
+        if "items" in group:
+            items = group["items"]
+        elif st.checkbox(f"Show logs ({group['count']})", key=f"group_logs_{group_key}"):
+            # Page through the group with search_after under a point in time, next page prefetched
+            pager = pagers.get(pager_key, lambda: LogPager(es, INDEX_NAME, group_member_query(base_query, group),
+                                                           page_size=max_logs, source_fields=LIST_FIELDS))
+            pager.page()
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if pager.has_previous() and st.button("⬅️ Newer logs", key=f"logs_prev_{group_key}"):
+                    pager.previous()
+            with col_next:
+                if pager.has_next() and st.button("Older logs ➡️", key=f"logs_next_{group_key}"):
+                    pager.next()
+            items = [(hit["_id"], {**hit["_source"], "_origin_index": hit["_index"]}) for hit in pager.page()]
+            first = pager.page_number * max_logs
+            st.caption(f"Logs {first + 1}–{first + len(items)} of {group['count']}")
+        else:
+            pagers.discard(pager_key)
+            items = []
+
+        # Hide logs whose feedback is still being written
+        pending_ids = st.session_state["pending_feedback_ids"]
+        items = [(doc_id, source) for doc_id, source in items if doc_id not in pending_ids]
+        if items:
+            # Compact table of key fields; the full JSON of one log only when asked for
+            st.dataframe(log_table_rows(items, ALL_LOGS_INDEX), hide_index=True, use_container_width=True)
+            detail_id = st.selectbox("Show full log", ["—"] + [doc_id for doc_id, _ in items], key=f"log_detail_{group_key}")
+            if detail_id != "—":
+                source = dict(items)[detail_id]
+                index_label = source.get("_origin_index", INDEX_NAME)
+                if "items" not in group:
+                    source = fetch_log(es, index_label, detail_id)
+                st.markdown(f"** Log** `{source.get('@timestamp', '?')}` —  `{detail_id}` —  Index: `{index_label}`")
+                st.code(json.dumps(source, indent=2), language="json")
+    return True
+
+
+def group_matches_filter(group):
+    if group_filter_option == "Only grouped logs" and group["count"] == 1:
+        return False
+    if group_filter_option == "Only single logs" and group["count"] > 1:
+        return False
+    return True
+
+
 try:
     if doc_id_filter:
         query = { "query": { "ids": { "values": [doc_id_filter] } } }
+        if score_clause:
+            query["query"] = {"bool": {"must": [query["query"], score_clause]}}
         indexes = [ANOMALY_INDEX, ALL_LOGS_INDEX]
-        res = es.search(index=indexes, body=query)
+        res = search_es.search(index=indexes, body=query)
         hits = res["hits"]["hits"]
+        with diagnostics.phase("grouping"):
+            groups = groups_from_hits(hits)
+        if not groups:
+            st.success("✅ No anomalies were found. Consider adjusting the filters.")
+        with diagnostics.phase("rendering"):
+            for group in groups:
+                if group_matches_filter(group):
+                    render_group(group, query["query"])
     else:
         # Base query for unknown feedback logs within selected time range
         base_query = {
@@ -197,124 +426,59 @@ try:
             base_query["bool"]["must"].append({"term": {"destination_ip.keyword": destination_ip}})
         if protocol:
             base_query["bool"]["must"].append({"term": {"network_transport.keyword": protocol}})
-
-        query = { "query": base_query, "size": max_logs, "sort": [
-    {"@timestamp": {"order": "desc", "unmapped_type": "date"}}] }
-
-
-        def query_elasticsearch(index_name, query):
-            return es.search(index=index_name, body=query)["hits"]["hits"]
-
-        hits = query_elasticsearch(INDEX_NAME, query)
-
-    if not hits:
-        st.success("✅ No anomalies were found. Consider adjusting the filters.")
-    else:
-        # Group logs by time and source/dest/protocol
-        groups = defaultdict(list)
-        for hit in hits:
-            source = hit["_source"]
-            doc_id = hit["_id"]
-            index_name = hit["_index"]
-            source["_origin_index"] = index_name
-            raw_ts = source["@timestamp"]
-            if "." in raw_ts:
-                raw_ts = raw_ts.split(".")[0] + "." + raw_ts.split(".")[1][:6] + "Z"
-            timestamp = datetime.strptime(raw_ts, "%Y-%m-%dT%H:%M:%S.%fZ")
-            bucket_time = timestamp.replace(second=0, microsecond=0)
-            group_key = (source.get("source_ip"), source.get("destination_ip"), source.get("network_transport"), bucket_time)
-            groups[group_key].append((doc_id, source))
-
-        # Process each group and apply filters
-        for (src_ip, dst_ip, proto, group_time), items in groups.items():
-            if group_filter_option == "Only grouped logs" and len(items) == 1:
-                continue
-            elif group_filter_option == "Only single logs" and len(items) > 1:
-                continue
-
-            # Calculate average ML scores per group
-            rf_scores = [s.get("RF_score", 0) for _, s in items if isinstance(s.get("RF_score", 0), (int, float))]
-            iso_scores = [s.get("isoforest_score", 0) for _, s in items if isinstance(s.get("isoforest_score", 0), (int, float))]
-            xgb_scores = [s.get("XGB_score", 0) for _, s in items if isinstance(s.get("XGB_score", 0), (int, float))]
-            log_scores = [s.get("LOG_score", 0) for _, s in items if isinstance(s.get("LOG_score", 0), (int, float))]
-
-            avg_rf = sum(rf_scores) / len(rf_scores) if rf_scores else 0
-            avg_iso = sum(iso_scores) / len(iso_scores) if iso_scores else 0
-            avg_xgb = sum(xgb_scores) / len(xgb_scores) if xgb_scores else 0
-            avg_log = sum(log_scores) / len(log_scores) if log_scores else 0
-            avg_all = (avg_rf + avg_iso + avg_xgb + avg_log) / 4
-
-            score_map = {
-                "RF": avg_rf,
-                "ISO": avg_iso,
-                "XGBoost": avg_xgb,
-                "Logistic": avg_log,
-                "Average of all": avg_all,
-                "No filtering": None
-            }
-            selected_score = score_map.get(score_type, None)
-
-            if score_type != "No filtering" and selected_score is not None and selected_score < score_threshold:
-                continue
-
-            color = "🟢"
-            if selected_score is not None and selected_score > 0.9:
-                color = "🔴"
-            elif selected_score is not None and selected_score > 0.75:
-                color = "🟠"
-
-            orphan_label = "Single log | " if len(items) == 1 else "Grouped logs | "
-            if selected_score is not None:
-                score_text = f"{score_type}: {selected_score:.2f}"
-            else:
-                score_text = "No score filtering"
-
-            group_title = (
-                f"{orphan_label}{color} {group_time.strftime('%Y-%m-%d %H:%M')} | "
-                f"{proto} | {src_ip} ➜ {dst_ip} | logs: {len(items)} | {score_text}"
-            )
-
-            with st.expander(group_title):
-                group_id = f"{src_ip}_{dst_ip}_{proto}_{group_time.strftime('%Y-%m-%d_%H:%M:%S')}"
-                feedback_time = datetime.now(timezone.utc).isoformat()
-                col1, col2 = st.columns([1, 1])
-                with col1:
-                    if st.button(f"🕵️ Mark as suspicious", key=f"group_yes_{group_id}"):
-                        for doc_id, _ in items:
-                            es.update(index=INDEX_NAME, id=doc_id, body={"doc": {"user_feedback": "correct", "reviewed": True, "feedback_timestamp": feedback_time}})
-                        st.success("✔️ Marked as suspicious")
-                        st.rerun()
-                with col2:
-                    if st.button(f"✅ Mark as normal", key=f"group_no_{group_id}"):
-                        for doc_id, _ in items:
-                            es.update(index=INDEX_NAME, id=doc_id, body={"doc": {"user_feedback": "incorrect", "reviewed": True, "feedback_timestamp": feedback_time }})
-                        st.warning("✔️ Marked as normal")
-                        st.rerun()
-
-                if show_unflagged_logs:
-                    if score_threshold < 0.7:
-                        st.warning(
-                            "Viewing false negatives requires a higher minimum score (>= 0.7) to avoid slowdowns.")
-                        st.stop()
-
-                    if st.button(f"🕵️ Mark as missed anomaly", key=f"group_fn_{group_id}"):
-                        for doc_id, log in items:
-                            es.index(index=ANOMALY_INDEX, document={**log, "user_feedback": "correct", "reviewed": True, "feedback_timestamp": feedback_time})
-                            es.update(index=ALL_LOGS_INDEX, id=doc_id, body={"doc": {"user_feedback": "correct", "reviewed": True, "feedback_timestamp": feedback_time }})
-                        st.success("✔️ False negative promoted to anomaly index.")
-                        st.rerun()
-
-                for doc_id, source in items:
-                    index_label = source.get("_origin_index", "?")
-                    label = "Unflagged (evaluated)" if index_label == ALL_LOGS_INDEX else "Flagged (anomaly)"
-                    label = "Unflagged (evaluated)" if index_label == ALL_LOGS_INDEX else "Flagged (anomaly)"
-                    st.markdown(
-                        f"** Log** `{source.get('@timestamp', '?')}` —  `{doc_id}` — {label} —  Index: `{index_label}`")
-                    st.code(json.dumps(source, indent=2), language="json")
-
+        if score_clause:
+            base_query["bool"]["must"].append(score_clause)
+
+        # Group pages: after_key of every page seen, reset when the query changes
+        paging_signature = json.dumps([INDEX_NAME, base_query], sort_keys=True)
+        paging = st.session_state.get("group_paging")
+        if not paging or paging["signature"] != paging_signature:
+            paging = {"signature": paging_signature, "after_keys": [None], "page": 0}
+            st.session_state["group_paging"] = paging
+
+        if live_mode:
+            # The page is loaded once per page/filter; polls only fetch what is newer than it
+            live = st.session_state.get("live_view")
+            live_signature = (paging_signature, paging["page"])
+            if live is None or live.signature != live_signature:
+                live = LiveView.start(es, INDEX_NAME, base_query, live_signature, GROUP_PAGE_SIZE,
+                                      paging["after_keys"][paging["page"]])
+                st.session_state["live_view"] = live
+            live_poller(base_query)
+            with diagnostics.phase("grouping"):
+                groups, next_after_key = live.new_groups() + live.page_groups(), live.next_after_key
+        else:
+            st.session_state.pop("live_view", None)
+            groups, next_after_key = fetch_group_page(search_es, INDEX_NAME, base_query, GROUP_PAGE_SIZE,
+                                                      paging["after_keys"][paging["page"]])
+
+        if not groups and paging["page"] == 0:
+            st.success("✅ No anomalies were found. Consider adjusting the filters.")
+        else:
+            with diagnostics.phase("rendering"):
+                shown = sum(render_group(group, base_query) for group in groups if group_matches_filter(group))
+            st.caption(f"Group page {paging['page'] + 1}: {shown} of {len(groups)} groups match the filters.")
+
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if paging["page"] > 0 and st.button("⬅️ Previous groups"):
+                    paging["page"] -= 1
+                    st.rerun()
+            with col_next:
+                if next_after_key and st.button("Next groups ➡️"):
+                    del paging["after_keys"][paging["page"] + 1:]
+                    paging["after_keys"].append(next_after_key)
+                    paging["page"] += 1
+                    st.rerun()
 
 
 except NotFoundError:
     st.error(f"Index '{INDEX_NAME}' does not exist.")
 except Exception as e:
     st.exception(e)
+
+show_debug_panel(query_cache)
+
+if show_diagnostics:
+    diagnostics.finish_rerun()
+    show_diagnostics_panel(diagnostics)
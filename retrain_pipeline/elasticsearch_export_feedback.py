@@ -6,37 +6,47 @@ Project: Bachelorproef — Data-driven anomaly detection on network logs
 Purpose:
 This script exports user feedback logs from Elasticsearch.
 It checks when the last feedback export ran, then pulls all feedback labeled as "correct" or "incorrect" since that timestamp.
-Two output files are created:
-- a timestamped snapshot for backup
-- a stable latest_feedback.json for retraining pipelines
+
+Feedback is streamed page by page with a point in time (PIT) and search_after.
+Every page is appended as a Parquet part to the cumulative feedback store (see feedback_store.py),
+so raw hits are never collected in memory and retraining always sees the full labeled history.
+Documents labeled again later are deduplicated on their _id when the store is read.
+The watermark in Elasticsearch only means something together with the store: when the store
+is empty (new runner, evicted cache) the watermark is ignored and all feedback is exported.
+Incident labels reach the store as well: they are written to the member logs of the incident, which
+are anomaly documents, or logs in the all logs index when the export runs with EXPORT_ALERT_DOCS=0.
 
 Used as part of retrain_pipeline to extract feedback for model updates.
 """
 
 import os
-import json
+import sys
 from datetime import datetime, timezone, timedelta
 from elasticsearch import Elasticsearch
 from dotenv import load_dotenv
-import shutil
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+from feedback_store import STORE_DIR, hits_to_frame, append_partition, list_partitions
+from pipeline_metrics import start_run, stage, count, es_took
+
 # Load environment variables
 load_dotenv()
 ES_HOST = os.getenv("ES_HOST")
 ES_API_KEY = os.getenv("ES_API_KEY")
 
 INDEX_NAME = "network-anomalies"
+# Member logs labeled through an incident when they live outside the anomaly index
+INCIDENT_MEMBER_INDEX = os.getenv("INCIDENT_MEMBER_INDEX", "network-anomalies-all")
 TRACKING_INDEX = "etl-log-tracking"
 PIPELINE_NAME = "vives-feedback-export"
+# Start of a full export, used when the local store has nothing yet
+FULL_EXPORT_START = "1970-01-01T00:00:00+00:00"
 
-# Generate file paths
-BASE_DIR = Path(__file__).resolve().parents[1]
-DATA_DIR = BASE_DIR / "data"
-
-timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-SNAPSHOT_FILE = DATA_DIR / f"feedback_snapshot_{timestamp}.json"
-LATEST_FILE = DATA_DIR / "latest_feedback.json"
+# Paging settings for the PIT stream
+PAGE_SIZE = 1000
+PIT_KEEP_ALIVE = "2m"
 
 # Connect to Elasticsearch
 es = Elasticsearch(
@@ -59,6 +69,13 @@ def get_last_export_time():
         pass
     return (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
 
+# Start of the export window: the watermark, unless the store it belongs to is gone
+def get_export_start(store_dir=STORE_DIR):
+    if not list_partitions(store_dir):
+        print(f"Feedback store {store_dir} is empty — ignoring the watermark and exporting all feedback.")
+        return FULL_EXPORT_START
+    return get_last_export_time()
+
 # Save current run timestamp
 def store_export_time(end_time):
     es.index(index=TRACKING_INDEX, document={
@@ -68,12 +85,8 @@ def store_export_time(end_time):
     })
 
 # Define query range and feedback filter
-start_time = get_last_export_time()
-end_time = datetime.now(timezone.utc).isoformat()
-print(f"Fetching feedback between {start_time} and {end_time}")
-
-query = {
-    "query": {
+def build_feedback_query(start_time, end_time):
+    return {
         "bool": {
             "must": [
                 {
@@ -89,53 +102,91 @@ query = {
                         "user_feedback.keyword": ["correct", "incorrect"]
                     }
                 }
+            ],
+            # From the all logs index only what was labeled through an incident; the rest of its
+            # feedback is on logs the models did not flag
+            "filter": [
+                {
+                    "bool": {
+                        "should": [
+                            {"term": {"_index": INDEX_NAME}},
+                            {"term": {"feedback_source.keyword": "incident"}}
+                        ],
+                        "minimum_should_match": 1
+                    }
+                }
             ]
         }
     }
-}
-
-# Execute query and collect hits
-try:
-    resp = es.search(index=INDEX_NAME, body=query, scroll="2m", size=1000)
-    sid = resp["_scroll_id"]
-    all_hits = resp["hits"]["hits"]
-    scroll_size = len(all_hits)
-
-    while scroll_size > 0:
-        resp = es.scroll(scroll_id=sid, scroll="2m")
-        sid = resp["_scroll_id"]
-        hits = resp["hits"]["hits"]
-        scroll_size = len(hits)
-        all_hits.extend(hits)
-
-    print(f"Retrieved {len(all_hits)} feedback logs")
-
-except Exception as e:
-    print(f"Failed to fetch logs from Elasticsearch: {e}")
-    exit(1)
-
-# Save snapshot and copy to latest if logs exist
-if not all_hits:
-    print("No feedback logs found — skipping export.")
-    exit(0)
-
-try:
-    os.makedirs(DATA_DIR, exist_ok=True)
-    logs = []
-    for hit in all_hits:
-        doc = hit["_source"]
-        doc["_id"] = hit["_id"]
-        logs.append(doc)
-
-    with open(SNAPSHOT_FILE, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=2, ensure_ascii=False)
-    print(f"Feedback exported to: {SNAPSHOT_FILE}")
-
-    shutil.copy(SNAPSHOT_FILE, LATEST_FILE)
-    print(f"Copied to latest: {LATEST_FILE}")
 
-    store_export_time(end_time)
+# Yield pages of hits using a point in time and search_after
+def stream_feedback_pages(client, query, page_size=PAGE_SIZE, keep_alive=PIT_KEEP_ALIVE):
+    pit_id = client.open_point_in_time(index=f"{INDEX_NAME},{INCIDENT_MEMBER_INDEX}", keep_alive=keep_alive,
+                                       ignore_unavailable=True)["id"]
+    search_after = None
+    try:
+        while True:
+            params = {
+                "query": query,
+                "size": page_size,
+                "pit": {"id": pit_id, "keep_alive": keep_alive},
+                # Oldest feedback first so later labels on the same document are written later
+                "sort": [
+                    {"feedback_timestamp": {"order": "asc", "unmapped_type": "date"}},
+                    {"_shard_doc": "asc"}
+                ],
+            }
+            if search_after is not None:
+                params["search_after"] = search_after
+
+            with stage("es_fetch") as timer:
+                resp = client.search(**params)
+                timer.rows = len(resp["hits"]["hits"])
+            es_took(resp)
+            pit_id = resp.get("pit_id", pit_id)
+            hits = resp["hits"]["hits"]
+            if not hits:
+                break
+
+            yield hits
+            if len(hits) < page_size:
+                break
+            search_after = hits[-1]["sort"]
+    finally:
+        try:
+            client.close_point_in_time(id=pit_id)
+        except Exception as e:
+            print(f"Could not close point in time: {e}")
+
+# Stream all feedback in the window into the store, one part file per page
+def export_feedback(client, start_time, end_time, store_dir=STORE_DIR, run_id=None):
+    run_id = run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    total = 0
+    query = build_feedback_query(start_time, end_time)
+    for part_no, hits in enumerate(stream_feedback_pages(client, query)):
+        with stage("parquet_write", rows=len(hits)):
+            part_path = append_partition(hits_to_frame(hits), run_id, part_no, store_dir=store_dir)
+        count("pages")
+        total += len(hits)
+        print(f"Page {part_no}: {len(hits)} feedback logs appended to {part_path.name}")
+    return total
+
+
+if __name__ == "__main__":
+    start_run("elasticsearch_export_feedback")
+    start_time = get_export_start()
+    end_time = datetime.now(timezone.utc).isoformat()
+    print(f"Fetching feedback between {start_time} and {end_time}")
 
-except Exception as e:
-    print(f"Failed to write feedback JSON: {e}")
-    exit(1)
+    try:
+        exported = export_feedback(es, start_time, end_time)
+    except Exception as e:
+        print(f"Failed to export feedback from Elasticsearch: {e}")
+        sys.exit(1)
+
+    if not exported:
+        print("No feedback logs found — feedback store unchanged.")
+    else:
+        print(f"Retrieved {exported} feedback logs into: {STORE_DIR}")
+
+    store_export_time(end_time)
@@ -15,18 +15,48 @@ A candidate is only promoted if:
 - f1 is higher.
 - AND precision is not worse.
 - AND recall is not worse.
+- AND it stays within the performance budget against the deployed model: p99 batch latency,
+  artifact size and load time may not regress more than PROMOTION_MAX_*_REGRESSION.
+  Latency (p50/p99 for a fixed batch size), rows/sec, size and load time are written to metrics.json.
 
 All decisions and metrics are logged per training run.
+
+The three models are evaluated at the same time. Deployed predictions are cached per
+(deployed artifact hash, validation set hash) so an unchanged deployed model is not re-predicted.
+XGBoost bundles ({"model", "encoder", "columns"}) are unpacked and use their stored column order.
+
+Deployed models are read from the current version of the model registry (src/model_registry.py),
+or models/*_model.pkl before the first version exists, the same files ML_batch_scan.py loads.
+When at least one model is promoted a new registry version is published with the promoted
+candidates and the deployed models that were kept, and the current pointer is switched to it.
 """
 
+import os
 import joblib
 import shutil
 import json
+import sys
+import hashlib
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from sklearn.metrics import confusion_matrix
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+from feature_cache import load_arrays
+import model_registry
+from pipeline_metrics import start_run, stage
+from profiling import start_profiling
+
 
+# Run metrics and profiling only when run as a script, not on import
+if __name__ == "__main__":
+    start_run("evaluate_models")
+    start_profiling("evaluate_models")  # --profile or PIPELINE_PROFILE=1
 
-BASE_DIR = Path(__file__).resolve().parent
+BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
 MODEL_DIR = BASE_DIR / "models"
 candidate_dirs = sorted((DATA_DIR / "training_runs").glob("*_candidate"))
@@ -36,51 +66,187 @@ if not candidate_dirs:
 
 TRAINING_RUN_DIR = candidate_dirs[-1]
 
-# Load validation dataset
+# Load validation dataset. Memory-mapped arrays are preferred, older runs still have a pickle.
+val_dir = TRAINING_RUN_DIR / "validation_set"
 val_path = TRAINING_RUN_DIR / "validation_set.pkl"
-if not val_path.exists():
-    print(f"Validation set missing: {val_path}")
+if (val_dir / "columns.json").exists():
+    X_val, y_val = load_arrays(val_dir)
+elif val_path.exists():
+    X_val, y_val = joblib.load(val_path)
+else:
+    print(f"Validation set missing: {val_dir}")
     exit(1)
-
-X_val, y_val = joblib.load(val_path)
 print("Validation set loaded.")
 
 
 model_names = ["random_forest", "logistic_regression", "xgboost"]
 metrics_log = {}
 
-# Helper to compute all relevant metrics
+# Deployed predictions rarely change, so they are cached per (artifact hash, validation set hash)
+PREDICTION_CACHE_DIR = DATA_DIR / "prediction_cache"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def validation_hash(X, y):
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in getattr(X, "columns", [])]).encode())
+    digest.update(np.ascontiguousarray(np.asarray(X, dtype=np.float64)).tobytes())
+    digest.update(np.ascontiguousarray(np.asarray(y)).tobytes())
+    return digest.hexdigest()
+
+
+def unpack_model(artifact, X):
+    """Return (model, model input). XGBoost bundles {"model","encoder","columns"} select their column order."""
+    if isinstance(artifact, dict):
+        columns = artifact.get("columns")
+        if columns is not None and hasattr(X, "columns") and set(map(str, columns)) <= set(map(str, X.columns)):
+            X = X[[str(c) for c in columns]]
+        return artifact["model"], X
+    return artifact, X
+
+
+# Helper to compute all relevant metrics from one confusion matrix
 def compute_metrics(y_true, y_pred):
+    tn, fp, fn, tp = confusion_matrix(y_true, y_pred, labels=[0, 1]).ravel()
+    total = tn + fp + fn + tp
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
     return {
-        "accuracy": accuracy_score(y_true, y_pred),
-        "precision": precision_score(y_true, y_pred, zero_division=0),
-        "recall": recall_score(y_true, y_pred, zero_division=0),
-        "f1": f1_score(y_true, y_pred, zero_division=0)
+        "accuracy": float((tp + tn) / total) if total else 0.0,
+        "precision": float(precision),
+        "recall": float(recall),
+        "f1": float(2 * precision * recall / (precision + recall)) if precision + recall else 0.0
     }
 
-for name in model_names:
+
+def predict_deployed(name, deployed_path, val_hash):
+    """Deployed predictions, read from the cache when model and validation set are unchanged."""
+    cache_path = PREDICTION_CACHE_DIR / f"{name}_{file_hash(deployed_path)[:16]}_{val_hash[:16]}.npy"
+    if cache_path.exists():
+        return np.load(cache_path), True
+
+    deployed_model, X_input = unpack_model(joblib.load(deployed_path), X_val)
+    y_pred = np.asarray(deployed_model.predict(X_input))
+    PREDICTION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp.npy")
+    np.save(tmp_path, y_pred)
+    os.replace(tmp_path, cache_path)
+    return y_pred, False
+
+
+def evaluate(name, val_hash):
+    """Compare one candidate with its deployed model. Runs in a worker thread."""
     candidate_path = MODEL_DIR / f"{name}_candidate.pkl"
-    deployed_path = MODEL_DIR / f"{name}_deployed.pkl"
+    deployed_path = model_registry.deployed_path(name, fallback=MODEL_DIR)
 
     if not candidate_path.exists():
-        print(f"Candidate model missing: {candidate_path}")
-        continue
+        return name, {"error": f"Candidate model missing: {candidate_path}"}
 
     try:
-        candidate_model = joblib.load(candidate_path)
-        y_pred_cand = candidate_model.predict(X_val)
-        cand_metrics = compute_metrics(y_val, y_pred_cand)
+        candidate_artifact = joblib.load(candidate_path)
+        candidate_model, X_input = unpack_model(candidate_artifact, X_val)
+        cand_metrics = compute_metrics(y_val, candidate_model.predict(X_input))
     except Exception as e:
-        print(f"Error evaluating {name}_candidate: {e}")
-        continue
+        return name, {"error": f"Error evaluating {name}_candidate: {e}"}
 
-    if deployed_path.exists():
-        deployed_model = joblib.load(deployed_path)
-        y_pred_depl = deployed_model.predict(X_val)
-        depl_metrics = compute_metrics(y_val, y_pred_depl)
+    if deployed_path is not None:
+        try:
+            y_pred_depl, cache_hit = predict_deployed(name, deployed_path, val_hash)
+            depl_metrics = compute_metrics(y_val, y_pred_depl)
+        except Exception as e:
+            # A deployed model that exists but can't be loaded (e.g. a Git LFS pointer) must block promotion
+            return name, {"error": f"Error evaluating {name}_deployed: {e} — {name} not promoted."}
     else:
         print(f"No deployed model found for {name} — accepting candidate.")
-        depl_metrics = {k: -1 for k in cand_metrics}
+        depl_metrics, cache_hit = {k: -1 for k in cand_metrics}, False
+
+    return name, {
+        "deployed_path": deployed_path,
+        "candidate": cand_metrics,
+        "deployed": depl_metrics,
+        "deployed_prediction_cached": cache_hit,
+    }
+
+
+# Inference benchmark settings and the allowed regression of a candidate against the deployed model
+BENCH_BATCH_SIZE = int(os.getenv("BENCH_BATCH_SIZE", 1000))
+BENCH_REPEATS = int(os.getenv("BENCH_REPEATS", 30))
+MAX_LATENCY_REGRESSION = float(os.getenv("PROMOTION_MAX_LATENCY_REGRESSION", 0.25))
+MAX_SIZE_REGRESSION = float(os.getenv("PROMOTION_MAX_SIZE_REGRESSION", 0.5))
+MAX_LOAD_REGRESSION = float(os.getenv("PROMOTION_MAX_LOAD_REGRESSION", 0.5))
+# Absolute slack so timer noise on very fast models does not block promotion
+LATENCY_SLACK_MS = 2.0
+LOAD_SLACK_MS = 20.0
+
+
+def benchmark(artifact_path):
+    """Load time, artifact size and batch latency of one saved model on the validation set.
+
+    Batches of BENCH_BATCH_SIZE rows are drawn from the validation set (with replacement
+    when it is smaller) and scored with predict_proba, like the batch scan does.
+    """
+    start = time.perf_counter()
+    model, X_input = unpack_model(joblib.load(artifact_path), X_val)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    X_input = X_input if hasattr(X_input, "iloc") else pd.DataFrame(X_input)
+    rng = np.random.default_rng(42)
+    batch = X_input.iloc[rng.integers(0, len(X_input), BENCH_BATCH_SIZE)]
+
+    model.predict_proba(batch)  # Warm up
+    timings = []
+    for _ in range(BENCH_REPEATS):
+        start = time.perf_counter()
+        model.predict_proba(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    p50, p99 = np.percentile(timings, [50, 99])
+    return {
+        "batch_size": BENCH_BATCH_SIZE,
+        "latency_p50_ms": round(float(p50), 3),
+        "latency_p99_ms": round(float(p99), 3),
+        "rows_per_sec": round(BENCH_BATCH_SIZE / (p50 / 1000), 1) if p50 else None,
+        "artifact_bytes": os.path.getsize(artifact_path),
+        "load_ms": round(load_ms, 3),
+    }
+
+
+def performance_gate(cand_perf, depl_perf):
+    """Return the list of budget violations of the candidate. Empty means it may be promoted."""
+    if depl_perf is None:
+        return []
+    violations = []
+    if cand_perf["latency_p99_ms"] > depl_perf["latency_p99_ms"] * (1 + MAX_LATENCY_REGRESSION) + LATENCY_SLACK_MS:
+        violations.append(f"p99 latency {cand_perf['latency_p99_ms']:.1f} ms vs {depl_perf['latency_p99_ms']:.1f} ms")
+    if cand_perf["artifact_bytes"] > depl_perf["artifact_bytes"] * (1 + MAX_SIZE_REGRESSION):
+        violations.append(f"artifact size {cand_perf['artifact_bytes']} B vs {depl_perf['artifact_bytes']} B")
+    if cand_perf["load_ms"] > depl_perf["load_ms"] * (1 + MAX_LOAD_REGRESSION) + LOAD_SLACK_MS:
+        violations.append(f"load time {cand_perf['load_ms']:.1f} ms vs {depl_perf['load_ms']:.1f} ms")
+    return violations
+
+
+# Evaluate all models at the same time
+val_hash = validation_hash(X_val, y_val)
+with stage("evaluate", rows=len(X_val)):
+    with ThreadPoolExecutor(max_workers=len(model_names)) as pool:
+        results = dict(pool.map(lambda n: evaluate(n, val_hash), model_names))
+
+any_promoted = False
+for name in model_names:
+    result = results[name]
+    if "error" in result:
+        print(result["error"])
+        metrics_log[name] = {"error": result["error"], "promoted": False}
+        continue
+
+    cand_metrics, depl_metrics = result["candidate"], result["deployed"]
 
     # Log and print metrics
     metrics_log[name] = {
@@ -89,48 +255,89 @@ for name in model_names:
     }
 
     print(f"\n=== {name.upper()} ===")
+    if result["deployed_prediction_cached"]:
+        print("Deployed predictions loaded from cache.")
     for metric in ["accuracy", "precision", "recall", "f1"]:
         print(f"{metric.capitalize():<9} | Candidate: {cand_metrics[metric]:.3f} | Deployed: {depl_metrics[metric]:.3f}")
 
+    # Benchmarks run one after another so they do not compete for the CPU
+    candidate_path = MODEL_DIR / f"{name}_candidate.pkl"
+    try:
+        with stage("benchmark"):
+            cand_perf = benchmark(candidate_path)
+            depl_perf = benchmark(result["deployed_path"]) if depl_metrics["f1"] != -1 else None
+    except Exception as e:
+        print(f"Benchmark of {name} failed: {e}")
+        cand_perf, depl_perf = None, None
+    violations = performance_gate(cand_perf, depl_perf) if cand_perf else ["benchmark failed"]
+    metrics_log[name]["performance"] = {"candidate": cand_perf, "deployed": depl_perf, "violations": violations}
+
+    if cand_perf:
+        for label, perf in [("Candidate", cand_perf), ("Deployed", depl_perf)]:
+            if perf:
+                print(f"{label:<9} | p50 {perf['latency_p50_ms']:.2f} ms | p99 {perf['latency_p99_ms']:.2f} ms "
+                      f"| {perf['rows_per_sec']} rows/s | {perf['artifact_bytes'] / 1024:.0f} KB | load {perf['load_ms']:.1f} ms")
+
     promote = (
         cand_metrics["f1"] > depl_metrics["f1"] and
         cand_metrics["precision"] >= depl_metrics["precision"] and
-        cand_metrics["recall"] >= depl_metrics["recall"]
+        cand_metrics["recall"] >= depl_metrics["recall"] and
+        not violations
     )
-
-    snapshot_base = TRAINING_RUN_DIR.name.replace("_candidate", "")
-    source_feedback = DATA_DIR / "latest_feedback.json"
+    metrics_log[name]["promoted"] = promote
 
     if promote:
-        joblib.dump(candidate_model, deployed_path)
-        print(f"{name} promoted: F1 improved, no drop in precision or recall.")
+        print(f"{name} promoted: F1 improved, no drop in precision or recall, within the performance budget.")
+        any_promoted = True
+    elif violations:
+        print(f"{name} not promoted: over the performance budget ({'; '.join(violations)}).")
+    else:
+        print(f"{name} not promoted because criteria were not met.")
 
-        # Label feedback as accepted
-        accepted_feedback = DATA_DIR / f"feedback_snapshot_{snapshot_base}_accepted.json"
-        if source_feedback.exists():
-            shutil.copy(source_feedback, accepted_feedback)
-            print(f"Feedback saved as: {accepted_feedback}")
+# Publish promoted candidates plus the kept deployed models as one new version and switch to it
+snapshot_base = TRAINING_RUN_DIR.name.replace("_candidate", "")
+if any_promoted:
+    artifacts = {}
+    for name in model_names:
+        if metrics_log.get(name, {}).get("promoted"):
+            artifacts[name] = MODEL_DIR / f"{name}_candidate.pkl"
+        elif model_registry.deployed_path(name, fallback=MODEL_DIR) is not None:
+            artifacts[name] = model_registry.deployed_path(name, fallback=MODEL_DIR)
+    promoted = [name for name in model_names if metrics_log.get(name, {}).get("promoted")]
+    # Incremental retraining continues after the feedback each deployed model was trained on:
+    # promoted models take the cutoff of this run, kept models keep theirs
+    train_info_path = TRAINING_RUN_DIR / "train_info.json"
+    run_cutoff = json.loads(train_info_path.read_text(encoding="utf-8")).get("feedback_cutoff") \
+        if train_info_path.exists() else None
+    cutoffs = model_registry.deployed_feedback_cutoffs()
+    cutoffs.update({name: run_cutoff for name in promoted})
+    try:
+        version = model_registry.publish(artifacts, {"run": snapshot_base, "promoted": promoted, "metrics": metrics_log,
+                                                     "feedback_cutoffs": {name: cutoffs.get(name) for name in artifacts}})
+    except ValueError as e:
+        # A kept deployed model that is only an LFS pointer would end up in the version as is
+        print(f"Model version not published: {e} — nothing promoted.")
+        metrics_log["registry"] = {"error": str(e)}
+        for name in promoted:
+            metrics_log[name]["promoted"] = False
+        any_promoted = False
+    else:
+        previous = model_registry.set_current(version, reason=f"promoted {', '.join(promoted)} from {snapshot_base}")
+        metrics_log["registry"] = {"version": version, "previous": previous, "promoted": promoted}
 
-        # Rename training folder
-        accepted_path = Path(str(TRAINING_RUN_DIR).replace("_candidate", "_accepted"))
-        TRAINING_RUN_DIR.rename(accepted_path)
-        print(f"Training folder renamed to: {accepted_path}")
-        TRAINING_RUN_DIR = accepted_path
+# Label feedback and training folder once for the whole run
+source_feedback = TRAINING_RUN_DIR / "feedback.json"
+outcome = "accepted" if any_promoted else "rejected"
 
-    else:
-        print(f"{name} not promoted because criteria were not met.")
+labeled_feedback = DATA_DIR / f"feedback_snapshot_{snapshot_base}_{outcome}.json"
+if source_feedback.exists():
+    shutil.copy(source_feedback, labeled_feedback)
+    print(f"Feedback saved as: {labeled_feedback}")
 
-        # Label feedback as rejected
-        rejected_feedback = DATA_DIR / f"feedback_snapshot_{snapshot_base}_rejected.json"
-        if source_feedback.exists():
-            shutil.copy(source_feedback, rejected_feedback)
-            print(f"Feedback saved as: {rejected_feedback}")
-
-        # Rename training folder
-        rejected_path = Path(str(TRAINING_RUN_DIR).replace("_candidate", "_rejected"))
-        TRAINING_RUN_DIR.rename(rejected_path)
-        print(f"Training folder renamed to: {rejected_path}")
-        TRAINING_RUN_DIR = rejected_path
+labeled_path = Path(str(TRAINING_RUN_DIR).replace("_candidate", f"_{outcome}"))
+TRAINING_RUN_DIR.rename(labeled_path)
+print(f"Training folder renamed to: {labeled_path}")
+TRAINING_RUN_DIR = labeled_path
 
 # Save metrics to file
 metrics_path = TRAINING_RUN_DIR / "metrics.json"
@@ -0,0 +1,131 @@
+"""
+Script: feedback_store.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose
+Append-only columnar store for analyst feedback used by the retraining pipeline.
+
+Every export run appends Parquet part files under a partition per export date:
+    data/feedback_store/export_date=YYYYMMDD/part-<run_id>-<page>.parquet
+
+Nothing is ever rewritten. The cumulative labeled set is rebuilt on read:
+parts are read in export order with only the requested columns and
+deduplicated on the Elasticsearch document _id so later feedback on the
+same document wins.
+
+The validation holdout is chosen per document _id (holdout_mask), so a document
+stays on the same side of the split while the store grows.
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+STORE_DIR = BASE_DIR / "data" / "feedback_store"
+
+ID_COLUMN = "_id"
+ORDER_COLUMN = "feedback_timestamp"
+VALIDATION_SHARE = 0.2
+
+
+def _normalize_value(value):
+    """Make a single cell Parquet friendly. Nested values are kept as JSON text."""
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def hits_to_frame(hits):
+    """Turn one page of Elasticsearch hits into a DataFrame with an _id column.
+
+    Object columns are converted to strings because exported logs mix numbers
+    and placeholders such as "unknown" in the same field.
+    """
+    rows = []
+    for hit in hits:
+        doc = dict(hit.get("_source", {}))
+        doc[ID_COLUMN] = hit["_id"]
+        rows.append(doc)
+
+    df = pd.DataFrame(rows)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(_normalize_value).astype(object)
+    return df
+
+
+def append_partition(df, run_id, part_no, store_dir=STORE_DIR):
+    """Write one part file for this run. The file only appears once it is complete."""
+    partition_dir = Path(store_dir) / f"export_date={run_id[:8]}"
+    partition_dir.mkdir(parents=True, exist_ok=True)
+
+    part_path = partition_dir / f"part-{run_id}-{part_no:05d}.parquet"
+    tmp_path = part_path.with_suffix(".parquet.tmp")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, part_path)
+    return part_path
+
+
+def list_partitions(store_dir=STORE_DIR):
+    """All part files in export order. Run ids are timestamps so a name sort is chronological."""
+    return sorted(Path(store_dir).glob("export_date=*/part-*.parquet"), key=lambda p: p.name)
+
+
+def read_feedback(columns=None, store_dir=STORE_DIR):
+    """Read the cumulative deduplicated feedback set.
+
+    Args:
+        columns (list, optional): Columns to load. _id and feedback_timestamp are always
+            read for deduplication. Columns missing from older parts come back as NaN.
+        store_dir (Path, optional): Root of the feedback store.
+
+    Returns:
+        pd.DataFrame: One row per document, holding its most recent feedback.
+    """
+    frames = []
+    for part_path in list_partitions(store_dir):
+        available = pq.read_schema(part_path).names
+        if columns is None:
+            wanted = available
+        else:
+            wanted = [c for c in dict.fromkeys(list(columns) + [ID_COLUMN, ORDER_COLUMN]) if c in available]
+        frames.append(pq.read_table(part_path, columns=wanted).to_pandas())
+
+    if not frames:
+        return pd.DataFrame(columns=list(columns) if columns else [ID_COLUMN])
+
+    df = pd.concat(frames, ignore_index=True)
+
+    # Later parts already come later. A stable sort on the feedback time also
+    # covers documents re-labeled within one export run.
+    if ORDER_COLUMN in df.columns:
+        order = pd.to_datetime(df[ORDER_COLUMN], utc=True, errors="coerce", format="ISO8601")
+        df = (
+            df.assign(_order=order)
+            .sort_values("_order", kind="mergesort", na_position="first")
+            .drop(columns="_order")
+        )
+
+    df = df.drop_duplicates(subset=ID_COLUMN, keep="last").reset_index(drop=True)
+
+    if columns is not None:
+        for col in columns:
+            if col not in df.columns:
+                df[col] = pd.NA
+    return df
+
+
+def holdout_mask(ids, share=VALIDATION_SHARE):
+    """True for the documents in the validation holdout, decided by a stable hash of their _id."""
+    buckets = np.array([int(hashlib.sha1(str(doc_id).encode("utf-8")).hexdigest()[:8], 16) % 10000 for doc_id in ids])
+    return buckets < share * 10000
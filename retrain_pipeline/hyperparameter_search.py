@@ -0,0 +1,189 @@
+"""
+Script: hyperparameter_search.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose
+Optional time-budgeted hyperparameter search for the candidate models in retrain_models.py.
+
+Successive halving is used per model:
+- a random sample of configurations is fitted on a small share of the training rows,
+- only the best 1/eta survive and get eta times more rows in the next rung,
+- this repeats until one configuration is left, all rows are used or the wall-clock budget runs out.
+
+Configurations are ranked on one objective measured on a search validation split:
+    objective = F1 - LATENCY_WEIGHT * latency (ms per 1000 rows) - SIZE_WEIGHT * pickled size (MB)
+so a slightly better F1 does not win when it makes the 5-minute scan slower or the artifact much bigger.
+
+The search validation split is carved out of the training rows (search_split). The validation set
+that evaluate_models.py uses for the promotion gate is never seen by the search, so the gate does
+not judge candidates on the rows their configs were picked on.
+"""
+
+import pickle
+import time
+from sklearn.base import clone
+from sklearn.metrics import f1_score
+from sklearn.model_selection import ParameterGrid, ParameterSampler, train_test_split
+
+# Search spaces per candidate model. Keys follow the estimator's set_params names.
+SEARCH_SPACES = {
+    "random_forest": {
+        "n_estimators": [25, 50, 100, 200],
+        "max_depth": [None, 8, 16],
+        "min_samples_leaf": [1, 2, 5],
+        "max_features": ["sqrt", 0.5],
+    },
+    "logistic_regression": {
+        "sgdclassifier__alpha": [1e-5, 1e-4, 1e-3, 1e-2],
+        "sgdclassifier__penalty": ["l2", "elasticnet"],
+    },
+    "xgboost": {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [3, 4, 6, 8],
+        "learning_rate": [0.05, 0.1, 0.3],
+        "subsample": [0.8, 1.0],
+    },
+}
+
+# Objective weights: F1 points lost per ms of latency per 1000 rows and per MB of model size
+LATENCY_WEIGHT = 0.001
+SIZE_WEIGHT = 0.01
+
+N_CONFIGS = 12
+ETA = 3
+MIN_ROWS = 200
+LATENCY_REPEATS = 3
+# Share of the training rows held out to score configurations
+SEARCH_VALIDATION_SHARE = 0.2
+
+
+def measure_latency_ms(model, X):
+    """Median predict_proba time for X, scaled to milliseconds per 1000 rows."""
+    timings = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        model.predict_proba(X)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000 * 1000 / max(len(X), 1)
+
+
+def objective(f1, latency_ms, size_mb):
+    return f1 - LATENCY_WEIGHT * latency_ms - SIZE_WEIGHT * size_mb
+
+
+def evaluate_config(base_model, params, X_fit, y_fit, X_val, y_val):
+    model = clone(base_model).set_params(**params)
+    start = time.perf_counter()
+    model.fit(X_fit, y_fit)
+    fit_seconds = time.perf_counter() - start
+
+    f1 = f1_score(y_val, model.predict(X_val), zero_division=0)
+    latency_ms = measure_latency_ms(model, X_val)
+    size_mb = len(pickle.dumps(model)) / (1024 * 1024)
+    return {
+        "params": params,
+        "rows": len(X_fit),
+        "f1": round(f1, 4),
+        "latency_ms_per_1k": round(latency_ms, 3),
+        "size_mb": round(size_mb, 3),
+        "fit_seconds": round(fit_seconds, 3),
+        "objective": round(objective(f1, latency_ms, size_mb), 4),
+    }
+
+
+def search_split(X_train, y_train, share=SEARCH_VALIDATION_SHARE, seed=42):
+    """Split the training rows into search fit rows and search validation rows.
+
+    Returns:
+        tuple: (X_fit, X_search_val, y_fit, y_search_val)
+    """
+    # Stratify when every label has enough rows for both sides
+    stratify = y_train if y_train.value_counts().min() >= 2 else None
+    return train_test_split(X_train, y_train, test_size=share, random_state=seed, stratify=stratify)
+
+
+def _subsample(X, y, n_rows, seed):
+    if n_rows >= len(X):
+        return X, y
+    X_sub = X.sample(n=n_rows, random_state=seed)
+    y_sub = y.loc[X_sub.index]
+    # A rung without both labels cannot be scored, use all rows instead
+    if y_sub.nunique() < 2:
+        return X, y
+    return X_sub, y_sub
+
+
+def successive_halving(name, base_model, X_train, y_train, X_val, y_val, deadline, n_configs=N_CONFIGS, eta=ETA):
+    """Search one model until the deadline (time.monotonic() value).
+
+    Returns:
+        tuple: (best params or None when nothing finished in time, list of all trials)
+    """
+    space = SEARCH_SPACES[name]
+    n_configs = min(n_configs, len(ParameterGrid(space)))
+    survivors = list(ParameterSampler(space, n_iter=n_configs, random_state=42))
+
+    # Size the first rung so the last rung uses all training rows
+    n_rungs = 1
+    while len(survivors) // (eta ** n_rungs) >= 1:
+        n_rungs += 1
+    rows = max(MIN_ROWS, len(X_train) // (eta ** (n_rungs - 1)))
+
+    trials = []
+    rung = 0
+    best_rung_trials = []
+    while survivors:
+        X_fit, y_fit = _subsample(X_train, y_train, rows, seed=rung)
+        scored = []
+        for params in survivors:
+            if time.monotonic() > deadline:
+                break
+            trial = evaluate_config(base_model, params, X_fit, y_fit, X_val, y_val)
+            trial.update({"model": name, "rung": rung})
+            scored.append(trial)
+
+        trials.extend(scored)
+        if scored:
+            best_rung_trials = scored
+        if len(scored) < len(survivors) or len(X_fit) >= len(X_train) or len(scored) <= 1:
+            break
+
+        scored.sort(key=lambda t: t["objective"], reverse=True)
+        survivors = [t["params"] for t in scored[:max(1, len(scored) // eta)]]
+        rows *= eta
+        rung += 1
+
+    if not best_rung_trials:
+        return None, trials
+    best = max(best_rung_trials, key=lambda t: t["objective"])
+    return best["params"], trials
+
+
+def run_search(base_models, X_train, y_train, X_val, y_val, budget_seconds):
+    """Search every model within one shared wall-clock budget.
+
+    The remaining time is split evenly over the models that still have to be searched.
+    X_val/y_val is the search validation split (search_split), not the promotion validation set.
+
+    Returns:
+        tuple: (best params per model, leaderboard sorted on objective)
+    """
+    start = time.monotonic()
+    best_configs, leaderboard = {}, []
+    names = list(base_models)
+    for i, name in enumerate(names):
+        remaining = budget_seconds - (time.monotonic() - start)
+        deadline = time.monotonic() + max(0.0, remaining / (len(names) - i))
+        params, trials = successive_halving(name, base_models[name], X_train, y_train, X_val, y_val, deadline)
+        leaderboard.extend(trials)
+        if params is None:
+            print(f"Search for {name} ran out of time before a full rung — keeping defaults.")
+            best_configs[name] = {}
+        else:
+            best_configs[name] = params
+            print(f"Best {name} config: {params}")
+
+    leaderboard.sort(key=lambda t: (t["model"], -t["rung"], -t["objective"]))
+    return best_configs, leaderboard
@@ -0,0 +1,38 @@
+"""
+Script: incremental.py
+Authors: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelor thesis — data-driven anomaly detection
+
+Purpose
+Warm start helpers for incremental retraining (retrain_models.py --mode incremental).
+
+The Random Forest grows by INCREMENTAL_RF_TREES on every warm start and XGBoost by
+INCREMENTAL_XGB_ROUNDS boosting rounds. Without a limit the deployed models keep getting
+bigger and slower to score until the latency and size gates of evaluate_models.py reject
+every candidate, so once another warm start would take the forest past MAX_RF_TREES or
+the booster past MAX_XGB_ROUNDS the model is rebuilt from scratch instead.
+"""
+
+import os
+
+INCREMENTAL_RF_TREES = 20
+MAX_RF_TREES = int(os.getenv("MAX_RF_TREES", 300))
+INCREMENTAL_XGB_ROUNDS = 20
+MAX_XGB_ROUNDS = int(os.getenv("MAX_XGB_ROUNDS", 300))
+
+
+def forest_can_grow(model, step=INCREMENTAL_RF_TREES, max_trees=MAX_RF_TREES):
+    """True when one more warm start stays within max_trees."""
+    return model.n_estimators + step <= max_trees
+
+
+def warm_start_forest(model, X, y, step=INCREMENTAL_RF_TREES):
+    """Add step trees fitted on the new feedback to the deployed forest."""
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + step)
+    model.fit(X, y)
+    return model
+
+
+def booster_can_grow(model, step=INCREMENTAL_XGB_ROUNDS, max_rounds=MAX_XGB_ROUNDS):
+    """True when one more warm start stays within max_rounds boosting rounds."""
+    return model.get_booster().num_boosted_rounds() + step <= max_rounds
@@ -5,52 +5,209 @@ Project: Bachelorproef — Data-driven anomaly detection on network logs
 
 Purpose:
 This script retrains the classification models using labeled feedback from analysts.
-It loads the latest feedback logs, corrects column names, encodes features, adds an unsupervised anomaly score,
+It loads the cumulative feedback store, corrects column names, encodes features, adds an unsupervised anomaly score
+(through the shared feature cache in src/feature_cache.py),
 trains Random Forest, Logistic Regression, and XGBoost, and stores all models for validation and review.
 
-The output includes candidate models and a validation set for offline evaluation.
+Two modes are available:
+- incremental (default): continue from the deployed models on feedback newer than the previous run.
+  XGBoost keeps boosting from the deployed booster, the Random Forest adds trees through warm_start
+  (both rebuilt from scratch once they would pass MAX_XGB_ROUNDS / MAX_RF_TREES, see incremental.py)
+  and the logistic model (scaled SGD with log loss) is updated with partial_fit.
+  Each model continues after the feedback cutoff stored with the deployed registry version, so
+  feedback of a rejected run is still trained into the deployed chain by the next run.
+- full: train every model from scratch, e.g. python retrain_models.py --mode full
+With --compare both modes run and their fit times and validation metrics are written to mode_comparison.json.
+With --search a successive halving search (hyperparameter_search.py) picks configs that balance F1 against
+inference latency and model size within --search-budget seconds. Configs and leaderboard go to the run folder.
+
+The output includes candidate models and a validation set (validation_set/X.npy, y.npy and columns.json)
+for offline evaluation.
 """
 
 import os
+import sys
 import json
+import argparse
 import pandas as pd
 import joblib
 from datetime import datetime
-from sklearn.ensemble import RandomForestClassifier, IsolationForest
-from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 from xgboost import XGBClassifier
-from category_encoders import HashingEncoder
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+from feedback_store import STORE_DIR, holdout_mask, read_feedback
+from incremental import INCREMENTAL_XGB_ROUNDS, forest_can_grow, booster_can_grow, warm_start_forest
+from training_scheduler import run_fits
+from feature_cache import cached_feature_matrix, save_arrays
+from hyperparameter_search import run_search, search_split
+import model_registry
+from pipeline_metrics import start_run
+from profiling import start_profiling
+
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
 MODEL_DIR = BASE_DIR / "models"
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
+MODEL_NAMES = model_registry.MODEL_NAMES
+
+# Retrain mode: incremental warm start from the deployed models, or a full retrain on demand
+arg_parser = argparse.ArgumentParser(description="Retrain candidate models on the feedback store.")
+arg_parser.add_argument("--mode", choices=["incremental", "full"], default=os.getenv("RETRAIN_MODE", "incremental"))
+arg_parser.add_argument("--compare", action="store_true", help="Run both modes and compare fit time and validation metrics.")
+arg_parser.add_argument("--search", action="store_true",
+                        help="Run a time-budgeted hyperparameter search and train full candidates with the best configs.")
+arg_parser.add_argument("--search-budget", type=float, default=float(os.getenv("SEARCH_BUDGET_SECONDS", 900)),
+                        help="Wall-clock budget for the search in seconds.")
+arg_parser.add_argument("--profile", action="store_true",
+                        help="Save a cProfile dump, tracemalloc report and peak RSS to data/profiles/.")
+args = arg_parser.parse_args()
+# Run metrics and profiling only when run as a script, not on import
+if __name__ == "__main__":
+    start_run("retrain_models")
+    start_profiling("retrain_models")
 
 # Setup folder for this training run
 today = datetime.now().strftime("%Y%m%d_%Hh")
 RUN_DIR = Path(f"data/training_runs/{today}_candidate")
 RUN_DIR.mkdir(parents=True, exist_ok=True)
 
-# Input here is the feedback file exported via elasticsearch_export_feedback
-INPUT_FILE = DATA_DIR / "latest_feedback.json"
-if not INPUT_FILE.exists():
-    print(f"File not found: {INPUT_FILE}")
-    exit(1)
+# Settings for incremental mode
+MIN_NEW_ROWS = 20
 
-with open(INPUT_FILE, encoding="utf-8") as f:
-    data = json.load(f)
 
-# Store raw copy in run folder
-with open(RUN_DIR / "feedback.json", "w", encoding="utf-8") as f:
-    json.dump(data, f, indent=2, ensure_ascii=False)
-print(f"Feedback saved to: {RUN_DIR}/feedback.json")
+# Helper to compute all relevant metrics
+def compute_metrics(y_true, y_pred):
+    return {
+        "accuracy": accuracy_score(y_true, y_pred),
+        "precision": precision_score(y_true, y_pred, zero_division=0),
+        "recall": recall_score(y_true, y_pred, zero_division=0),
+        "f1": f1_score(y_true, y_pred, zero_division=0)
+    }
+
+
+# Logistic regression slot: scaled SGD with log loss so it can be updated with partial_fit
+def make_logistic_model():
+    return make_pipeline(StandardScaler(), SGDClassifier(loss="log_loss", alpha=1e-4, max_iter=1000, random_state=42))
+
+
+def load_deployed(name):
+    """Load the deployed model for warm starting. XGBoost bundles are unpacked to the model."""
+    path = model_registry.deployed_path(name, fallback=MODEL_DIR)
+    if path is not None:
+        try:
+            model = joblib.load(path)
+        except Exception as e:
+            print(f"Could not load deployed {name} from {path}: {e}")
+            return None
+        return model["model"] if isinstance(model, dict) else model
+    return None
+
+
+def deployed_cutoffs():
+    """Newest feedback timestamp each deployed model was trained on, from the current registry version.
+
+    Only promoted versions carry cutoffs: a rejected candidate does not move them, so its
+    feedback is still new for the next incremental run.
+    """
+    return {name: pd.Timestamp(cutoff) for name, cutoff in model_registry.deployed_feedback_cutoffs().items() if cutoff}
+
+
+def incremental_possible(X_new, y_new):
+    return len(X_new) >= MIN_NEW_ROWS and y_new.nunique() == 2
+
+
+def make_fresh_models(configs=None):
+    """Untrained candidates with default settings, or the configs chosen by the search."""
+    models = {
+        "random_forest": RandomForestClassifier(n_estimators=100, random_state=42),
+        "logistic_regression": make_logistic_model(),
+        "xgboost": XGBClassifier(eval_metric="logloss")
+    }
+    for name, params in (configs or {}).items():
+        models[name].set_params(**params)
+    return models
+
+
+def partial_fit_logistic(model, X, y):
+    scaler, sgd = model[0], model[-1]
+    scaler.partial_fit(X)
+    sgd.partial_fit(scaler.transform(X), y)
+    return model
 
-# Load into DataFrame
-df = pd.DataFrame(data)
 
-# Restore original dot-named columns if they were flattened
+def train_full(X_train, y_train, configs=None):
+    """Train all candidates from scratch in parallel. Returns the models and the fit stats."""
+    jobs = {name: {"model": model, "X": X_train, "y": y_train} for name, model in make_fresh_models(configs).items()}
+    return run_fits(jobs)
+
+
+def train_incremental(new_rows, X_train, y_train):
+    """Continue from the deployed models using only the feedback that is new for each of them.
+
+    - XGBoost adds boosting rounds on top of the deployed booster.
+    - RandomForest adds trees with warm_start.
+    - The SGD logistic model is updated with partial_fit.
+    A model without a compatible deployed version is trained from scratch on the full train set.
+    """
+    jobs = {}
+    fresh = make_fresh_models()
+    n_features = X_train.shape[1]
+
+    for name in MODEL_NAMES:
+        deployed = load_deployed(name)
+        X_new, y_new = new_rows[name]
+
+        if name == "random_forest" and isinstance(deployed, RandomForestClassifier) \
+                and getattr(deployed, "n_features_in_", None) == n_features and not forest_can_grow(deployed):
+            print(f"Deployed random_forest has {deployed.n_estimators} trees — rebuilding it from scratch.")
+            jobs[name] = {"model": fresh[name], "X": X_train, "y": y_train}
+        elif name == "random_forest" and isinstance(deployed, RandomForestClassifier) \
+                and getattr(deployed, "n_features_in_", None) == n_features:
+            jobs[name] = {"model": deployed, "X": X_new, "y": y_new, "fit": warm_start_forest}
+        elif name == "logistic_regression" and isinstance(deployed, Pipeline) \
+                and hasattr(deployed[-1], "partial_fit") and getattr(deployed, "n_features_in_", None) == n_features:
+            jobs[name] = {"model": deployed, "X": X_new, "y": y_new, "fit": partial_fit_logistic}
+        elif name == "xgboost" and isinstance(deployed, XGBClassifier) \
+                and getattr(deployed, "n_features_in_", None) == n_features and not booster_can_grow(deployed):
+            print(f"Deployed xgboost has {deployed.get_booster().num_boosted_rounds()} rounds — rebuilding it from scratch.")
+            jobs[name] = {"model": fresh[name], "X": X_train, "y": y_train}
+        elif name == "xgboost" and isinstance(deployed, XGBClassifier) \
+                and getattr(deployed, "n_features_in_", None) == n_features:
+            jobs[name] = {
+                "model": XGBClassifier(n_estimators=INCREMENTAL_XGB_ROUNDS, eval_metric="logloss"),
+                "X": X_new, "y": y_new,
+                "fit_kwargs": {"xgb_model": deployed.get_booster()},
+            }
+        else:
+            print(f"No compatible deployed {name} to warm start from — training it from scratch.")
+            jobs[name] = {"model": fresh[name], "X": X_train, "y": y_train}
+
+    return run_fits(jobs)
+
+
+# Feature definitions
+categorical = [
+    "source.ip", "destination.ip", "network.transport", "event.action",
+    "tcp.flags", "agent.version", "fleet.action.type", "message",
+    "proto_port_pair", "version_action_pair"
+]
+
+numeric = [
+    "source.port", "destination.port", "session.iflow_bytes", "session.iflow_pkts",
+    "flow_count_per_minute", "unique_dst_ports", "bytes_ratio",
+    "port_entropy", "flow.duration", "bytes_per_pkt", "msg_code", "is_suspicious_ratio"
+]
+
+required = categorical + numeric
+
+# The store keeps the flattened names written by the exporter
 RENAME_TO_DOT = {
     "source_ip": "source.ip",
     "destination_ip": "destination.ip",
@@ -65,64 +222,121 @@ RENAME_TO_DOT = {
     "session_iflow_pkts": "session.iflow_pkts",
     "flow_duration": "flow.duration"
 }
-df.rename(columns=RENAME_TO_DOT, inplace=True)
-
-print(f"Columns available:\n{df.columns.tolist()}")
+DOT_TO_FLAT = {v: k for k, v in RENAME_TO_DOT.items()}
 
-# Feature definitions
-categorical = [
-    "source.ip", "destination.ip", "network.transport", "event.action",
-    "tcp.flags", "agent.version", "fleet.action.type", "message",
-    "proto_port_pair", "version_action_pair"
-]
+# Input here is the cumulative feedback store filled by elasticsearch_export_feedback.
+# Only the feature columns and the label are read from disk.
+store_columns = [DOT_TO_FLAT.get(col, col) for col in required] + ["user_feedback"]
+df = read_feedback(columns=store_columns)
+if df.empty:
+    print(f"No feedback found in store: {STORE_DIR}")
+    exit(1)
+print(f"Feedback loaded from store: {len(df)} labeled documents")
 
-numeric = [
-    "source.port", "destination.port", "session.iflow_bytes", "session.iflow_pkts",
-    "flow_count_per_minute", "unique_dst_ports", "bytes_ratio",
-    "port_entropy", "flow.duration", "bytes_per_pkt", "msg_code", "is_suspicious_ratio"
-]
+# Restore original dot-named columns
+df.rename(columns=RENAME_TO_DOT, inplace=True)
 
-required = categorical + numeric
+print(f"Columns available:\n{df.columns.tolist()}")
 
 # Check column presence
-missing = [col for col in required if col not in df.columns]
+missing = [col for col in required if col not in df.columns or df[col].isna().all()]
 if missing:
     print(f"Required columns missing: {missing}")
     exit(1)
 
 # Filter usable feedback
-df = df[df["user_feedback"].isin(["correct", "incorrect"])]
+df = df[df["user_feedback"].isin(["correct", "incorrect"])].copy()
 df["label"] = df["user_feedback"].map({"correct": 1, "incorrect": 0})
-df = df[required + ["label"]].dropna()
+# Placeholders like "unknown" are stored as text, so coerce before dropping incomplete rows
+df[numeric] = df[numeric].replace({"True": 1, "False": 0}).apply(pd.to_numeric, errors="coerce")
+df = df[required + ["label", "feedback_timestamp", "_id"]].dropna(subset=required + ["label"]).reset_index(drop=True)
 df[categorical] = df[categorical].astype(str)
+feedback_time = pd.to_datetime(df.pop("feedback_timestamp"), utc=True, errors="coerce", format="ISO8601")
+doc_ids = df.pop("_id")
 
-# Encode high-cardinality features
-encoder = HashingEncoder(cols=categorical, n_components=32)
-X_cat = encoder.fit_transform(df[categorical])
-X = pd.concat([X_cat.reset_index(drop=True), df[numeric].reset_index(drop=True)], axis=1)
+# Store labeled copy in run folder
+df.to_json(RUN_DIR / "feedback.json", orient="records", indent=2, force_ascii=False)
+print(f"Feedback saved to: {RUN_DIR}/feedback.json")
 
-# Add unsupervised feature which is Isolation Forest anomaly score
-iso = IsolationForest(n_estimators=100, contamination=0.01, random_state=42)
-iso.fit(X)
-df["isoforest_score"] = iso.decision_function(X)
-X["isoforest_score"] = df["isoforest_score"]
+# Encode high-cardinality features and add the Isolation Forest anomaly score.
+# The encoded matrix is reused from the feature cache when this feedback set was encoded before.
+X, y, encoder, cache_hit = cached_feature_matrix(df, categorical, numeric, label="label")
+y = pd.Series(y, name="label")
 
-y = df["label"]
+# Train/validation split on a hash of the document _id. A document keeps its side while the store grows,
+# so rows the deployed or warm-started models trained on never move into the validation set.
+in_holdout = holdout_mask(doc_ids)
+if in_holdout.all() or not in_holdout.any():
+    print(f"Too little feedback for a validation holdout: {len(df)} labeled documents")
+    exit(1)
+X_train, X_val, y_train, y_val = X[~in_holdout], X[in_holdout], y[~in_holdout], y[in_holdout]
 
-# Train/test split
-X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=42)
+# Only feedback newer than what a deployed model was trained on is new for it in incremental mode
+cutoffs = deployed_cutoffs()
+new_rows = {}
+for name, cutoff in cutoffs.items():
+    new_mask = (feedback_time.loc[X_train.index] > cutoff).fillna(False).to_numpy()
+    new_rows[name] = (X_train[new_mask], y_train[new_mask])
+rows_new = {name: len(rows[0]) for name, rows in new_rows.items()}
+cutoff_text = ", ".join(f"{name} {cutoff.isoformat()}" for name, cutoff in cutoffs.items()) or "none"
+print(f"Training rows: {len(X_train)} | new per deployed model: {rows_new} (cutoffs: {cutoff_text})")
+has_cutoffs = all(name in new_rows for name in MODEL_NAMES)
+can_increment = has_cutoffs and all(incremental_possible(*new_rows[name]) for name in MODEL_NAMES)
 
-# Train and export candidate models
-models = {
-    "random_forest": RandomForestClassifier(n_estimators=100, random_state=42),
-    "logistic_regression": LogisticRegression(max_iter=1000),
-    "xgboost": XGBClassifier(use_label_encoder=False, eval_metric="logloss")
-}
-MODEL_DIR.mkdir(parents=True, exist_ok=True)
+mode = args.mode
+if mode == "incremental" and not has_cutoffs:
+    print("No feedback cutoff in the deployed model version — running a full retrain.")
+    mode = "full"
+elif mode == "incremental" and not can_increment:
+    print(f"Incremental mode needs at least {MIN_NEW_ROWS} new rows with both labels — falling back to full retrain.")
+    mode = "full"
+
+# Optional hyperparameter search. The chosen configs only apply to candidates trained from scratch.
+search_configs = None
+if args.search:
+    print(f"Hyperparameter search with a budget of {args.search_budget:.0f}s")
+    # Configs are scored on rows held out from X_train; X_val stays unseen for evaluate_models.py
+    X_search, X_search_val, y_search, y_search_val = search_split(X_train, y_train)
+    search_configs, leaderboard = run_search(make_fresh_models(), X_search, y_search, X_search_val, y_search_val,
+                                             args.search_budget)
+    with open(RUN_DIR / "search_best_configs.json", "w", encoding="utf-8") as f:
+        json.dump(search_configs, f, indent=2)
+    with open(RUN_DIR / "search_leaderboard.json", "w", encoding="utf-8") as f:
+        json.dump(leaderboard, f, indent=2)
+    print(f"Search results saved to: {RUN_DIR}/search_leaderboard.json")
+    if mode == "incremental":
+        print("Search configs need a retrain from scratch — switching to full mode.")
+        mode = "full"
+
+runs = {}
+for run_mode in (["full", "incremental"] if args.compare else [mode]):
+    if run_mode == "incremental" and not can_increment:
+        continue
+    if run_mode == "full":
+        trained, fit_stats = train_full(X_train, y_train, search_configs)
+    else:
+        trained, fit_stats = train_incremental(new_rows, X_train, y_train)
+    runs[run_mode] = {
+        "models": trained,
+        "fit_stats": fit_stats,
+        "fit_seconds": {name: stats["fit_seconds"] for name, stats in fit_stats["models"].items()},
+        "validation": {name: compute_metrics(y_val, model.predict(X_val)) for name, model in trained.items()},
+    }
+
+# Compare modes on time and validation metrics
+if args.compare:
+    comparison = {m: {"fit_seconds": r["fit_seconds"], "validation": r["validation"]} for m, r in runs.items()}
+    with open(RUN_DIR / "mode_comparison.json", "w", encoding="utf-8") as f:
+        json.dump(comparison, f, indent=2)
+    for run_mode, result in comparison.items():
+        for name, seconds in result["fit_seconds"].items():
+            print(f"{run_mode:<11} | {name:<19} | fit {seconds:7.2f}s | F1 {result['validation'][name]['f1']:.3f}")
+    print(f"Mode comparison saved to: {RUN_DIR}/mode_comparison.json")
 
-for name, model in models.items():
+# Export candidate models of the selected mode
+MODEL_DIR.mkdir(parents=True, exist_ok=True)
+for name, model in runs[mode]["models"].items():
     try:
-        model.fit(X_train, y_train)
         model_path = MODEL_DIR / f"{name}_candidate.pkl"
         if name == "xgboost":
             joblib.dump({
@@ -132,10 +346,26 @@ for name, model in models.items():
             }, model_path)
         else:
             joblib.dump(model, model_path)
-        print(f" {name} model saved.")
+        print(f" {name} model saved ({mode}).")
     except Exception as e:
-        print(f"Failed to train {name}: {e}")
+        print(f"Failed to save {name}: {e}")
 
-# Save validation set
-joblib.dump((X_val, y_val), RUN_DIR / "validation_set.pkl")
+# Save validation set, per-model fit stats and the feedback cutoff; evaluate_models.py stores the cutoff
+# with the registry version when a model is promoted
+save_arrays(RUN_DIR / "validation_set", X_val, y_val)
 print(f"Validation set saved.")
+
+with open(RUN_DIR / "fit_stats.json", "w", encoding="utf-8") as f:
+    json.dump({"mode": mode, **runs[mode]["fit_stats"]}, f, indent=2)
+print(f"Fit time and process peak memory per model saved to: {RUN_DIR}/fit_stats.json")
+
+feedback_cutoff = feedback_time.max() if feedback_time.notna().any() else None
+
+with open(RUN_DIR / "train_info.json", "w", encoding="utf-8") as f:
+    json.dump({
+        "mode": mode,
+        "feedback_cutoff": feedback_cutoff.isoformat() if feedback_cutoff is not None else None,
+        "rows_train": len(X_train),
+        "rows_new": rows_new,
+        "fit_seconds": runs[mode]["fit_seconds"],
+    }, f, indent=2)
@@ -9,23 +9,28 @@ It predicts if traffic is anomalous or normal and writes results to output files
 
 What it does:
 1. Loads SELECTED validation logs exported from elasticsearch.
-2. Does inline feature engineering via build_df.
+2. Does feature engineering via log_features.build_features (the build_df features).
 3. Encodes fields using pretrained hashing encoder.
 4. Adds isolation forest anomaly score.
-5. Loads three trained models and predicts labels.
+5. Loads three trained models from the current registry version (see model_registry.py) and predicts labels.
 6. Combines predictions using majority voting.
 7. Filters out false positives using trusted ip and port filters.
+8. Optionally scores the same encoded matrix with candidate models in shadow mode (see shadow_scoring.py).
+9. Times every stage through pipeline_metrics.py.
+
+The steps are plain functions so other entry points can reuse the feature + encode + vote path.
+pandas, joblib, sklearn and the feature code are imported on first use, so a run without new logs
+exits before loading any of them.
 """
 
 import os
-import pandas as pd
-import joblib
 import json
-from sklearn.ensemble import IsolationForest
 from pathlib import Path
 import sys
 sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
-from synthetic_data_creation import build_df
+import model_registry
+from pipeline_metrics import start_run, stage, add_bytes
+from profiling import start_profiling
 
 
 # Config
@@ -33,6 +38,7 @@ DATA_DIR = Path("../data")
 LATEST_LOGS_FILE = str(DATA_DIR / "validation_logs_latest.json")
 PATH_OUTPUT_ALL = str(DATA_DIR / "all_evaluated_logs_latest.json")
 PATH_OUTPUT_ANOMALIES = str(DATA_DIR / "predicted_anomalies_latest.json")
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
 
 # Feature columns
 RELEVANT_COLUMNS = [
@@ -56,95 +62,199 @@ ENCODER_INPUT_COLUMNS = [
     "proto_port_pair", "version_action_pair"
 ]
 
+CRITICAL_COLUMNS = [
+    "source.ip", "destination.ip", "network.transport", "event.action",
+    "source.port", "destination.port", "session.iflow_bytes", "session.iflow_pkts"
+]
+
 LOW_RISK_PORTS = {67, 68, 123, 161, 162, 443, 53, 9200}
 TRUSTED_SOURCE_IPS = {"10.192.96.7", "10.192.96.8", "10.192.96.4"}
 TRUSTED_DEST_IPS = {"193.190.77.36", "10.192.72.4", "193.190.147.185"}
 # ──────────────────────────────────────────────
 
-# Load data
-with open(LATEST_LOGS_FILE, "r", encoding="utf-8") as f:
-    records = json.load(f)
-flattened_data = [r["_source"] for r in records if "_source" in r]
-df = pd.json_normalize(flattened_data)
-print("Records loaded:", len(df))
 
-# Enrich logs with engineered features
-df = build_df(df)
+def read_records(path=LATEST_LOGS_FILE):
+    """Read the exported Elasticsearch hits."""
+    with stage("json_parse") as timer:
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        timer.rows = len(records)
+    add_bytes(bytes_in=os.path.getsize(path))
+    return records
 
-# Drop if critical fields missing
-critical = [
-    "source.ip", "destination.ip", "network.transport", "event.action",
-    "source.port", "destination.port", "session.iflow_bytes", "session.iflow_pkts"
-]
-print("Missing values before drop:")
-print(df[critical].isnull().sum())
 
-df.dropna(subset=critical, inplace=True)
-print("Number of rSows after cleanup:", len(df))
+def records_to_frame(records):
+    """Flatten the _source of the hits into one column per field."""
+    import pandas as pd
+    with stage("normalize", rows=len(records)):
+        flattened_data = [r["_source"] for r in records if "_source" in r]
+        return pd.json_normalize(flattened_data)
 
-# Encode features with pre-trained encoder
-MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
-xgb_bundle = joblib.load(os.path.join(MODEL_DIR, "xgboost_model.pkl"))
-xgb_model = xgb_bundle["model"]
-xgb_encoder = xgb_bundle["encoder"]
-xgb_expected_columns = xgb_bundle["columns"]
-
-# Prepare encoded features
-df[ENCODER_INPUT_COLUMNS] = df[ENCODER_INPUT_COLUMNS].astype(str)
-X_encoded = xgb_encoder.transform(df[ENCODER_INPUT_COLUMNS])
-
-# Add numeric features
-for col in NUMERIC_COLUMNS:
-    X_encoded[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
-
-# Add anomaly score using Isolation Forest
-iso_forest = IsolationForest(n_estimators=100, contamination=0.01, random_state=42)
-iso_forest.fit(X_encoded)
-df["isoforest_score"] = iso_forest.decision_function(X_encoded)
-X_encoded["isoforest_score"] = df["isoforest_score"]
-
-# Prepare XGBoost input
-X_encoded_xgb = X_encoded.copy()
-X_encoded_xgb = X_encoded_xgb[xgb_expected_columns]
-
-# Load other trained models
-rf_model = joblib.load(os.path.join(MODEL_DIR, "random_forest_model.pkl"))
-log_model = joblib.load(os.path.join(MODEL_DIR, "logistic_regression_model.pkl"))
-
-# Make predictions
-df["RF_pred"] = rf_model.predict(X_encoded)
-df["LOG_pred"] = log_model.predict(X_encoded)
-df["XGB_pred"] = xgb_model.predict(X_encoded_xgb)
-
-df["RF_score"] = rf_model.predict_proba(X_encoded)[:, 1]
-df["LOG_score"] = log_model.predict_proba(X_encoded)[:, 1]
-df["XGB_score"] = xgb_model.predict_proba(X_encoded_xgb)[:, 1]
-
-# Combine scores to get an average confidence
-df["model_score"] = df[["RF_score", "LOG_score", "XGB_score"]].mean(axis=1)
-
-# Add feedback placeholders
-df["user_feedback"] = None
-df["reviewed"] = False
-
-# Save full output
-df.to_json(PATH_OUTPUT_ALL, orient="records", indent=2)
-print(f"✔ All evaluated logs saved to: {PATH_OUTPUT_ALL}")
-
-# Apply majority voting: Anomaly if 2 out of 3 models say so.
-model_preds = df[["RF_pred", "LOG_pred", "XGB_pred"]].sum(axis=1)
-df_anomalies = df[model_preds >= 2]
-print(f"\nTotal anomalies predicted by majority voting: {len(df_anomalies)}")
-
-# Filter out safe traffic
-df_anomalies_filtered = df_anomalies[
-    ~df_anomalies["destination.port"].isin(LOW_RISK_PORTS) &
-    ~df_anomalies["source.ip"].isin(TRUSTED_SOURCE_IPS) &
-    ~df_anomalies["destination.ip"].isin(TRUSTED_DEST_IPS)
-].copy()
-print(f"Final filtered anomalies: {len(df_anomalies_filtered)}")
-
-df_anomalies_filtered["user_feedback"] = None
-df_anomalies_filtered["reviewed"] = False
-df_anomalies_filtered.to_json(PATH_OUTPUT_ANOMALIES, orient="records", indent=2)
-print(f"Anomalies saved to: {PATH_OUTPUT_ANOMALIES}")
+
+def load_logs(path=LATEST_LOGS_FILE):
+    """Read the exported Elasticsearch hits and flatten their _source."""
+    return records_to_frame(read_records(path))
+
+
+def documents_to_frame(documents):
+    """Flatten Elasticsearch hits or plain documents and remember each row's input position."""
+    import pandas as pd
+    sources = [doc.get("_source", doc) for doc in documents]
+    df = pd.json_normalize(sources)
+    df["_input_row"] = range(len(df))
+    return df
+
+
+def prepare_features(df, verbose=True):
+    """Enrich logs with engineered features and drop rows missing critical fields."""
+    from log_features import build_features
+    with stage("build_df", rows=len(df)):
+        df = build_features(df)
+    if verbose:
+        print("Missing values before drop:")
+        print(df[CRITICAL_COLUMNS].isnull().sum())
+    df = df.dropna(subset=CRITICAL_COLUMNS).reset_index(drop=True)
+    if verbose:
+        print("Number of rows after cleanup:", len(df))
+    return df
+
+
+def load_bundle(model_dir=MODEL_DIR, suffix="model"):
+    """Load the three models. The XGBoost file carries the encoder and the expected column order.
+
+    Args:
+        model_dir (str): Folder with the model files.
+        suffix (str, optional): "model" for the deployed files, "candidate" for retrained ones.
+
+    Returns:
+        dict: rf, log and xgb models plus encoder and xgb_columns.
+    """
+    import joblib
+    xgb_bundle = joblib.load(os.path.join(model_dir, f"xgboost_{suffix}.pkl"))
+    return {
+        "xgb": xgb_bundle["model"],
+        "encoder": xgb_bundle["encoder"],
+        "xgb_columns": xgb_bundle["columns"],
+        "rf": joblib.load(os.path.join(model_dir, f"random_forest_{suffix}.pkl")),
+        "log": joblib.load(os.path.join(model_dir, f"logistic_regression_{suffix}.pkl")),
+    }
+
+
+def encode(df, bundle):
+    """Encode with the pre-trained encoder and add the isolation forest score to df and the matrix."""
+    from feature_cache import encode_features
+    df[ENCODER_INPUT_COLUMNS] = df[ENCODER_INPUT_COLUMNS].astype(str)
+    X_encoded, _ = encode_features(df, ENCODER_INPUT_COLUMNS, NUMERIC_COLUMNS, encoder=bundle["encoder"])
+    df["isoforest_score"] = X_encoded["isoforest_score"].to_numpy()
+    return X_encoded
+
+
+def predict(X_encoded, bundle):
+    """Predictions and scores of the three models for an encoded matrix."""
+    import pandas as pd
+    X_encoded_xgb = X_encoded[bundle["xgb_columns"]]
+    preds = pd.DataFrame(index=X_encoded.index)
+    rows = len(X_encoded)
+    with stage("model_random_forest", rows=rows):
+        preds["RF_pred"] = bundle["rf"].predict(X_encoded)
+        preds["RF_score"] = bundle["rf"].predict_proba(X_encoded)[:, 1]
+    with stage("model_logistic_regression", rows=rows):
+        preds["LOG_pred"] = bundle["log"].predict(X_encoded)
+        preds["LOG_score"] = bundle["log"].predict_proba(X_encoded)[:, 1]
+    with stage("model_xgboost", rows=rows):
+        preds["XGB_pred"] = bundle["xgb"].predict(X_encoded_xgb)
+        preds["XGB_score"] = bundle["xgb"].predict_proba(X_encoded_xgb)[:, 1]
+    preds = preds[["RF_pred", "LOG_pred", "XGB_pred", "RF_score", "LOG_score", "XGB_score"]]
+
+    # Combine scores to get an average confidence
+    preds["model_score"] = preds[["RF_score", "LOG_score", "XGB_score"]].mean(axis=1)
+    return preds
+
+
+def majority_vote(preds):
+    """Anomaly if 2 out of 3 models say so."""
+    return preds[["RF_pred", "LOG_pred", "XGB_pred"]].sum(axis=1) >= 2
+
+
+def safe_traffic_mask(df):
+    """True for rows that match the trusted ip and low-risk port filters."""
+    return (
+        df["destination.port"].isin(LOW_RISK_PORTS) |
+        df["source.ip"].isin(TRUSTED_SOURCE_IPS) |
+        df["destination.ip"].isin(TRUSTED_DEST_IPS)
+    )
+
+
+def score(df, bundle):
+    """Encode, predict and vote. Returns (scored df, encoded matrix, anomaly mask after filters)."""
+    X_encoded = encode(df, bundle)
+    preds = predict(X_encoded, bundle)
+    for col in preds.columns:
+        df[col] = preds[col].to_numpy()
+    with stage("vote_filter", rows=len(df)):
+        anomalies = majority_vote(preds).to_numpy() & ~safe_traffic_mask(df).to_numpy()
+    return df, X_encoded, anomalies
+
+
+def main():
+    start_run("ML_batch_scan")
+    start_profiling("ML_batch_scan")  # --profile or PIPELINE_PROFILE=1
+
+    # Load data
+    records = read_records()
+    print("Records loaded:", len(records))
+
+    # Nothing new in this window: write empty outputs without loading pandas or the models
+    if not records:
+        for path in (PATH_OUTPUT_ALL, PATH_OUTPUT_ANOMALIES):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump([], f)
+        print("No logs to score. Empty outputs written.")
+        return
+    df = records_to_frame(records)
+
+    # Enrich logs with engineered features
+    df = prepare_features(df)
+
+    # Encode features with pre-trained encoder, add isolation forest score and predict
+    # Models come from the current registry version, or models/ before the first version exists
+    model_dir = model_registry.current_model_dir(fallback=MODEL_DIR)
+    print("Using models from:", model_dir)
+    bundle = load_bundle(model_dir)
+    df, X_encoded, anomaly_mask = score(df, bundle)
+
+    # Optional shadow scoring of candidate models on the same encoded matrix
+    if os.getenv("SHADOW_MODEL_DIR"):
+        from shadow_scoring import run_shadow
+        run_shadow(df, X_encoded, anomaly_mask, os.getenv("SHADOW_MODEL_DIR"))
+
+    # Flag after the safe traffic filter, so the exporter's retention policy keeps these rows in full
+    df["predicted_anomaly"] = anomaly_mask
+
+    # Add feedback placeholders
+    df["user_feedback"] = None
+    df["reviewed"] = False
+
+    # Save full output
+    with stage("serialize", rows=len(df)):
+        df.to_json(PATH_OUTPUT_ALL, orient="records", indent=2)
+    add_bytes(bytes_out=os.path.getsize(PATH_OUTPUT_ALL))
+    print(f"✔ All evaluated logs saved to: {PATH_OUTPUT_ALL}")
+
+    # Apply majority voting: Anomaly if 2 out of 3 models say so.
+    print(f"\nTotal anomalies predicted by majority voting: {int(majority_vote(df).sum())}")
+
+    # Filter out safe traffic
+    df_anomalies_filtered = df[anomaly_mask].copy()
+    print(f"Final filtered anomalies: {len(df_anomalies_filtered)}")
+
+    df_anomalies_filtered["user_feedback"] = None
+    df_anomalies_filtered["reviewed"] = False
+    with stage("serialize", rows=len(df_anomalies_filtered)):
+        df_anomalies_filtered.to_json(PATH_OUTPUT_ANOMALIES, orient="records", indent=2)
+    add_bytes(bytes_out=os.path.getsize(PATH_OUTPUT_ANOMALIES))
+    print(f"Anomalies saved to: {PATH_OUTPUT_ANOMALIES}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,10 +11,10 @@ What it does:
 1. Loads the synthetic dataset created via synthetic_data_creation.py.
 2. Defines relevant feature columns incl. numeric and categorical.
 3. Encodes string fields using hashing so we dont need category list.
-4. Enriches the features with isolation forest anomaly score.
-5. Trains three classifiers. Random forest, logistic regression and xgboost.
+4. Enriches the features with isolation forest anomaly score. Both steps are cached by feature_cache.py.
+5. Trains three classifiers at the same time. Random forest, logistic regression and xgboost.
 6. Evaluates the models using standard metrics.
-7. Saves trained models to a shared location for reuse.
+7. Saves trained models to a shared location for reuse and publishes them as the current registry version.
 """
 
 
@@ -22,12 +22,14 @@ import pandas as pd
 import json
 import os
 import joblib
-from category_encoders import HashingEncoder
-from sklearn.ensemble import IsolationForest, RandomForestClassifier
+from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
 from xgboost import XGBClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from training_scheduler import run_fits
+from feature_cache import cached_feature_matrix
+import model_registry
 
 
 # load network logs from synthetic data file
@@ -58,21 +60,14 @@ df = df[required_columns].dropna()
 # needed before encoding
 df[categorical_features] = df[categorical_features].astype(str)
 
-# use hashing encoder so we don't need to track the possible values
-encoder = HashingEncoder(cols=categorical_features, n_components=32)
-X_cat_encoded = encoder.fit_transform(df[categorical_features])
-
-# Combine numeric + encoded categorical into one big feature set
-X = pd.concat([X_cat_encoded, df[numeric_features].reset_index(drop=True)], axis=1)
-
-# Add anomaly score from isolation forest for hybrid learning
-iso = IsolationForest(n_estimators=100, contamination=0.01, random_state=42)
-iso.fit(X)
-df["isoforest_score"] = iso.decision_function(X)
-X["isoforest_score"] = df["isoforest_score"]
+# use hashing encoder so we don't need to track the possible values,
+# combine numeric + encoded categorical into one big feature set
+# and add anomaly score from isolation forest for hybrid learning.
+# The encoded matrix is cached so reruns on the same dataset skip this step.
+X, y, encoder, cache_hit = cached_feature_matrix(df, categorical_features, numeric_features, label="label")
 
 # Tis is the column we're trying to predict
-y = df["label"]
+y = pd.Series(y, name="label")
 
 # Cut data into training and testing so we can evaluate. Industry standard is 80/20 split.
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -82,10 +77,13 @@ rf = RandomForestClassifier(random_state=42)
 log = LogisticRegression(max_iter=3000)
 xgb = XGBClassifier(eval_metric="logloss")
 
-# Train models using our training set
-rf.fit(X_train, y_train)
-log.fit(X_train, y_train)
-xgb.fit(X_train, y_train)
+# Train models at the same time under the CPU budget (TRAIN_CPU_BUDGET)
+fitted, fit_stats = run_fits({
+    "random_forest": {"model": rf, "X": X_train, "y": y_train},
+    "logistic_regression": {"model": log, "X": X_train, "y": y_train},
+    "xgboost": {"model": xgb, "X": X_train, "y": y_train},
+})
+rf, log, xgb = fitted["random_forest"], fitted["logistic_regression"], fitted["xgboost"]
 
 # Make predictions using the test data
 y_rf = rf.predict(X_test)
@@ -121,4 +119,16 @@ xgb_bundle = {
 }
 joblib.dump(xgb_bundle, os.path.join(MODEL_DIR, "xgboost_model.pkl"))
 
+# Keep fit time and process peak memory per model next to the models
+with open(os.path.join(MODEL_DIR, "fit_stats.json"), "w", encoding="utf-8") as f:
+    json.dump(fit_stats, f, indent=2)
+
+# Publish the new models as a registry version and make it current, so running scorers pick it up
+if os.getenv("REGISTER_MODELS", "1") == "1":
+    version = model_registry.publish(
+        {name: os.path.join(MODEL_DIR, model_registry.model_filename(name)) for name in model_registry.MODEL_NAMES},
+        {"source": "ML_model_training", "fit_stats": fit_stats},
+    )
+    model_registry.set_current(version, reason="initial training")
+
 print("\nAll models are trained and saved with expanded features!")
@@ -6,32 +6,46 @@ Project: Bachelorproef — Data-driven anomaly detection on network logs
 Purpose:
 This script exports anomaly detection results back into Elasticsearch.
 It pushes two sets of data:
-1. Anomalies that were predicted as suspicious.
-2. All evaluated logs so normal and anomalous.
+1. Anomalies that were predicted as suspicious, coalesced into incidents (incidents.py): one document
+   per ongoing incident, updated in place with scripted upserts. The members an incident references
+   (MAX_MEMBER_REFS) get an anomaly document each; the rest are only counted, so a sustained attack stops
+   adding anomaly documents. INCIDENTS=0 turns the incidents off and writes every anomaly again;
+   EXPORT_ALERT_DOCS=0 only keeps the incidents, with members pointing at the all logs index.
+2. All evaluated logs so normal and anomalous. With the default retention policy (retention.py) only
+   flagged, near-threshold and a stratified sample of normal logs are indexed in full; the rest goes
+   to the rollup index as per-minute aggregates. RETENTION_MODE=full indexes every log like before.
 
+The export itself is in results_export.py, which the Elasticsearch sink of stream_scorer.py uses as well.
 Used for visualizations, feedback loops and a Kibana dashboard.
 """
 
 import os
 import json
-import pandas as pd
 from datetime import datetime
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk, BulkIndexError
 from dotenv import load_dotenv
+from pipeline_metrics import start_run, stage, add_bytes
+from profiling import start_profiling
+# Indices, retention and incident settings live with the export path, shared with stream_scorer.py
+from results_export import (INDEX_NAME, ALL_LOGS_INDEX, INCIDENTS_ENABLED, EXPORT_ALERT_DOCS,
+                            export_incidents, export_alert_docs, export_evaluated_logs)
 
 # Load environment config
 load_dotenv()
 ES_HOST = os.getenv("ES_HOST")
 ES_API_KEY = os.getenv("ES_API_KEY")
 
-# Target indices in Elasticsearch
-INDEX_NAME = "network-anomalies-realtime"
-ALL_LOGS_INDEX = "network-anomalies-all-realtime"
-
 # Automatically select the latest files
 INPUT_JSON = "../data/predicted_anomalies_latest.json"
 ALL_LOGS_JSON = "../data/all_evaluated_logs_latest.json"
+# Incidents created/updated by this run, read by send_mail.py
+INCIDENTS_JSON = "../data/incidents_latest.json"
+
+
+# Stage timings of this run go to data/pipeline_metrics.jsonl; only when run as a script, not on import
+if __name__ == "__main__":
+    start_run("elasticsearch_export")
+    start_profiling("elasticsearch_export")  # --profile or PIPELINE_PROFILE=1
 
 # Fallback check
 if not os.path.exists(INPUT_JSON):
@@ -52,43 +66,40 @@ es = Elasticsearch(
 )
 
 # Load anomaly records and prepare them
-with open(INPUT_JSON, "r", encoding="utf-8") as f:
-    records = json.load(f)
+with stage("json_parse"):
+    with open(INPUT_JSON, "r", encoding="utf-8") as f:
+        records = json.load(f)
+add_bytes(bytes_in=os.path.getsize(INPUT_JSON))
 print(f"Anomaly records loaded: {len(records)}")
 
-df = pd.DataFrame(records)
-df.columns = [col.replace(".", "_") for col in df.columns]
-df["user_feedback"] = df.get("user_feedback", "unknown")
-df["reviewed"] = df.get("reviewed", False)
-df["batch_timestamp"] = datetime.utcnow().isoformat()
-df = df.fillna("unknown")
+# Coalesce anomalies into incidents; members are referenced by their _id in the anomaly index,
+# or in the all logs index when no anomaly documents are written
+# The batch id makes a rerun of this export a no-op for incidents and rollups
+batch_id = os.getenv("PIPELINE_RUN_ID") or os.getenv("GITHUB_RUN_ID") or datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+write_alert_docs, alert_doc_ids = EXPORT_ALERT_DOCS, None
+if INCIDENTS_ENABLED:
+    incident_summary = export_incidents(es, records, batch_id, INDEX_NAME if EXPORT_ALERT_DOCS else ALL_LOGS_INDEX)
+    # The referenced members; kept out of the mailer's summary file
+    alert_doc_ids = incident_summary.pop("alert_doc_ids", None)
+    if "error" in incident_summary:
+        write_alert_docs = True
+    with open(INCIDENTS_JSON, "w", encoding="utf-8") as f:
+        json.dump(incident_summary, f, indent=2)
+elif os.path.exists(INCIDENTS_JSON):
+    # Without incidents the mailer falls back to the anomaly file; don't leave an old summary behind
+    os.remove(INCIDENTS_JSON)
 
-# Upload anomaly data to index
-try:
-    success, _ = bulk(es, ({"_index": INDEX_NAME, "_source": row.to_dict()} for _, row in df.iterrows()))
-    print(f"{success} anomaly records uploaded to: {INDEX_NAME}")
-except BulkIndexError as e:
-    print(f"{len(e.errors)} anomaly records failed.")
-    for err in e.errors[:5]:
-        print(json.dumps(err, indent=2))
+# Upload anomaly data to index: the incident members, or every anomaly when the incidents failed or are off
+if write_alert_docs:
+    export_alert_docs(es, records, only_ids=alert_doc_ids)
 
 # Load full evaluated logs @todo: performance
-with open(ALL_LOGS_JSON, "r", encoding="utf-8") as f:
-    full_records = json.load(f)
+with stage("json_parse"):
+    with open(ALL_LOGS_JSON, "r", encoding="utf-8") as f:
+        full_records = json.load(f)
+add_bytes(bytes_in=os.path.getsize(ALL_LOGS_JSON))
 print(f"All evaluated records loaded: {len(full_records)}")
 
-df_all = pd.DataFrame(full_records)
-df_all.columns = [col.replace(".", "_") for col in df_all.columns]
-df_all["user_feedback"] = df_all.get("user_feedback", "unknown")
-df_all["reviewed"] = df_all.get("reviewed", False)
-df_all["batch_timestamp"] = datetime.utcnow().isoformat()
-df_all = df_all.fillna("unknown")
-
-# Upload all evaluated logs
-try:
-    success, _ = bulk(es, ({"_index": ALL_LOGS_INDEX, "_source": row.to_dict()} for _, row in df_all.iterrows()))
-    print(f"{success} full records uploaded to: {ALL_LOGS_INDEX}")
-except BulkIndexError as e:
-    print(f"{len(e.errors)} full records failed.")
-    for err in e.errors[:5]:
-        print(json.dumps(err, indent=2))
+# Retention policy (flagged, near-threshold and sampled logs in full, the rest rolled up per minute),
+# then upload the evaluated logs and the rollups
+export_evaluated_logs(es, full_records, batch_id)
@@ -20,6 +20,8 @@ from elasticsearch.helpers import scan
 from dotenv import load_dotenv
 import traceback
 from dateutil import parser as dateutil_parser
+from pipeline_metrics import start_run, stage, add_bytes, es_took
+from profiling import start_profiling
 
 # Load credentials from .env file
 load_dotenv()
@@ -31,6 +33,11 @@ INDEX = "logs-*"
 TRACKING_INDEX = "etl-log-tracking"
 PIPELINE_NAME = "vives-etl"
 
+# Stage timings of this run go to data/pipeline_metrics.jsonl; only when run as a script, not on import
+if __name__ == "__main__":
+    start_run("elasticsearch_import")
+    start_profiling("elasticsearch_import")  # --profile or PIPELINE_PROFILE=1
+
 # Connect to Elasticsearch
 es = Elasticsearch(
     ES_HOST,
@@ -50,6 +57,7 @@ def get_last_run_time():
         print(f"DEBUG: Querying TRACKING_INDEX with: {json.dumps(query_body)}")
 
         res = es.search(index=TRACKING_INDEX, body=query_body)
+        es_took(res)
 
         try:
             response_summary_for_log = dict(res)
@@ -135,12 +143,16 @@ query = {
 OUTPUT_PATH = "../data/validation_logs_latest.json"
 
 try:
-    results = scan(es, query=query, index=INDEX, size=5000)
-    docs = list(results)
+    with stage("es_fetch") as timer:
+        results = scan(es, query=query, index=INDEX, size=5000)
+        docs = list(results)
+        timer.rows = len(docs)
     print(f"Retrieved {len(docs)} logs.")
     os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(docs, f, indent=2)
+    with stage("serialize", rows=len(docs)):
+        with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+            json.dump(docs, f, indent=2)
+    add_bytes(bytes_out=os.path.getsize(OUTPUT_PATH))
     print(f"Saved logs to {OUTPUT_PATH}")
 except Exception as e:
     print(f"Error fetching logs: {e}")
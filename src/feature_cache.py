@@ -0,0 +1,167 @@
+"""
+Script: feature_cache.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Encoded feature matrices shared by ML_model_training.py, retrain_models.py and evaluate_models.py.
+
+What it does:
+1. encode_features() is the one place where categoricals are hashed, the numeric block is added
+   and the isolation forest score is appended.
+2. The encoded matrix is cached under a key that hashes the input rows, the feature schema
+   and the encoder config. A rerun on the same data skips the encoding stage entirely.
+3. Matrices are stored as .npy files plus columns.json so they can be memory mapped on load.
+   The same format is used for validation sets in the training run folders.
+4. The cache is evicted least recently used first once it grows over FEATURE_CACHE_MAX_MB.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pipeline_metrics import stage
+
+CACHE_DIR = Path(os.getenv("FEATURE_CACHE_DIR", Path(__file__).resolve().parents[1] / "data" / "feature_cache"))
+CACHE_MAX_MB = float(os.getenv("FEATURE_CACHE_MAX_MB", 1024))
+
+# Default encoder and isolation forest settings used by all training scripts
+ENCODER_CONFIG = {
+    "encoder": "HashingEncoder",
+    "n_components": 32,
+    "isoforest": {"n_estimators": 100, "contamination": 0.01, "random_state": 42},
+}
+
+
+def encode_features(df, categorical, numeric, encoder=None, config=ENCODER_CONFIG):
+    """Hash categoricals, add the numeric block and the isolation forest score.
+
+    Args:
+        df (pd.DataFrame): Rows with the categorical and numeric feature columns.
+        categorical (list): Columns to hash.
+        numeric (list): Columns used as numbers. Values that are not numeric become 0.
+        encoder (HashingEncoder, optional): Fitted encoder to reuse. A new one is fitted when missing.
+        config (dict, optional): Encoder and isolation forest settings.
+
+    Returns:
+        tuple: (encoded feature matrix, encoder)
+    """
+    from category_encoders import HashingEncoder
+    from sklearn.ensemble import IsolationForest
+
+    with stage("encoding", rows=len(df)):
+        cat = df[categorical].astype(str)
+        if encoder is None:
+            encoder = HashingEncoder(cols=categorical, n_components=config["n_components"])
+            X = encoder.fit_transform(cat)
+        else:
+            X = encoder.transform(cat)
+        X = X.reset_index(drop=True)
+
+        for col in numeric:
+            X[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).reset_index(drop=True).astype(float)
+
+    with stage("isolation_forest", rows=len(X)):
+        iso = IsolationForest(**config["isoforest"])
+        iso.fit(X)
+        X["isoforest_score"] = iso.decision_function(X)
+    return X, encoder
+
+
+def cache_key(df, categorical, numeric, label=None, config=ENCODER_CONFIG):
+    """Content hash of the input rows, the feature schema and the encoder config."""
+    columns = list(categorical) + list(numeric) + ([label] if label else [])
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"categorical": list(categorical), "numeric": list(numeric), "label": label,
+                              "config": config}, sort_keys=True).encode())
+    digest.update(pd.util.hash_pandas_object(df[columns], index=False).values.tobytes())
+    return digest.hexdigest()[:32]
+
+
+def save_arrays(directory, X, y=None, extra=None):
+    """Store a matrix as X.npy (+ y.npy) with its column names in columns.json."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    np.save(directory / "X.npy", np.ascontiguousarray(np.asarray(X, dtype=np.float64)))
+    if y is not None:
+        np.save(directory / "y.npy", np.asarray(y))
+    columns = [str(c) for c in X.columns] if hasattr(X, "columns") else list(range(np.shape(X)[1]))
+    with open(directory / "columns.json", "w", encoding="utf-8") as f:
+        json.dump({"columns": columns, "rows": int(np.shape(X)[0]), **(extra or {})}, f, indent=2)
+
+
+def load_arrays(directory, mmap=True):
+    """Load a matrix written by save_arrays. Returns (X DataFrame, y array or None)."""
+    directory = Path(directory)
+    with open(directory / "columns.json", encoding="utf-8") as f:
+        meta = json.load(f)
+    mode = "r" if mmap else None
+    X = pd.DataFrame(np.load(directory / "X.npy", mmap_mode=mode), columns=meta["columns"], copy=False)
+    y_path = directory / "y.npy"
+    y = np.load(y_path, mmap_mode=mode) if y_path.exists() else None
+    return X, y
+
+
+def _entry_size(entry):
+    return sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+
+
+def evict(cache_dir=CACHE_DIR, max_mb=CACHE_MAX_MB):
+    """Drop least recently used entries until the cache fits in max_mb."""
+    cache_dir = Path(cache_dir)
+    if not cache_dir.exists():
+        return []
+    entries = [e for e in cache_dir.iterdir() if (e / "columns.json").exists()]
+    sizes = {e: _entry_size(e) for e in entries}
+    total = sum(sizes.values())
+    removed = []
+    for entry in sorted(entries, key=lambda e: (e / "columns.json").stat().st_mtime):
+        if total <= max_mb * 1024 * 1024:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= sizes[entry]
+        removed.append(entry.name)
+    return removed
+
+
+def cached_feature_matrix(df, categorical, numeric, label=None, config=ENCODER_CONFIG, cache_dir=CACHE_DIR):
+    """Encoded matrix for df, read from the cache when the same input was encoded before.
+
+    Returns:
+        tuple: (X, y or None, encoder, cache hit as bool)
+    """
+    key = cache_key(df, categorical, numeric, label, config)
+    entry = Path(cache_dir) / key
+
+    if (entry / "columns.json").exists() and (entry / "encoder.pkl").exists():
+        X, y = load_arrays(entry)
+        encoder = joblib.load(entry / "encoder.pkl")
+        os.utime(entry / "columns.json")  # Mark as recently used
+        print(f"Feature matrix loaded from cache: {key}")
+        return X, y, encoder, True
+
+    X, encoder = encode_features(df, categorical, numeric, config=config)
+    y = df[label].to_numpy() if label else None
+
+    # Write to a temporary folder first so readers never see half an entry
+    tmp_entry = Path(cache_dir) / f".{key}.{os.getpid()}.tmp"
+    save_arrays(tmp_entry, X, y, extra={"key": key, "created": time.time(),
+                                        "categorical": list(categorical), "numeric": list(numeric)})
+    joblib.dump(encoder, tmp_entry / "encoder.pkl")
+    try:
+        os.replace(tmp_entry, entry)
+    except OSError:
+        # Another process stored the same key first
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+    evict(cache_dir)
+    print(f"Feature matrix encoded and cached: {key}")
+
+    # Hand back the stored version so hits and misses give the same dtypes
+    if (entry / "columns.json").exists():
+        X, y = load_arrays(entry)
+    return X, y, encoder, False
@@ -0,0 +1,163 @@
+"""
+Script: import_benchmark.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Measures the import cost of the pipeline scripts and fails when it grows past a startup budget.
+
+Each module is imported in a fresh interpreter with `python -X importtime`. The stderr lines
+("import time: self [us] | cumulative | imported package") are parsed into:
+- the total import time of the module,
+- the top-level packages with the highest cumulative time,
+- the heavy packages (pandas, sklearn, ...) that were loaded at import.
+
+A module fails when its import takes longer than its budget or loads a package it should only
+import on first use. Budgets are in milliseconds; override one with IMPORT_BUDGET_<MODULE>_MS,
+e.g. IMPORT_BUDGET_ML_BATCH_SCAN_MS=500.
+
+Usage:
+    python import_benchmark.py                    # all modules in BUDGETS_MS
+    python import_benchmark.py ML_batch_scan -n 5 # one module, best of 5 runs
+Exits with 1 when a module is over budget.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent
+
+# Startup budget per module in milliseconds (import only, no work done)
+BUDGETS_MS = {
+    "ML_batch_scan": 300,
+    "log_features": 1500,
+    "model_registry": 150,
+    "pipeline_metrics": 100,
+    "profiling": 100,
+}
+
+# Packages that must not be loaded by the import of these modules
+LAZY_PACKAGES = {
+    "ML_batch_scan": ["pandas", "joblib", "sklearn", "scipy", "xgboost", "category_encoders"],
+    "model_registry": ["pandas", "joblib", "sklearn"],
+    "pipeline_metrics": ["pandas", "elasticsearch"],
+}
+
+HEAVY_PACKAGES = ["pandas", "numpy", "scipy", "sklearn", "xgboost", "category_encoders", "joblib", "elasticsearch"]
+
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output.
+
+    Returns:
+        list[dict]: One entry per imported module with self_us, cumulative_us, depth and module.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        match = LINE_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        entries.append({
+            "module": module,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            # The first level is indented by one space, every level below by two more
+            "depth": (len(indent) - 1) // 2,
+        })
+    return entries
+
+
+def summarize(entries, target, top_n=10):
+    """Total import time of target, its most expensive packages and the heavy packages it loaded.
+
+    Only the import tree of target counts. Modules the interpreter loads at startup (site, ...) are
+    listed before it at depth 0 and are skipped.
+    """
+    subtree, block = [], []
+    for entry in entries:
+        block.append(entry)
+        if entry["depth"] == 0:
+            if entry["module"] == target:
+                subtree = block
+            block = []
+    subtree = subtree or entries
+
+    top_level = {}
+    for entry in subtree:
+        package = entry["module"].split(".")[0]
+        if entry["depth"] == 1 and package != target:
+            top_level[package] = top_level.get(package, 0) + entry["cumulative_us"]
+    total_us = subtree[-1]["cumulative_us"] if subtree[-1]["module"] == target else sum(e["self_us"] for e in subtree)
+    loaded = {e["module"].split(".")[0] for e in subtree}
+    return {
+        "module": target,
+        "total_ms": round(total_us / 1000, 1),
+        "top_packages": [{"package": p, "cumulative_ms": round(us / 1000, 1)}
+                         for p, us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:top_n]],
+        "heavy_loaded": sorted(p for p in HEAVY_PACKAGES if p in loaded),
+    }
+
+
+def measure(module, runs=3, python=sys.executable):
+    """Import module in fresh interpreters and keep the fastest run (least disturbed by the OS)."""
+    best = None
+    env = dict(os.environ, PIPELINE_METRICS="0")
+    for _ in range(runs):
+        result = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=SRC_DIR, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+        report = summarize(parse_importtime(result.stderr), module)
+        if best is None or report["total_ms"] < best["total_ms"]:
+            best = report
+    return best
+
+
+def budget_for(module):
+    override = os.getenv(f"IMPORT_BUDGET_{module.upper()}_MS")
+    return float(override) if override else BUDGETS_MS.get(module)
+
+
+def check(report, budget_ms=None, lazy=()):
+    """Reasons why a report fails its budget. Empty list when it passes."""
+    problems = []
+    if budget_ms is not None and report["total_ms"] > budget_ms:
+        problems.append(f"import took {report['total_ms']} ms, budget is {budget_ms} ms")
+    eager = [p for p in lazy if p in report["heavy_loaded"]]
+    if eager:
+        problems.append(f"loads {', '.join(eager)} at import")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time benchmark with startup budgets.")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS_MS), help="Modules to import.")
+    parser.add_argument("-n", "--runs", type=int, default=3, help="Runs per module, the fastest counts.")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        report = measure(module, runs=args.runs)
+        budget_ms = budget_for(module)
+        problems = check(report, budget_ms, LAZY_PACKAGES.get(module, ()))
+        status = "FAIL" if problems else "ok"
+        print(f"{module}: {report['total_ms']} ms (budget {budget_ms} ms) {status}")
+        for row in report["top_packages"][:5]:
+            print(f"    {row['cumulative_ms']:8.1f} ms  {row['package']}")
+        if report["heavy_loaded"]:
+            print(f"    heavy packages loaded: {', '.join(report['heavy_loaded'])}")
+        for problem in problems:
+            print(f"    ✖ {problem}")
+        failed = failed or bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
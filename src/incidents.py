@@ -0,0 +1,276 @@
+"""
+Script: incidents.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Incident layer on top of the flagged logs of each batch.
+A long scan or a DDoS from one source is flagged again in every 5-minute batch. Instead of new
+anomaly documents and a new e-mail every time, alerts with the same signature are coalesced into
+one incident document that is updated in place as long as the alerts keep coming.
+
+What it does:
+1. Keys every flagged log by its signature (INCIDENT_SIGNATURE, default source.ip, destination.ip,
+   network.transport) and splits the alerts of one signature where they are more than
+   INCIDENT_GAP_S seconds apart.
+2. Looks up the latest incident of each signature; if it was seen within the gap the alerts are
+   added to it, otherwise a new incident starts.
+3. Sends one bulk request of scripted upserts: counters, first/last seen, max scores and references
+   to the member documents (capped at MAX_MEMBER_REFS) are updated by a painless script on the
+   incident itself, so there is no read-modify-write race between runs.
+4. Returns a summary (created/updated incidents) for the mailer, and the ids of the alerts the
+   incidents reference: only those get their own anomaly document, the rest is counted as overflow.
+
+A batch is only counted once per incident: rerunning the same batch is a no-op.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from elasticsearch.exceptions import NotFoundError
+from elasticsearch.helpers import streaming_bulk
+
+INCIDENT_INDEX = os.getenv("INCIDENT_INDEX", "network-incidents")
+INCIDENT_SIGNATURE = [f.strip() for f in os.getenv("INCIDENT_SIGNATURE", "source.ip,destination.ip,network.transport").split(",") if f.strip()]
+INCIDENT_GAP_S = int(os.getenv("INCIDENT_GAP_S", 1800))
+MAX_MEMBER_REFS = 200
+MAX_BATCH_IDS = 50
+
+SCORE_FIELDS = ["model_score", "RF_score", "LOG_score", "XGB_score", "isoforest_score"]
+MEMBER_ID_FIELDS = ["session.id", "@timestamp", "source.ip", "source.port", "destination.ip", "destination.port"]
+
+INCIDENT_MAPPINGS = {
+    "properties": {
+        "incident_id": {"type": "keyword"},
+        "signature_id": {"type": "keyword"},
+        "signature": {"type": "object"},
+        "signature_text": {"type": "keyword"},
+        "first_seen": {"type": "date"},
+        "last_seen": {"type": "date"},
+        "created_at": {"type": "date"},
+        "updated_at": {"type": "date"},
+        "alert_count": {"type": "long"},
+        "batches": {"type": "integer"},
+        "alerts_since_review": {"type": "long"},
+        "member_overflow": {"type": "long"},
+        "members": {"type": "object", "enabled": False},
+        "batch_ids": {"type": "keyword"},
+        "max_scores": {"type": "object"},
+        "status": {"type": "keyword"},
+        "user_feedback": {"type": "keyword"},
+        "reviewed": {"type": "boolean"},
+        "feedback_timestamp": {"type": "date"},
+    }
+}
+
+# Runs on the incident document for every upsert; an empty source means the incident is new
+UPSERT_SCRIPT = """
+def s = ctx._source;
+if (s.alert_count == null) {
+  s.incident_id = params.incident_id; s.signature_id = params.signature_id;
+  s.signature = params.signature; s.signature_text = params.signature_text;
+  s.first_seen = params.first_seen; s.last_seen = params.last_seen; s.created_at = params.now;
+  s.alert_count = 0; s.batches = 0; s.alerts_since_review = 0; s.member_overflow = 0;
+  s.members = []; s.batch_ids = []; s.max_scores = [:];
+  s.status = 'open'; s.user_feedback = 'unknown'; s.reviewed = false;
+}
+if (s.batch_ids.contains(params.batch_id)) { ctx.op = 'noop'; return; }
+s.batch_ids.add(params.batch_id);
+if (s.batch_ids.size() > params.max_batch_ids) { s.batch_ids.remove(0); }
+s.alert_count += params.count;
+s.batches += 1;
+if (s.reviewed == true) { s.alerts_since_review += params.count; }
+if (params.first_seen.compareTo(s.first_seen) < 0) { s.first_seen = params.first_seen; }
+if (params.last_seen.compareTo(s.last_seen) > 0) { s.last_seen = params.last_seen; }
+for (entry in params.max_scores.entrySet()) {
+  def current = s.max_scores[entry.getKey()];
+  if (current == null || entry.getValue() > current) { s.max_scores[entry.getKey()] = entry.getValue(); }
+}
+for (ref in params.members) {
+  if (s.members.size() < params.max_refs) { s.members.add(ref); } else { s.member_overflow += 1; }
+}
+s.member_overflow += params.extra_overflow;
+s.updated_at = params.now;
+"""
+
+
+def log_doc_id(row):
+    """Deterministic _id of an evaluated log, so incidents can reference it and reruns don't duplicate it."""
+    key = json.dumps([row.get(field, row.get(field.replace(".", "_"))) for field in MEMBER_ID_FIELDS], default=str)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:24]
+
+
+def signature_of(row, fields=None):
+    """Signature of an alert with ES-safe field names."""
+    return {field.replace(".", "_"): row.get(field) for field in (fields or INCIDENT_SIGNATURE)}
+
+
+def signature_id(signature):
+    return hashlib.sha1(json.dumps(signature, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:20]
+
+
+def parse_time(timestamp):
+    """Seconds precision is enough for the gap; handles ISO strings and epoch milliseconds."""
+    if isinstance(timestamp, (int, float)):
+        return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc)
+    return datetime.strptime(str(timestamp)[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+
+
+def segment_alerts(rows, fields=None, gap_s=INCIDENT_GAP_S):
+    """Alerts per signature, split where consecutive alerts are more than gap_s apart.
+
+    Returns:
+        list: Segments with signature, signature_id, first_seen, last_seen and rows, oldest first per signature.
+    """
+    by_signature = {}
+    for row in rows:
+        if row.get("@timestamp") is None:
+            continue
+        signature = signature_of(row, fields)
+        by_signature.setdefault(signature_id(signature), (signature, []))[1].append(row)
+
+    segments = []
+    for sig_id, (signature, members) in by_signature.items():
+        members.sort(key=lambda r: parse_time(r["@timestamp"]))
+        current = None
+        for row in members:
+            seen = parse_time(row["@timestamp"])
+            if current is None or (seen - current["_last"]).total_seconds() > gap_s:
+                current = {"signature_id": sig_id, "signature": signature, "rows": [], "_first": seen}
+                segments.append(current)
+            current["rows"].append(row)
+            current["_last"] = seen
+    for segment in segments:
+        segment["first_seen"] = segment.pop("_first").strftime("%Y-%m-%dT%H:%M:%SZ")
+        segment["last_seen"] = segment.pop("_last").strftime("%Y-%m-%dT%H:%M:%SZ")
+    return segments
+
+
+def ensure_index(es, index=INCIDENT_INDEX):
+    if not es.indices.exists(index=index):
+        es.indices.create(index=index, mappings=INCIDENT_MAPPINGS)
+
+
+def find_latest_incidents(es, signature_ids, index=INCIDENT_INDEX):
+    """Latest incident per signature: {signature_id: {"_id": ..., "last_seen": ..., "member_ids": {...}}}."""
+    if not signature_ids:
+        return {}
+    body = {
+        "size": len(signature_ids),
+        "query": {"terms": {"signature_id": sorted(signature_ids)}},
+        "collapse": {"field": "signature_id"},
+        "sort": [{"last_seen": "desc"}],
+        # The members tell how many reference slots are left (at most MAX_MEMBER_REFS ids per incident)
+        "_source": ["signature_id", "last_seen", "members"],
+    }
+    try:
+        hits = es.search(index=index, body=body)["hits"]["hits"]
+    except NotFoundError:
+        return {}
+    return {hit["_source"]["signature_id"]: {"_id": hit["_id"], "last_seen": hit["_source"]["last_seen"],
+                                             "member_ids": {ref["id"] for ref in hit["_source"].get("members", [])}}
+            for hit in hits}
+
+
+def assign_incidents(segments, latest, gap_s=INCIDENT_GAP_S):
+    """Incident id per segment: the latest incident of the signature when it is still active, else a new one."""
+    for segment in segments:
+        previous = latest.get(segment["signature_id"])
+        first_seen = parse_time(segment["first_seen"])
+        if previous and (first_seen - parse_time(previous["last_seen"])).total_seconds() <= gap_s:
+            segment["incident_id"] = previous["_id"]
+            segment["known_members"] = previous.get("member_ids", set())
+        else:
+            segment["incident_id"] = f"{segment['signature_id']}-{first_seen.strftime('%Y%m%dT%H%M%S')}"
+            segment["known_members"] = set()
+        # Later segments of the same signature continue from this one
+        latest[segment["signature_id"]] = {"_id": segment["incident_id"], "last_seen": segment["last_seen"]}
+    return segments
+
+
+def build_incident_actions(segments, batch_id, member_index, index=INCIDENT_INDEX, max_refs=MAX_MEMBER_REFS):
+    now = datetime.now(timezone.utc).isoformat()
+    actions = []
+    for segment in segments:
+        max_scores = {}
+        for row in segment["rows"]:
+            for field in SCORE_FIELDS:
+                value = row.get(field)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    max_scores[field] = max(value, max_scores.get(field, value))
+        signature = segment["signature"]
+        # Only the free reference slots are filled, so the referenced rows are known before the upsert
+        members = segment["rows"][:max(0, max_refs - len(segment.get("known_members", ())))]
+        actions.append({
+            "_op_type": "update",
+            "_index": index,
+            "_id": segment["incident_id"],
+            "scripted_upsert": True,
+            "upsert": {},
+            "script": {"source": UPSERT_SCRIPT, "lang": "painless", "params": {
+                "incident_id": segment["incident_id"],
+                "signature_id": segment["signature_id"],
+                "signature": signature,
+                "signature_text": " | ".join(str(v) for v in signature.values()),
+                "first_seen": segment["first_seen"],
+                "last_seen": segment["last_seen"],
+                "count": len(segment["rows"]),
+                "max_scores": max_scores,
+                "members": [{"index": member_index, "id": log_doc_id(row)} for row in members],
+                "max_refs": max_refs,
+                # Rows past the free slots are never sent, the script can only count them through this
+                "extra_overflow": len(segment["rows"]) - len(members),
+                "batch_id": batch_id,
+                "max_batch_ids": MAX_BATCH_IDS,
+                "now": now,
+            }},
+        })
+    return actions
+
+
+def upsert_incidents(es, rows, batch_id, member_index, index=INCIDENT_INDEX, fields=None, gap_s=INCIDENT_GAP_S):
+    """Coalesce the flagged rows of one batch into incidents with one bulk request.
+
+    Args:
+        es (Elasticsearch): Client.
+        rows (list): Flagged logs with dotted field names, as in predicted_anomalies_latest.json.
+        batch_id (str): Identifier of this batch; a batch is counted once per incident.
+        member_index (str): Index that holds the member logs (under log_doc_id).
+
+    Returns:
+        dict: Summary with per-incident results ("created", "updated", "noop" or "failed") and
+            "alert_doc_ids": the rows that still need their own anomaly document. Those are the
+            members the incidents reference, every row of a failed incident and rows without a timestamp.
+    """
+    segments = segment_alerts(rows, fields, gap_s)
+    summary = {"generated_at": datetime.now(timezone.utc).isoformat(), "batch_id": batch_id, "alerts": len(rows),
+               "incidents": [], "created": 0, "updated": 0, "failed": 0,
+               "alert_doc_ids": [log_doc_id(row) for row in rows if row.get("@timestamp") is None]}
+    if not segments:
+        return summary
+
+    ensure_index(es, index)
+    assign_incidents(segments, find_latest_incidents(es, {s["signature_id"] for s in segments}, index), gap_s)
+    actions = build_incident_actions(segments, batch_id, member_index, index)
+
+    results = {}
+    for ok, item in streaming_bulk(es, actions, raise_on_error=False, raise_on_exception=False):
+        info = next(iter(item.values()))
+        results[info.get("_id")] = info.get("result", "updated") if ok else "failed"
+
+    for segment, action in zip(segments, actions):
+        result = results.get(segment["incident_id"], "failed")
+        params = action["script"]["params"]
+        summary["incidents"].append({
+            "incident_id": segment["incident_id"], "signature": params["signature_text"], "alerts": params["count"],
+            "first_seen": segment["first_seen"], "last_seen": segment["last_seen"],
+            "max_model_score": params["max_scores"].get("model_score"), "result": result,
+        })
+        if result in ("created", "updated", "failed"):
+            summary[result] += 1
+        # A rerun (noop) finds its rows among the known members, so their documents are written again
+        referenced = segment["known_members"] | {ref["id"] for ref in params["members"]}
+        summary["alert_doc_ids"] += [doc_id for doc_id in map(log_doc_id, segment["rows"])
+                                     if result == "failed" or doc_id in referenced]
+    return summary
@@ -0,0 +1,85 @@
+"""
+Script: log_features.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Production feature engineering for network logs, split from synthetic_data_creation.py so the
+scorers do not import scipy, seed the global random generators or define the traffic generators.
+
+build_features() adds the same columns as build_df() always did:
+- flow statistics per source ip and minute (flow count, unique destination ports, port entropy),
+- traffic shape metrics (bytes ratio, bytes per packet, suspicious ratio),
+- the synthetic metadata fields the models were trained with (flow duration, tcp flags, agent version, ...).
+
+The metadata fields are random. By default they are drawn from generators seeded with 42, which gives
+exactly the values the batch scan got when build_df ran right after synthetic_data_creation seeded the
+global generators. synthetic_data_creation.build_df passes the global generators to keep its data unchanged.
+"""
+
+import random
+import numpy as np
+import pandas as pd
+
+FEATURE_SEED = 42
+
+MESSAGES = [
+    "component model updated",
+    "Updating running component model",
+    "Action delivered to agent on checkin",
+    "component started",
+    "heartbeat"
+]
+
+
+def port_entropy(ports):
+    """Shannon entropy (natural log) of the destination port distribution of one group."""
+    p = ports.value_counts(normalize=True).to_numpy()
+    return float(-(p * np.log(p)).sum()) if len(p) else 0.0
+
+
+def build_features(base_df, rng=None, py_rng=None):
+    """Add all engineered features and synthetic metadata fields to the dataset.
+
+    Args:
+        base_df (pd.DataFrame): The input DataFrame. Its @timestamp column is parsed in place.
+        rng (optional): numpy random generator with randint and choice. Defaults to RandomState(FEATURE_SEED).
+        py_rng (optional): Python random generator with randint. Defaults to Random(FEATURE_SEED).
+
+    Returns:
+        pd.DataFrame: The DataFrame with added features.
+    """
+    rng = rng if rng is not None else np.random.RandomState(FEATURE_SEED)
+    py_rng = py_rng if py_rng is not None else random.Random(FEATURE_SEED)
+
+    base_df["@timestamp"] = pd.to_datetime(base_df["@timestamp"])
+    df = base_df.copy()
+    df["timestamp_minute"] = df["@timestamp"].dt.floor('min')
+
+    # After extracting timestamp_minute, convert @timestamp to ISO 8601 string
+    df["@timestamp"] = df["@timestamp"].apply(
+        lambda ts: ts.strftime('%Y-%m-%dT%H:%M:%S.%f') + f"{py_rng.randint(0, 999):03d}Z"
+    )
+    # Flow statistics: how many flows/IP/minute and unique port spread
+    groups = df.groupby(["source.ip", "timestamp_minute"])
+    df["flow_count_per_minute"] = groups["session.id"].transform('count')
+    df["unique_dst_ports"] = groups["destination.port"].transform('nunique')
+
+    # Traffic shape metrics
+    df["bytes_ratio"] = df["session.iflow_bytes"] / (df["session.iflow_pkts"] + 1)
+    df["port_entropy"] = groups["destination.port"].transform(port_entropy)
+
+    # Synthetic metadata fields
+    df["flow.duration"] = rng.randint(10, 1000, len(df))
+    df["tcp.flags"] = rng.choice(["SYN", "ACK", "RST", "FIN", "PSH"], len(df))
+    df["agent.version"] = rng.choice(["8.17.1", "8.16.2", "8.15.0"], len(df))
+    df["fleet.action.type"] = rng.choice(["POLICY_CHANGE", "ENROLL", "ACKNOWLEDGE", "NONE"], len(df),
+                                         p=[0.2, 0.2, 0.2, 0.4])
+    df["message"] = rng.choice(MESSAGES, len(df))
+    df["msg_code"] = df["message"].astype("category").cat.codes
+    df["version_action_pair"] = df["agent.version"] + "-" + df["fleet.action.type"]
+    df["proto_port_pair"] = df["network.transport"] + "-" + df["destination.port"].astype(str)
+    df["bytes_per_pkt"] = df["session.iflow_bytes"] / (df["session.iflow_pkts"] + 1)
+    df["is_suspicious_ratio"] = (df["bytes_per_pkt"] < 2) | (df["bytes_per_pkt"] > 1000)
+    df["user_feedback"] = 0
+    return df
@@ -0,0 +1,282 @@
+"""
+Script: model_registry.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Small registry of immutable, versioned model directories with one "current" pointer.
+Used by ML_model_training.py and evaluate_models.py to publish models and by the scorers to load them.
+
+The registry is committed to the repository (the pickles through Git LFS like models/*.pkl):
+the retrain workflow pushes it after evaluation and the ETL workflow checks it out, so a
+promotion reaches the scorers and the version history does not depend on a CI cache.
+
+Layout (models/registry by default, MODEL_REGISTRY_DIR overrides it):
+    versions/<version>/random_forest_model.pkl, logistic_regression_model.pkl, xgboost_model.pkl
+    versions/<version>/manifest.json   sha256 and size per file plus metadata (run, metrics, parent and the
+                                       feedback cutoff per model, where incremental retraining continues)
+    CURRENT                            the version the scorers use
+    history.jsonl                      every pointer switch, used for rollback
+
+What it does:
+1. publish() writes a new version into a temporary folder and renames it into place, so a
+   version is either complete or absent. Files are made read-only afterwards. Git LFS pointer
+   files (a checkout without git lfs pull) are refused.
+2. set_current() switches the pointer by replacing the CURRENT file atomically. A scorer never
+   sees half a model: it reads a complete old version or a complete new one.
+3. rollback() flips the pointer back to the version that was current before.
+4. ModelReloader keeps a loaded bundle and reloads it between batches when the pointer changes.
+5. Without a current version the scorers fall back to models/*_model.pkl.
+
+CLI:
+    python src/model_registry.py list
+    python src/model_registry.py bootstrap          # publish models/*_model.pkl and make it current
+    python src/model_registry.py promote <version>
+    python src/model_registry.py rollback [--to <version>]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import stat
+from datetime import datetime, timezone
+from pathlib import Path
+
+MODEL_DIR = Path(__file__).resolve().parents[1] / "models"
+REGISTRY_DIR = Path(os.getenv("MODEL_REGISTRY_DIR", MODEL_DIR / "registry"))
+MODEL_NAMES = ["random_forest", "logistic_regression", "xgboost"]
+LFS_POINTER_PREFIX = b"version https://git-lfs.github.com/spec/v1"
+
+
+def model_filename(name):
+    # Same names as models/ so ML_batch_scan.load_bundle works on a version folder
+    return f"{name}_model.pkl"
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_lfs_pointer(path):
+    """True for a Git LFS pointer file instead of the model itself."""
+    with open(path, "rb") as f:
+        return f.read(len(LFS_POINTER_PREFIX)) == LFS_POINTER_PREFIX
+
+
+def _write_atomic(path, text):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def version_dir(version, registry_dir=REGISTRY_DIR):
+    return Path(registry_dir) / "versions" / version
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    versions_dir = Path(registry_dir) / "versions"
+    if not versions_dir.exists():
+        return []
+    return sorted(d.name for d in versions_dir.iterdir() if (d / "manifest.json").exists())
+
+
+def read_manifest(version, registry_dir=REGISTRY_DIR):
+    with open(version_dir(version, registry_dir) / "manifest.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def current_version(registry_dir=REGISTRY_DIR):
+    pointer = Path(registry_dir) / "CURRENT"
+    try:
+        version = pointer.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def deployed_feedback_cutoffs(registry_dir=REGISTRY_DIR):
+    """Newest feedback timestamp (ISO string) each model of the current version was trained on."""
+    version = current_version(registry_dir)
+    if version is None:
+        return {}
+    return dict(read_manifest(version, registry_dir)["metadata"].get("feedback_cutoffs") or {})
+
+
+def publish(artifacts, metadata=None, registry_dir=REGISTRY_DIR):
+    """Store a complete model set as a new immutable version. Does not switch the pointer.
+
+    Args:
+        artifacts (dict): Model name mapped to a file path to copy or an object to pickle.
+        metadata (dict, optional): Extra information for the manifest, e.g. run name and metrics.
+        registry_dir (Path, optional): Registry root.
+
+    Returns:
+        str: The new version id.
+
+    Raises:
+        ValueError: When a file artifact is a Git LFS pointer.
+    """
+    for name, artifact in artifacts.items():
+        if isinstance(artifact, (str, Path)) and is_lfs_pointer(artifact):
+            raise ValueError(f"{name}: {artifact} is a Git LFS pointer, run git lfs pull first")
+
+    registry_dir = Path(registry_dir)
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    tmp_dir = registry_dir / "versions" / f".{version}.tmp"
+    tmp_dir.mkdir(parents=True)
+
+    files = {}
+    for name, artifact in artifacts.items():
+        target = tmp_dir / model_filename(name)
+        if isinstance(artifact, (str, Path)):
+            shutil.copyfile(artifact, target)
+        else:
+            import joblib
+            joblib.dump(artifact, target)
+        files[name] = {"file": target.name, "sha256": _file_hash(target), "bytes": target.stat().st_size}
+
+    manifest = {
+        "version": version,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "parent": current_version(registry_dir),
+        "models": files,
+        "metadata": metadata or {},
+    }
+    with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    for path in tmp_dir.iterdir():
+        os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    os.replace(tmp_dir, version_dir(version, registry_dir))
+    print(f"Model version published: {version}")
+    return version
+
+
+def set_current(version, reason="", registry_dir=REGISTRY_DIR):
+    """Point the scorers to a published version with one atomic file replace."""
+    registry_dir = Path(registry_dir)
+    if not (version_dir(version, registry_dir) / "manifest.json").exists():
+        raise ValueError(f"Unknown model version: {version}")
+
+    previous = current_version(registry_dir)
+    _write_atomic(registry_dir / "CURRENT", version + "\n")
+    with open(registry_dir / "history.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps({"timestamp": datetime.now(timezone.utc).isoformat(), "version": version,
+                            "previous": previous, "reason": reason}) + "\n")
+    print(f"Current model version: {previous} -> {version}")
+    return previous
+
+
+def rollback(to=None, registry_dir=REGISTRY_DIR):
+    """Flip the pointer back to the version that was current before, or to a given version."""
+    current = current_version(registry_dir)
+    if to is None:
+        history_path = Path(registry_dir) / "history.jsonl"
+        entries = []
+        if history_path.exists():
+            with open(history_path, encoding="utf-8") as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        to = next((e["previous"] for e in reversed(entries) if e["version"] == current and e["previous"]), None)
+        if to is None:
+            raise ValueError(f"No earlier version to roll back to from {current}")
+    set_current(to, reason=f"rollback from {current}", registry_dir=registry_dir)
+    return to
+
+
+def current_model_dir(registry_dir=REGISTRY_DIR, fallback=MODEL_DIR):
+    """Folder with the *_model.pkl files the scorers should load."""
+    version = current_version(registry_dir)
+    return version_dir(version, registry_dir) if version else Path(fallback)
+
+
+def deployed_path(name, registry_dir=REGISTRY_DIR, fallback=MODEL_DIR):
+    """Path of the deployed model file, or None when there is none."""
+    path = current_model_dir(registry_dir, fallback) / model_filename(name)
+    return path if path.exists() else None
+
+
+def verify_version(version, registry_dir=REGISTRY_DIR):
+    """Names of model files whose content no longer matches the manifest."""
+    manifest = read_manifest(version, registry_dir)
+    folder = version_dir(version, registry_dir)
+    return [name for name, info in manifest["models"].items() if _file_hash(folder / info["file"]) != info["sha256"]]
+
+
+class ModelReloader:
+    """Keeps a loaded model bundle and reloads it when the current pointer changes.
+
+    Call get() between batches. Reading the pointer is one small file read, so it is cheap
+    to check every batch. If the new version fails to load the old bundle stays in use.
+
+    Args:
+        load (callable): Function(model_dir) returning the loaded bundle, e.g. ML_batch_scan.load_bundle.
+        registry_dir (Path, optional): Registry root.
+        fallback (Path, optional): Folder used while there is no current version.
+    """
+
+    def __init__(self, load, registry_dir=REGISTRY_DIR, fallback=MODEL_DIR):
+        self.load = load
+        self.registry_dir = registry_dir
+        self.fallback = fallback
+        self.version = None
+        self.bundle = None
+        self.reloads = 0
+
+    def get(self):
+        version = current_version(self.registry_dir)
+        if self.bundle is not None and version == self.version:
+            return self.bundle
+        try:
+            bundle = self.load(current_model_dir(self.registry_dir, self.fallback))
+        except Exception as e:
+            if self.bundle is None:
+                raise
+            print(f"Reload of model version {version} failed, keeping {self.version}: {e}")
+            return self.bundle
+        if self.bundle is not None:
+            print(f"Model version changed: {self.version} -> {version}")
+            self.reloads += 1
+        self.bundle, self.version = bundle, version
+        return self.bundle
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the versioned model registry.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Show all versions and the current one.")
+    sub.add_parser("bootstrap", help="Publish models/*_model.pkl as a version and make it current.")
+    promote_parser = sub.add_parser("promote", help="Make a published version current.")
+    promote_parser.add_argument("version")
+    rollback_parser = sub.add_parser("rollback", help="Return to the previous current version.")
+    rollback_parser.add_argument("--to", default=None)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_version()
+        for version in list_versions():
+            meta = read_manifest(version)["metadata"]
+            print(f"{'*' if version == current else ' '} {version}  {json.dumps(meta.get('run') or meta.get('source', ''))}")
+    elif args.command == "bootstrap":
+        version = publish({name: MODEL_DIR / model_filename(name) for name in MODEL_NAMES}, {"source": "bootstrap"})
+        set_current(version, reason="bootstrap from models/")
+    try:
+        if args.command == "promote":
+            set_current(args.version, reason="manual promote")
+        elif args.command == "rollback":
+            rollback(args.to)
+    except ValueError as e:
+        print(e)
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Script: pipeline_metrics.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Shared stage timing and throughput instrumentation for the pipeline scripts.
+
+What it does:
+1. start_run() starts one record per script run and registers it as the active run.
+2. with stage("build_df", rows=len(df)): times a stage. Stages with the same name add up.
+   Library code (feature_cache.py, ML_batch_scan.py) only calls stage(), so it is timed inside
+   whatever script is running and costs nothing when no run is active.
+3. count(), add_bytes() and es_took() add counters, bytes in/out and Elasticsearch "took" totals.
+4. At exit the record (durations, rows/sec, peak RSS, counters, bytes) is appended to
+   data/pipeline_metrics.jsonl and, when PIPELINE_METRICS_INDEX is set, indexed in Elasticsearch.
+
+Runs of the separate workflow steps share PIPELINE_RUN_ID (defaults to GITHUB_RUN_ID) so they can be joined.
+Set PIPELINE_METRICS=0 to disable everything.
+"""
+
+import atexit
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+METRICS_ENABLED = os.getenv("PIPELINE_METRICS", "1") == "1"
+METRICS_FILE = Path(os.getenv("PIPELINE_METRICS_FILE", Path(__file__).resolve().parents[1] / "data" / "pipeline_metrics.jsonl"))
+METRICS_INDEX = os.getenv("PIPELINE_METRICS_INDEX")  # e.g. "pipeline-metrics"
+
+_active_run = None
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class StageTimer:
+    """Handle returned by stage(). Rows can be set once they are known."""
+
+    __slots__ = ("rows",)
+
+    def __init__(self, rows=None):
+        self.rows = rows
+
+
+class PipelineRun:
+    """Timings and counters of one script run."""
+
+    def __init__(self, script, run_id=None):
+        self.script = script
+        self.run_id = run_id or os.getenv("PIPELINE_RUN_ID") or os.getenv("GITHUB_RUN_ID") \
+            or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.es_took_ms = 0
+        self.finished = False
+
+    def add_stage(self, name, seconds, rows):
+        entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "rows": 0})
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        if rows is not None:
+            entry["rows"] += int(rows)
+
+    def record(self, status="ok"):
+        stages = {}
+        for name, entry in self.stages.items():
+            stages[name] = {**entry, "seconds": round(entry["seconds"], 4)}
+            if entry["rows"] and entry["seconds"] > 0:
+                stages[name]["rows_per_sec"] = round(entry["rows"] / entry["seconds"], 1)
+        return {
+            "run_id": self.run_id,
+            "script": self.script,
+            "started_at": self.started_at,
+            "status": status,
+            "duration_s": round(time.perf_counter() - self._start, 4),
+            "stages": stages,
+            "counters": self.counters,
+            "es_took_ms": self.es_took_ms,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def finish(self, status="ok", metrics_file=None, es=None):
+        """Write the run record once. Returns the record."""
+        global _active_run
+        if self.finished:
+            return None
+        self.finished = True
+        if _active_run is self:
+            _active_run = None
+
+        record = self.record(status)
+        metrics_file = Path(metrics_file or METRICS_FILE)
+        try:
+            metrics_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(metrics_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Pipeline metrics not written to {metrics_file}: {e}")
+
+        if METRICS_INDEX:
+            try:
+                if es is None:
+                    from elasticsearch import Elasticsearch
+                    es = Elasticsearch(os.getenv("ES_HOST"), api_key=os.getenv("ES_API_KEY"), verify_certs=True)
+                es.index(index=METRICS_INDEX, document=record)
+            except Exception as e:
+                print(f"Pipeline metrics not indexed in {METRICS_INDEX}: {e}")
+
+        slowest = sorted(record["stages"].items(), key=lambda kv: kv[1]["seconds"], reverse=True)[:5]
+        print(f"Run {record['run_id']} ({self.script}): {record['duration_s']:.2f}s, peak RSS {record['peak_rss_mb']} MB | "
+              + ", ".join(f"{name} {s['seconds']:.2f}s" for name, s in slowest))
+        return record
+
+
+def start_run(script, run_id=None, es=None):
+    """Start the active run for this process. The record is written at exit if finish() is not called.
+
+    Returns:
+        PipelineRun or None when metrics are disabled.
+    """
+    global _active_run
+    if not METRICS_ENABLED:
+        return None
+    _active_run = PipelineRun(script, run_id)
+    run = _active_run
+    atexit.register(lambda: run.finish("exit", es=es))
+    return run
+
+
+def active_run():
+    return _active_run
+
+
+@contextmanager
+def _timed_stage(run, name, rows):
+    timer = StageTimer(rows)
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        run.add_stage(name, time.perf_counter() - start, timer.rows)
+
+
+@contextmanager
+def _null_stage(rows):
+    yield StageTimer(rows)
+
+
+def stage(name, rows=None):
+    """Time a block as one stage of the active run. A no-op when there is no active run."""
+    run = _active_run
+    if run is None:
+        return _null_stage(rows)
+    return _timed_stage(run, name, rows)
+
+
+def count(name, value=1):
+    run = _active_run
+    if run is not None:
+        run.counters[name] = run.counters.get(name, 0) + value
+
+
+def add_bytes(bytes_in=0, bytes_out=0):
+    run = _active_run
+    if run is not None:
+        run.bytes_in += int(bytes_in)
+        run.bytes_out += int(bytes_out)
+
+
+def es_took(response):
+    """Add the "took" of an Elasticsearch response (search or bulk) to the active run."""
+    run = _active_run
+    if run is not None:
+        try:
+            run.es_took_ms += int(response.get("took", 0))
+        except (AttributeError, TypeError, ValueError):
+            pass
@@ -0,0 +1,122 @@
+"""
+Script: profiling.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Common profiling switch for the pipeline entry points: elasticsearch_import.py, ML_batch_scan.py,
+elasticsearch_export.py, retrain_models.py and evaluate_models.py.
+
+Turn it on with --profile on the command line or PIPELINE_PROFILE=1. At exit the run writes to
+data/profiles/<script>_<timestamp>/:
+- profile.prof       cProfile dump, open with `python -m pstats` or snakeviz
+- profile.txt        the same sorted on cumulative time as text
+- allocations.txt    tracemalloc top-N allocation sites
+- summary.json       wall time, peak RSS, tracemalloc peak and the hottest functions
+A short list of the hottest functions is printed as well.
+
+Work done in forked training workers (training_scheduler.py) is not part of the cProfile data.
+"""
+
+import atexit
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from pipeline_metrics import peak_rss_mb
+
+PROFILE_DIR = Path(os.getenv("PIPELINE_PROFILE_DIR", Path(__file__).resolve().parents[1] / "data" / "profiles"))
+TOP_N = int(os.getenv("PIPELINE_PROFILE_TOP", 15))
+
+
+def profiling_enabled(argv=None):
+    argv = sys.argv if argv is None else argv
+    return "--profile" in argv or os.getenv("PIPELINE_PROFILE", "0") == "1"
+
+
+def hot_functions(stats, top_n=TOP_N):
+    """Functions with the most own time as dicts, hottest first."""
+    rows = []
+    for (filename, line, func), (_, n_calls, own_time, cum_time, _) in stats.stats.items():
+        rows.append({"function": f"{Path(filename).name}:{line}({func})", "calls": n_calls,
+                     "own_s": round(own_time, 4), "cumulative_s": round(cum_time, 4)})
+    rows.sort(key=lambda r: r["own_s"], reverse=True)
+    return rows[:top_n]
+
+
+class RunProfiler:
+    """cProfile plus tracemalloc for one script run."""
+
+    def __init__(self, script, out_dir=PROFILE_DIR, top_n=TOP_N):
+        self.script = script
+        self.top_n = top_n
+        self.out_dir = Path(out_dir) / f"{script}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.stopped = False
+
+    def start(self):
+        import tracemalloc
+        tracemalloc.start()
+        self._start = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def stop(self):
+        """Write the reports once. Returns the summary."""
+        if self.stopped:
+            return None
+        self.stopped = True
+        import pstats
+        import tracemalloc
+        self.profiler.disable()
+        wall_s = time.perf_counter() - self._start
+        snapshot = tracemalloc.take_snapshot()
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.profiler.dump_stats(str(self.out_dir / "profile.prof"))
+
+        text = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=text)
+        stats.sort_stats("cumulative").print_stats(50)
+        (self.out_dir / "profile.txt").write_text(text.getvalue(), encoding="utf-8")
+
+        allocations = snapshot.statistics("lineno")[:self.top_n]
+        (self.out_dir / "allocations.txt").write_text(
+            "\n".join(f"{stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks  {stat.traceback}" for stat in allocations),
+            encoding="utf-8")
+
+        summary = {
+            "script": self.script,
+            "wall_s": round(wall_s, 3),
+            "peak_rss_mb": peak_rss_mb(),
+            "tracemalloc_peak_mb": round(traced_peak / (1024 * 1024), 1),
+            "hot_functions": hot_functions(stats, self.top_n),
+        }
+        with open(self.out_dir / "summary.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        print(f"\nProfile of {self.script}: {summary['wall_s']}s wall, peak RSS {summary['peak_rss_mb']} MB, "
+              f"traced peak {summary['tracemalloc_peak_mb']} MB")
+        for row in summary["hot_functions"][:10]:
+            print(f"  {row['own_s']:8.3f}s own  {row['cumulative_s']:8.3f}s cum  {row['calls']:>8} calls  {row['function']}")
+        print(f"Profile saved to: {self.out_dir}")
+        return summary
+
+
+def start_profiling(script, argv=None):
+    """Start profiling when --profile or PIPELINE_PROFILE=1 is given. Reports are written at exit.
+
+    Returns:
+        RunProfiler or None when profiling is off.
+    """
+    if not profiling_enabled(argv):
+        return None
+    profiler = RunProfiler(script).start()
+    atexit.register(profiler.stop)
+    return profiler
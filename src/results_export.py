@@ -0,0 +1,176 @@
+"""
+Script: results_export.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Export path for scored logs, shared by elasticsearch_export.py (the 5-minute batches) and the
+Elasticsearch sink of stream_scorer.py (micro-batches), so both write the same documents.
+
+What it does:
+1. Coalesces the anomalies into incidents (incidents.py) and indexes the alerts the incidents reference
+   (at most MAX_MEMBER_REFS per incident) as anomaly documents, unless EXPORT_ALERT_DOCS=0 keeps only
+   the incidents. The alerts past the cap are counted on the incident and kept in the all logs index.
+2. Applies the retention policy (retention.py) to all evaluated logs: flagged, near-threshold and
+   sampled logs are indexed in full, the rest as per-minute rollups. RETENTION_MODE=full indexes every log.
+3. Gives every document a deterministic _id, so exporting a batch again overwrites instead of duplicating.
+   Rollups are merged per minute and key with a scripted upsert that applies each batch once.
+
+Records are the rows written by ML_batch_scan.py, with dotted field names.
+"""
+
+import json
+import os
+from datetime import datetime
+from elasticsearch.helpers import bulk, BulkIndexError
+from pipeline_metrics import stage, count
+
+# Target indices in Elasticsearch
+INDEX_NAME = "network-anomalies-realtime"
+ALL_LOGS_INDEX = "network-anomalies-all-realtime"
+ROLLUP_INDEX = "network-anomalies-rollup-realtime"
+
+# "rollup" (default) or "full"
+RETENTION_MODE = os.getenv("RETENTION_MODE", "rollup")
+
+# Anomalies become incidents; the referenced members keep a per-anomaly document for the dashboard and review page
+INCIDENTS_ENABLED = os.getenv("INCIDENTS", "1") == "1"
+EXPORT_ALERT_DOCS = os.getenv("EXPORT_ALERT_DOCS", "1") == "1" or not INCIDENTS_ENABLED
+
+
+def to_frame(records):
+    """Records as a DataFrame with ES-safe column names and the feedback defaults filled in."""
+    # pandas is only needed when there is something to upload
+    import pandas as pd
+    df = pd.DataFrame(records)
+    df.columns = [col.replace(".", "_") for col in df.columns]
+    df["user_feedback"] = df.get("user_feedback", "unknown")
+    df["reviewed"] = df.get("reviewed", False)
+    df["batch_timestamp"] = datetime.utcnow().isoformat()
+    return df.fillna("unknown")
+
+
+def _bulk(es, actions, what, index, verbose=True):
+    """bulk() with the export's error report. Returns the number of indexed documents."""
+    try:
+        success, _ = bulk(es, actions)
+    except BulkIndexError as e:
+        print(f"{len(e.errors)} {what} failed.")
+        for err in e.errors[:5]:
+            print(json.dumps(err, indent=2))
+        return 0
+    if verbose:
+        print(f"{success} {what} uploaded to: {index}")
+    return success
+
+
+def export_incidents(es, records, batch_id, member_index, verbose=True):
+    """Coalesce the anomalies of one batch into incidents.
+
+    Returns:
+        dict: Incident summary (incidents.upsert_incidents); has an "error" key when the upsert failed.
+    """
+    from incidents import INCIDENT_INDEX, upsert_incidents
+    try:
+        with stage("incident_upsert", rows=len(records)):
+            summary = upsert_incidents(es, records, batch_id, member_index=member_index)
+    except Exception as e:
+        print(f"Incident upsert failed, anomalies are exported as separate documents instead: {e}")
+        summary = {"batch_id": batch_id, "alerts": len(records), "incidents": [], "created": 0,
+                   "updated": 0, "failed": len(records), "error": str(e)}
+    for name in ("alerts", "created", "updated", "failed"):
+        count(f"incidents_{name}", summary[name])
+    if verbose:
+        print(f"{summary['alerts']} anomalies -> {len(summary['incidents'])} incidents in {INCIDENT_INDEX} "
+              f"({summary['created']} new, {summary['updated']} updated, {summary['failed']} failed)")
+    return summary
+
+
+def export_alert_docs(es, records, index=INDEX_NAME, only_ids=None, verbose=True):
+    """One anomaly document per flagged log, under the same stable id as in the all logs index.
+
+    only_ids (the "alert_doc_ids" of an incident summary) limits the documents to those logs.
+    """
+    if not records:
+        return 0
+    from incidents import log_doc_id
+    doc_ids = [log_doc_id(record) for record in records]
+    if only_ids is not None:
+        keep = set(only_ids)
+        kept = [(doc_id, record) for doc_id, record in zip(doc_ids, records) if doc_id in keep]
+        count("alert_docs_skipped", len(records) - len(kept))
+        if verbose and len(kept) < len(records):
+            print(f"{len(records) - len(kept)} anomalies past the incident member cap are only counted on their incident")
+        if not kept:
+            return 0
+        doc_ids, records = [doc_id for doc_id, _ in kept], [record for _, record in kept]
+    df = to_frame(records)
+    with stage("bulk_export", rows=len(df)):
+        return _bulk(es, ({"_index": index, "_id": doc_id, "_source": row.to_dict()}
+                          for doc_id, (_, row) in zip(doc_ids, df.iterrows())), "anomaly records", index, verbose)
+
+
+def export_evaluated_logs(es, full_records, batch_id, retention_mode=RETENTION_MODE, all_logs_index=ALL_LOGS_INDEX,
+                          rollup_index=ROLLUP_INDEX, verbose=True):
+    """Retention policy, then the logs kept in full and the rollups of the rest.
+
+    batch_id makes the rollup upserts idempotent: the same batch is merged into a rollup once.
+
+    Returns:
+        dict: Retention stats (retention.apply_retention), or None with retention_mode "full".
+    """
+    rollups, retention_stats = [], None
+    if full_records and retention_mode != "full":
+        from retention import apply_retention
+        with stage("retention", rows=len(full_records)):
+            full_records, rollups, retention_stats = apply_retention(full_records)
+        for name in ("docs_indexed", "docs_saved", "rollup_docs", "rolled_up_rows", "bytes_saved"):
+            count(f"retention_{name}", retention_stats[name])
+        if verbose:
+            saved_pct = retention_stats["bytes_saved"] / retention_stats["bytes_all"] * 100 if retention_stats["bytes_all"] else 0
+            print(f"Retention: {retention_stats['rows']} logs -> {len(full_records)} in full "
+                  f"({retention_stats['full_flagged']} flagged, {retention_stats['full_near_threshold']} near threshold, "
+                  f"{retention_stats['full_sample']} sampled) + {retention_stats['rollup_docs']} rollups of "
+                  f"{retention_stats['rolled_up_rows']} logs")
+            print(f"Retention saved {retention_stats['docs_saved']} documents and {retention_stats['bytes_saved'] / 1e6:.1f} MB "
+                  f"({saved_pct:.0f}% of the indexing volume)")
+
+    if full_records:
+        # Stable ids: incidents point at their member logs and a rerun overwrites instead of duplicating
+        from incidents import log_doc_id
+        doc_ids = [log_doc_id(record) for record in full_records]
+        df_all = to_frame(full_records)
+        with stage("bulk_export", rows=len(df_all)):
+            _bulk(es, ({"_index": all_logs_index, "_id": doc_id, "_source": row.to_dict()}
+                       for doc_id, (_, row) in zip(doc_ids, df_all.iterrows())), "full records", all_logs_index, verbose)
+
+    if rollups:
+        from retention import build_rollup_actions
+        with stage("bulk_export", rows=len(rollups)):
+            _bulk(es, build_rollup_actions(rollups, batch_id, rollup_index), "rollups", rollup_index, verbose)
+    return retention_stats
+
+
+def export_batch(es, records, full_records, batch_id, incidents_enabled=INCIDENTS_ENABLED,
+                 alert_docs=EXPORT_ALERT_DOCS, verbose=True):
+    """The whole export of one batch: incidents, anomaly documents, evaluated logs and rollups.
+
+    Args:
+        es (Elasticsearch): Client.
+        records (list): Flagged logs of the batch.
+        full_records (list): All evaluated logs of the batch.
+        batch_id (str): Identifier of the batch; incidents count a batch once.
+
+    Returns:
+        dict: "incidents" summary (None when incidents are off) and "retention" stats.
+    """
+    incident_summary, alert_doc_ids = None, None
+    if incidents_enabled:
+        # Members point at the anomaly documents, or at the all logs index when there are none
+        incident_summary = export_incidents(es, records, batch_id, INDEX_NAME if alert_docs else ALL_LOGS_INDEX, verbose)
+        alert_doc_ids = incident_summary.pop("alert_doc_ids", None)
+        if "error" in incident_summary:
+            alert_docs = True
+    if alert_docs:
+        export_alert_docs(es, records, only_ids=alert_doc_ids, verbose=verbose)
+    return {"incidents": incident_summary, "retention": export_evaluated_logs(es, full_records, batch_id, verbose=verbose)}
@@ -0,0 +1,228 @@
+"""
+Script: retention.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Retention policy for the evaluated logs that elasticsearch_export.py sends to Elasticsearch.
+Almost every evaluated log is normal traffic, so indexing each one as a full document costs
+most of the storage and indexing CPU while nobody looks at them one by one.
+
+What it does:
+1. Keeps in full:
+   - flagged rows (the anomalies of this batch),
+   - near-threshold rows (model_score >= RETENTION_NEAR_THRESHOLD) so false negatives can still be reviewed,
+   - a stratified sample of the normal rows: RETENTION_SAMPLE_RATE per (transport, destination port),
+     with at least RETENTION_SAMPLE_MIN rows of every stratum so rare services stay visible.
+2. Rolls everything else up per minute and (source.ip, destination.ip, transport, destination.port)
+   with the number of logs, byte and packet sums and min/avg/max of the model scores.
+3. Returns stats on how many documents and bytes are not indexed anymore.
+4. build_rollup_actions() turns the rollups into scripted upserts with one _id per minute and key:
+   a minute that spans two batches is merged into one document, and a batch that is exported again
+   is a no-op (the batch ids are kept on the rollup, like on an incident).
+
+Sampling is deterministic (hash of session.id), so rerunning a batch keeps the same rows.
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+
+NEAR_THRESHOLD_SCORE = float(os.getenv("RETENTION_NEAR_THRESHOLD", 0.3))
+SAMPLE_RATE = float(os.getenv("RETENTION_SAMPLE_RATE", 0.01))
+SAMPLE_MIN_PER_STRATUM = int(os.getenv("RETENTION_SAMPLE_MIN", 1))
+
+ROLLUP_KEY = ["source.ip", "destination.ip", "network.transport", "destination.port"]
+STRATUM_KEY = ["network.transport", "destination.port"]
+SCORE_FIELDS = ["model_score", "RF_score", "LOG_score", "XGB_score", "isoforest_score"]
+PRED_FIELDS = ["RF_pred", "LOG_pred", "XGB_pred"]
+MAX_ROLLUP_BATCH_IDS = 100
+
+# Merges the rollup of one batch into the stored rollup of the same minute and key
+ROLLUP_UPSERT_SCRIPT = """
+def s = ctx._source;
+def d = params.doc;
+if (s.log_count == null) {
+  for (entry in d.entrySet()) { s[entry.getKey()] = entry.getValue(); }
+  s.batch_ids = [params.batch_id];
+  return;
+}
+if (s.batch_ids.contains(params.batch_id)) { ctx.op = 'noop'; return; }
+s.batch_ids.add(params.batch_id);
+if (s.batch_ids.size() > params.max_batch_ids) { s.batch_ids.remove(0); }
+def n = s.log_count;
+def m = d.log_count;
+for (f in params.score_fields) {
+  if (d[f + '_min'] == null) { continue; }
+  if (s[f + '_min'] == null) {
+    s[f + '_min'] = d[f + '_min']; s[f + '_avg'] = d[f + '_avg']; s[f + '_max'] = d[f + '_max'];
+  } else {
+    s[f + '_min'] = Math.min(s[f + '_min'], d[f + '_min']);
+    s[f + '_max'] = Math.max(s[f + '_max'], d[f + '_max']);
+    s[f + '_avg'] = (s[f + '_avg'] * n + d[f + '_avg'] * m) / (n + m);
+  }
+}
+s.log_count = n + m;
+s.bytes_sum += d.bytes_sum;
+s.packets_sum += d.packets_sum;
+if (d.first_seen != null && (s.first_seen == null || d.first_seen.compareTo(s.first_seen) < 0)) { s.first_seen = d.first_seen; }
+if (d.last_seen != null && (s.last_seen == null || d.last_seen.compareTo(s.last_seen) > 0)) { s.last_seen = d.last_seen; }
+s.batch_timestamp = d.batch_timestamp;
+"""
+
+
+def is_flagged(row):
+    """Anomaly of this batch. Older scan outputs have no predicted_anomaly column: fall back to the majority vote."""
+    if "predicted_anomaly" in row:
+        return bool(row["predicted_anomaly"])
+    return sum(int(row.get(field) or 0) for field in PRED_FIELDS) >= 2
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def sample_fraction(row):
+    """Stable value in [0, 1) per log, from session.id when there is one."""
+    key = row.get("session.id")
+    if key is None:
+        key = json.dumps(row, sort_keys=True, default=str)
+    return zlib.crc32(str(key).encode("utf-8")) / 2 ** 32
+
+
+def minute_of(timestamp):
+    """ISO minute ("2025-06-01T10:00:00Z") of an ISO string or epoch milliseconds."""
+    if isinstance(timestamp, (int, float)):
+        return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:00Z")
+    return f"{str(timestamp)[:16]}:00Z"
+
+
+def select_sample(normal_rows, sample_rate=SAMPLE_RATE, sample_min=SAMPLE_MIN_PER_STRATUM):
+    """Indexes (into normal_rows) of the stratified sample."""
+    strata = {}
+    for i, row in enumerate(normal_rows):
+        strata.setdefault(tuple(row.get(field) for field in STRATUM_KEY), []).append(i)
+    picked = set()
+    for members in strata.values():
+        chosen = [i for i in members if sample_fraction(normal_rows[i]) < sample_rate]
+        for i in members:
+            if len(chosen) >= sample_min:
+                break
+            if i not in chosen:
+                chosen.append(i)
+        picked.update(chosen)
+    return picked
+
+
+def build_rollups(rows):
+    """Per-minute aggregates of rows by ROLLUP_KEY, with ES-safe field names."""
+    rollups = {}
+    for row in rows:
+        key = (minute_of(row.get("@timestamp")),) + tuple(row.get(field) for field in ROLLUP_KEY)
+        doc = rollups.get(key)
+        if doc is None:
+            doc = rollups[key] = {
+                "@timestamp": key[0],
+                **{field.replace(".", "_"): value for field, value in zip(ROLLUP_KEY, key[1:])},
+                "log_count": 0, "bytes_sum": 0, "packets_sum": 0,
+                "first_seen": row.get("@timestamp"), "last_seen": row.get("@timestamp"),
+                "_scores": {field: [] for field in SCORE_FIELDS},
+            }
+        doc["log_count"] += 1
+        doc["bytes_sum"] += _number(row.get("session.iflow_bytes")) or 0
+        doc["packets_sum"] += _number(row.get("session.iflow_pkts")) or 0
+        timestamp = row.get("@timestamp")
+        if timestamp is not None:
+            doc["first_seen"] = min(filter(None, [doc["first_seen"], timestamp]))
+            doc["last_seen"] = max(filter(None, [doc["last_seen"], timestamp]))
+        for field in SCORE_FIELDS:
+            value = _number(row.get(field))
+            if value is not None:
+                doc["_scores"][field].append(value)
+
+    docs = []
+    for doc in rollups.values():
+        for field, values in doc.pop("_scores").items():
+            if values:
+                doc[f"{field}_min"] = min(values)
+                doc[f"{field}_avg"] = sum(values) / len(values)
+                doc[f"{field}_max"] = max(values)
+        docs.append(doc)
+    return docs
+
+
+def rollup_doc_id(doc):
+    """Deterministic _id of a rollup: its minute and ROLLUP_KEY values."""
+    key = [doc["@timestamp"]] + [doc.get(field.replace(".", "_")) for field in ROLLUP_KEY]
+    return hashlib.sha1(json.dumps(key, default=str).encode("utf-8")).hexdigest()[:24]
+
+
+def build_rollup_actions(rollups, batch_id, index, batch_timestamp=None):
+    """Scripted upserts for the rollups of one batch, see ROLLUP_UPSERT_SCRIPT."""
+    batch_timestamp = batch_timestamp or datetime.now(timezone.utc).isoformat()
+    return [{
+        "_op_type": "update",
+        "_index": index,
+        "_id": rollup_doc_id(doc),
+        "scripted_upsert": True,
+        "upsert": {},
+        "script": {"source": ROLLUP_UPSERT_SCRIPT, "lang": "painless", "params": {
+            "doc": {**doc, "batch_timestamp": batch_timestamp},
+            "batch_id": batch_id,
+            "max_batch_ids": MAX_ROLLUP_BATCH_IDS,
+            "score_fields": SCORE_FIELDS,
+        }},
+    } for doc in rollups]
+
+
+def apply_retention(records, near_threshold=NEAR_THRESHOLD_SCORE, sample_rate=SAMPLE_RATE,
+                    sample_min=SAMPLE_MIN_PER_STRATUM):
+    """Split evaluated logs into rows indexed in full and per-minute rollups of the rest.
+
+    Args:
+        records (list): Evaluated logs as written by ML_batch_scan.py (dotted field names).
+
+    Returns:
+        tuple: (full rows with a retention_reason field, rollup documents, stats dict)
+    """
+    full_rows, normal_rows = [], []
+    reasons = {"flagged": 0, "near_threshold": 0, "sample": 0}
+    for row in records:
+        score = _number(row.get("model_score"))
+        if is_flagged(row):
+            reason = "flagged"
+        elif score is not None and score >= near_threshold:
+            reason = "near_threshold"
+        else:
+            normal_rows.append(row)
+            continue
+        reasons[reason] += 1
+        full_rows.append({**row, "retention_reason": reason})
+
+    sampled = select_sample(normal_rows, sample_rate, sample_min)
+    rolled_up = []
+    for i, row in enumerate(normal_rows):
+        if i in sampled:
+            full_rows.append({**row, "retention_reason": "sample"})
+        else:
+            rolled_up.append(row)
+    reasons["sample"] = len(sampled)
+    rollups = build_rollups(rolled_up)
+
+    # Source size as a stand-in for indexing volume: what every row in full would have cost vs what is sent now
+    bytes_all = sum(len(json.dumps(row, default=str)) for row in records)
+    bytes_indexed = sum(len(json.dumps(doc, default=str)) for doc in full_rows + rollups)
+    stats = {
+        "rows": len(records),
+        **{f"full_{reason}": n for reason, n in reasons.items()},
+        "rolled_up_rows": len(rolled_up),
+        "rollup_docs": len(rollups),
+        "docs_indexed": len(full_rows) + len(rollups),
+        "docs_saved": len(records) - len(full_rows) - len(rollups),
+        "bytes_all": bytes_all,
+        "bytes_indexed": bytes_indexed,
+        "bytes_saved": bytes_all - bytes_indexed,
+    }
+    return full_rows, rollups, stats
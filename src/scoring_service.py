@@ -0,0 +1,277 @@
+"""
+Script: scoring_service.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Local HTTP scoring service that keeps the models warm between batches.
+Uses the same feature + encode + vote path as ML_batch_scan.py.
+
+What it does:
+1. Loads the current registry version once and reloads it between batches when the pointer changes.
+2. POST /score with {"documents": [...]} scores raw log documents (Elasticsearch hits or their _source)
+   and returns per-row scores, model votes and the final anomaly flag.
+3. Requests from concurrent clients are collected for at most MAX_WAIT_MS or MAX_BATCH_ROWS rows and
+   predicted in one model call. Features and the isolation forest score stay per request because
+   they depend on the other logs in the same batch, exactly like one scan run.
+4. GET /stats returns request latency percentiles, batch sizes and throughput. GET /health returns the model version.
+
+Usage:
+    python src/scoring_service.py --port 8765
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import ML_batch_scan as scan
+import model_registry
+
+SCORING_HOST = os.getenv("SCORING_HOST", "127.0.0.1")
+SCORING_PORT = int(os.getenv("SCORING_PORT", 8765))
+MAX_BATCH_ROWS = int(os.getenv("SCORING_MAX_BATCH_ROWS", 5000))
+MAX_WAIT_MS = float(os.getenv("SCORING_MAX_WAIT_MS", 20))
+
+RESULT_COLUMNS = ["RF_pred", "LOG_pred", "XGB_pred", "RF_score", "LOG_score", "XGB_score", "model_score", "isoforest_score"]
+
+
+class ServiceStats:
+    """Thread-safe counters and recent latencies of the scoring service."""
+
+    def __init__(self, window=10000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._batch_ms = deque(maxlen=window)
+        self._batch_rows = deque(maxlen=window)
+        self.started = time.monotonic()
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+        self.batches = 0
+
+    def record_request(self, rows, latency_ms, error=False):
+        with self._lock:
+            self.requests += 1
+            self.rows += rows
+            self.errors += int(error)
+            self._latencies.append(latency_ms)
+
+    def record_batch(self, rows, batch_ms):
+        with self._lock:
+            self.batches += 1
+            self._batch_rows.append(rows)
+            self._batch_ms.append(batch_ms)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            batch_ms = list(self._batch_ms)
+            batch_rows = list(self._batch_rows)
+            uptime = time.monotonic() - self.started
+            snapshot = {"requests": self.requests, "rows": self.rows, "errors": self.errors,
+                        "batches": self.batches, "uptime_s": round(uptime, 1),
+                        "rows_per_sec": round(self.rows / uptime, 1) if uptime else 0.0}
+        if latencies:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            snapshot.update({"latency_p50_ms": round(float(p50), 2), "latency_p95_ms": round(float(p95), 2),
+                             "latency_p99_ms": round(float(p99), 2)})
+        if batch_rows:
+            snapshot.update({"batch_rows_mean": round(float(np.mean(batch_rows)), 1),
+                             "batch_ms_p50": round(float(np.percentile(batch_ms, 50)), 2),
+                             "requests_per_batch": round(self.requests / max(self.batches, 1), 2)})
+        return snapshot
+
+
+class BatchScorer:
+    """Scores requests from many threads in shared model calls on one worker thread.
+
+    Args:
+        reloader (ModelReloader): Gives the current model bundle. Checked before every batch.
+        max_batch_rows (int, optional): Stop collecting requests once this many rows are waiting.
+        max_wait_ms (float, optional): How long the first request of a batch may wait for others.
+    """
+
+    def __init__(self, reloader, max_batch_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS):
+        self.reloader = reloader
+        self.max_batch_rows = max_batch_rows
+        self.max_wait_ms = max_wait_ms
+        self.stats = ServiceStats()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="batch-scorer", daemon=True)
+        self._thread.start()
+
+    def submit(self, documents):
+        """Queue one request. Returns a Future with the per-document results."""
+        future = Future()
+        self._queue.put((documents, future, time.perf_counter()))
+        return future
+
+    def score(self, documents, timeout=None):
+        return self.submit(documents).result(timeout)
+
+    def _collect(self):
+        requests = [self._queue.get()]
+        rows = len(requests[0][0])
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            requests.append(request)
+            rows += len(request[0])
+        return requests
+
+    def _prepare(self, documents, bundle):
+        # Features and isolation forest score per request, like one scan batch
+        df = scan.prepare_features(scan.documents_to_frame(documents), verbose=False)
+        X_encoded = scan.encode(df, bundle) if len(df) else None
+        return df, X_encoded
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            start = time.perf_counter()
+            try:
+                bundle = self.reloader.get()
+            except Exception as e:
+                for documents, future, queued_at in requests:
+                    self._finish(future, documents, queued_at, error=e)
+                continue
+
+            prepared = []
+            for documents, future, queued_at in requests:
+                try:
+                    prepared.append((documents, future, queued_at, *self._prepare(documents, bundle)))
+                except Exception as e:
+                    self._finish(future, documents, queued_at, error=e)
+
+            # One model call for every row of every request in this batch
+            scored = [p for p in prepared if p[4] is not None]
+            try:
+                preds = scan.predict(pd.concat([p[4] for p in scored], ignore_index=True), bundle) if scored else None
+            except Exception as e:
+                for documents, future, queued_at, _, _ in prepared:
+                    self._finish(future, documents, queued_at, error=e)
+                continue
+
+            offset = 0
+            for documents, future, queued_at, df, X_encoded in prepared:
+                n_rows = 0 if X_encoded is None else len(X_encoded)
+                request_preds = preds.iloc[offset:offset + n_rows].reset_index(drop=True) if n_rows else None
+                offset += n_rows
+                self._finish(future, documents, queued_at, result=self._results(documents, df, request_preds))
+            self.stats.record_batch(offset, (time.perf_counter() - start) * 1000)
+
+    def _results(self, documents, df, preds):
+        results = [{"scored": False, "reason": "missing critical fields"} for _ in documents]
+        if preds is None:
+            return results
+        for col in preds.columns:
+            df[col] = preds[col].to_numpy()
+        votes = preds[["RF_pred", "LOG_pred", "XGB_pred"]].sum(axis=1).to_numpy()
+        anomalies = scan.majority_vote(preds).to_numpy() & ~scan.safe_traffic_mask(df).to_numpy()
+        for i, row in enumerate(df[["_input_row"] + RESULT_COLUMNS].itertuples(index=False)):
+            values = dict(zip(RESULT_COLUMNS, row[1:]))
+            result = {"scored": True, "votes": int(votes[i]), "anomaly": bool(anomalies[i])}
+            result.update({k: (int(v) if k.endswith("_pred") else round(float(v), 6)) for k, v in values.items()})
+            results[row[0]] = result
+        return results
+
+    def _finish(self, future, documents, queued_at, result=None, error=None):
+        self.stats.record_request(len(documents), (time.perf_counter() - queued_at) * 1000, error=error is not None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+def make_handler(scorer):
+    class ScoringHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, scorer.stats.snapshot())
+            elif self.path == "/health":
+                self._send(200, {"status": "ok", "model_version": scorer.reloader.version})
+            else:
+                self._send(404, {"error": f"Unknown path: {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self._send(404, {"error": f"Unknown path: {self.path}"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                documents = body["documents"]
+            except (ValueError, KeyError) as e:
+                self._send(400, {"error": f"Expected JSON with a documents list: {e}"})
+                return
+            try:
+                results = scorer.score(documents)
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+                return
+            self._send(200, {"model_version": scorer.reloader.version, "results": results})
+
+        def log_message(self, format, *args):
+            pass  # Keep the console for the startup and reload messages
+
+    return ScoringHandler
+
+
+def make_server(scorer, host=SCORING_HOST, port=SCORING_PORT):
+    return ThreadingHTTPServer((host, port), make_handler(scorer))
+
+
+def score_remote(documents, url=f"http://{SCORING_HOST}:{SCORING_PORT}", timeout=30):
+    """Client helper: score documents with a running service. Returns the parsed response."""
+    from urllib.request import Request, urlopen
+    request = Request(f"{url}/score", data=json.dumps({"documents": documents}).encode("utf-8"),
+                      headers={"Content-Type": "application/json"}, method="POST")
+    with urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the anomaly models over local HTTP.")
+    parser.add_argument("--host", default=SCORING_HOST)
+    parser.add_argument("--port", type=int, default=SCORING_PORT)
+    parser.add_argument("--max-batch-rows", type=int, default=MAX_BATCH_ROWS)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    reloader = model_registry.ModelReloader(scan.load_bundle, fallback=scan.MODEL_DIR)
+    reloader.get()
+    print(f"Models loaded (version {reloader.version}).")
+
+    scorer = BatchScorer(reloader, args.max_batch_rows, args.max_wait_ms)
+    server = make_server(scorer, args.host, args.port)
+    print(f"Scoring service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping scoring service.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
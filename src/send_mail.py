@@ -5,8 +5,10 @@ Project: Bachelorproef — Data-driven anomaly detection on network logs
 
 Purpose:
 This script sends an email alert when new anomalies have been detected.
-It reads the predicted anomalies JSON and checks how many logs were flagged.
-If anomalies are found it sends an e-mail with links to dashboards.
+When the export wrote an incident summary (incidents_latest.json) the mail is about incidents:
+it is only sent when a new incident started, and lists it next to the ongoing ones that grew.
+A sustained attack therefore gives one e-mail, not one per batch.
+Without an incident summary it reads the predicted anomalies JSON and mails when logs were flagged.
 
 This is the final step of the automated batch run.
 """
@@ -18,6 +20,7 @@ from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from dotenv import load_dotenv
 from pathlib import Path
+from pipeline_metrics import start_run, stage
 
 # Load credentials and config
 load_dotenv()
@@ -53,15 +56,85 @@ def send_email(subject, body_html):
 
     # Send the email
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(sender, password)
-            server.sendmail(sender, [recipient], msg.as_string())
+        with stage("mail"):
+            with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
+                server.login(sender, password)
+                server.sendmail(sender, [recipient], msg.as_string())
         print("Email successfully sent.")
     except Exception as e:
         print(f"Error sending email: {e}")
 
+
+def incident_rows_html(incidents):
+    rows = ""
+    for incident in incidents:
+        score = incident.get("max_model_score")
+        rows += (f"<tr><td>{incident['signature']}</td><td>{incident['alerts']}</td><td>{incident['first_seen']}</td>"
+                 f"<td>{incident['last_seen']}</td><td>{'' if score is None else f'{score:.2f}'}</td></tr>")
+    return ("<table border='1' cellpadding='4' style='border-collapse: collapse;'>"
+            "<tr><th>Signature</th><th>Alerts</th><th>First seen</th><th>Last seen</th><th>Max model score</th></tr>"
+            f"{rows}</table>")
+
+
+def incident_mail(summary, max_listed=20):
+    """Subject and HTML part for new incidents, or None when this batch only updated ongoing ones."""
+    new = [i for i in summary.get("incidents", []) if i["result"] == "created"]
+    ongoing = [i for i in summary.get("incidents", []) if i["result"] == "updated"]
+    if not new:
+        return None
+    body = f"<b>{len(new)} new incident(s)</b> started in the latest batch:<br><br>{incident_rows_html(new[:max_listed])}"
+    if len(new) > max_listed:
+        body += f"<br>... and {len(new) - max_listed} more."
+    if ongoing:
+        body += (f"<br><br>{len(ongoing)} ongoing incident(s) received {sum(i['alerts'] for i in ongoing)} more alerts; "
+                 "they were already reported.")
+    return f"VIVES alert: {len(new)} new incident(s) in networklogs.", body
+
+
 if __name__ == "__main__":
+    start_run("send_mail")
     anomaly_file = Path("/home/runner/work/PoC_Test/data/predicted_anomalies_latest.json")
+    incidents_file = anomaly_file.parent / "incidents_latest.json"
+
+    # URLs for UI interfaces
+    dashboard_url = os.getenv("DASHBOARD_URL", "https://vivesnetdetect.streamlit.app/")
+    elastic_url = os.getenv("ELASTICSEARCH_URL", "https://uat.elastic.vives.cloud:5601/app/r/s/Ok4A0")
+
+    # Incidents: mail only when a new one started. A failed incident upsert falls back to the anomaly count below
+    incident_summary = None
+    if incidents_file.exists():
+        try:
+            with incidents_file.open(encoding="utf-8") as f:
+                incident_summary = json.load(f)
+        except Exception as e:
+            print(f"Failed to load incident summary: {e}")
+        if incident_summary and incident_summary.get("error"):
+            print(f"Incident upsert failed in the export ({incident_summary['error']}), mailing on anomalies instead.")
+            incident_summary = None
+    if incident_summary is not None:
+        mail = incident_mail(incident_summary)
+        if mail is None:
+            print(f"No new incidents ({incident_summary.get('updated', 0)} ongoing updated). Email will not be sent.")
+            exit(0)
+        subject, incident_html = mail
+        send_email(
+            subject=subject,
+            body_html=f"""
+    <html>
+    <body>
+        <p><img src='cid:viveslogo' alt='VIVES Logo' style='height: 40px;'><br><br>
+        Dear colleague<br><br>
+        {incident_html}<br><br>
+        View and review the incidents in:
+        <a href="{dashboard_url}">Streamlit anomaly dashboard</a><br>
+        <a href="{elastic_url}">Elasticsearch interface</a><br><br>
+        This is an automated message.</p>
+    </body>
+    </html>
+    """
+        )
+        exit(0)
+
     # Don’t try to send mail if file isn’t there
     if not anomaly_file.exists():
         print("Anomaly file does not exist. Email will not be sent.")
@@ -79,10 +152,6 @@ if __name__ == "__main__":
         print(f"Failed to load anomaly data: {e}")
         exit(1)
 
-    # URLs for UI interfaces
-    dashboard_url = os.getenv("DASHBOARD_URL", "https://vivesnetdetect.streamlit.app/")
-    elastic_url = os.getenv("ELASTICSEARCH_URL", "https://uat.elastic.vives.cloud:5601/app/r/s/Ok4A0")
-
     # Email body
     html_body = f"""
     <html>
@@ -0,0 +1,147 @@
+"""
+Script: shadow_scoring.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Shadow scoring of candidate models inside the live batch scan (ML_batch_scan.py).
+The candidate scores the same encoded matrix as the deployed models, but its alerts are never exported.
+
+What it does:
+1. Loads the candidate bundle from SHADOW_MODEL_DIR (files named *_candidate.pkl by default).
+2. Samples at most SHADOW_MAX_ROWS rows of the batch so large batches stay cheap.
+3. Predicts with at most SHADOW_CPU_THREADS threads.
+4. Compares with the deployed predictions: agreement per model and for the vote,
+   alert volume deployed vs candidate and the extra latency of the shadow pass.
+5. Appends one JSON line per batch to SHADOW_METRICS_FILE and optionally indexes it in SHADOW_ES_INDEX.
+
+Shadow failures are printed and never stop the scan.
+"""
+
+import json
+import os
+import time
+import numpy as np
+from datetime import datetime, timezone
+from pathlib import Path
+from threadpoolctl import threadpool_limits
+from training_scheduler import apply_thread_count
+import ML_batch_scan as scan
+
+SHADOW_SUFFIX = os.getenv("SHADOW_MODEL_SUFFIX", "candidate")
+SHADOW_MAX_ROWS = int(os.getenv("SHADOW_MAX_ROWS", 20000))
+SHADOW_CPU_THREADS = int(os.getenv("SHADOW_CPU_THREADS", 1))
+SHADOW_METRICS_FILE = Path(os.getenv("SHADOW_METRICS_FILE", Path(__file__).resolve().parents[1] / "data" / "shadow_metrics.jsonl"))
+SHADOW_ES_INDEX = os.getenv("SHADOW_ES_INDEX")
+
+PRED_COLUMNS = ["RF_pred", "LOG_pred", "XGB_pred"]
+
+
+def sample_positions(n_rows, max_rows, seed=42):
+    """Row positions to shadow score. All rows when the batch fits in max_rows."""
+    if n_rows <= max_rows:
+        return np.arange(n_rows)
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(n_rows, size=max_rows, replace=False))
+
+
+def compare(deployed_preds, candidate_preds, deployed_alerts, candidate_alerts):
+    """Agreement and alert volume of the candidate against the deployed models on the same rows."""
+    metrics = {}
+    for col in PRED_COLUMNS:
+        metrics[f"agreement_{col[:-5].lower()}"] = round(float(np.mean(deployed_preds[col].to_numpy() == candidate_preds[col].to_numpy())), 4)
+    metrics["agreement_vote"] = round(float(np.mean(deployed_alerts == candidate_alerts)), 4)
+
+    deployed_count = int(deployed_alerts.sum())
+    candidate_count = int(candidate_alerts.sum())
+    metrics.update({
+        "alerts_deployed": deployed_count,
+        "alerts_candidate": candidate_count,
+        "alerts_delta": candidate_count - deployed_count,
+        "alerts_only_candidate": int((candidate_alerts & ~deployed_alerts).sum()),
+        "alerts_only_deployed": int((deployed_alerts & ~candidate_alerts).sum()),
+    })
+    return metrics
+
+
+def check_columns(X_encoded, bundle):
+    """Names of features the candidate expects but the shared encoded matrix does not have."""
+    expected = set(bundle["xgb_columns"])
+    for key in ("rf", "log"):
+        expected.update(getattr(bundle[key], "feature_names_in_", []))
+    return sorted(expected - set(X_encoded.columns))
+
+
+def write_metrics(record, metrics_file=SHADOW_METRICS_FILE, es_index=SHADOW_ES_INDEX):
+    metrics_file = Path(metrics_file)
+    metrics_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(metrics_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+    if es_index and os.getenv("ES_HOST"):
+        try:
+            from elasticsearch import Elasticsearch
+            es = Elasticsearch(os.getenv("ES_HOST"), api_key=os.getenv("ES_API_KEY"), verify_certs=True)
+            es.index(index=es_index, document=record)
+        except Exception as e:
+            print(f"Shadow metrics not indexed in {es_index}: {e}")
+
+
+def run_shadow(df, X_encoded, deployed_alerts, model_dir, suffix=SHADOW_SUFFIX, max_rows=SHADOW_MAX_ROWS,
+               threads=SHADOW_CPU_THREADS, metrics_file=SHADOW_METRICS_FILE, es_index=SHADOW_ES_INDEX):
+    """Score a candidate bundle on the batch already encoded for the deployed models.
+
+    Args:
+        df (pd.DataFrame): Scored batch with the deployed RF_pred, LOG_pred and XGB_pred columns.
+        X_encoded (pd.DataFrame): Encoded matrix of the batch, row aligned with df.
+        deployed_alerts (np.ndarray): Deployed anomaly mask after the trusted ip and port filters.
+        model_dir (str): Folder with the candidate model files.
+        suffix (str, optional): File suffix of the candidate models.
+        max_rows (int, optional): Maximum number of rows to score, larger batches are sampled.
+        threads (int, optional): CPU threads the candidate models may use.
+        metrics_file (Path, optional): JSONL file the batch metrics are appended to.
+        es_index (str, optional): Elasticsearch index for the metrics, skipped when not set.
+
+    Returns:
+        dict: The metrics record, or None when shadow scoring was skipped.
+    """
+    try:
+        bundle = scan.load_bundle(model_dir, suffix=suffix)
+    except Exception as e:
+        print(f"Shadow scoring skipped, candidate bundle not loaded from {model_dir}: {e}")
+        return None
+
+    missing = check_columns(X_encoded, bundle)
+    if missing:
+        print(f"Shadow scoring skipped, candidate expects features the scan does not encode: {missing[:5]}")
+        return None
+
+    positions = sample_positions(len(X_encoded), max_rows)
+    X_sample = X_encoded.iloc[positions]
+
+    start = time.perf_counter()
+    with threadpool_limits(limits=threads):
+        for key in ("rf", "log", "xgb"):
+            apply_thread_count(bundle[key], threads)
+        candidate_preds = scan.predict(X_sample, bundle)
+    extra_seconds = time.perf_counter() - start
+
+    df_sample = df.iloc[positions]
+    candidate_alerts = scan.majority_vote(candidate_preds).to_numpy() & ~scan.safe_traffic_mask(df_sample).to_numpy()
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "candidate_dir": str(model_dir),
+        "batch_rows": int(len(X_encoded)),
+        "scored_rows": int(len(positions)),
+        "sampled": bool(len(positions) < len(X_encoded)),
+        "threads": threads,
+        **compare(df_sample[PRED_COLUMNS], candidate_preds, np.asarray(deployed_alerts)[positions], candidate_alerts),
+        "extra_latency_ms": round(extra_seconds * 1000, 1),
+        "extra_latency_ms_per_1k": round(extra_seconds * 1000 * 1000 / max(len(positions), 1), 3),
+    }
+    write_metrics(record, metrics_file, es_index)
+    print(f"Shadow scoring: {record['scored_rows']}/{record['batch_rows']} rows | vote agreement "
+          f"{record['agreement_vote']:.2%} | alerts {record['alerts_deployed']} -> {record['alerts_candidate']} "
+          f"| +{record['extra_latency_ms']} ms")
+    return record
@@ -0,0 +1,431 @@
+"""
+Script: stream_scorer.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Streaming mode of the batch scan. Log documents are scored in micro-batches as they arrive
+instead of once per 5-minute cron run, and results are exported continuously.
+
+What it does:
+1. Reads log documents from a source on a background thread:
+   - stdin or an NDJSON file that is tailed while it grows,
+   - an NDJSON file replayed at a fixed events-per-second rate (benchmarks and tests),
+   - Elasticsearch, polled with a @timestamp cursor; every poll pages through a point in time
+     with search_after, so any number of documents with the same timestamp gets through.
+   Lines that are not valid JSON are skipped with a warning.
+2. Groups documents into micro-batches closed by size or by time, whichever comes first.
+3. Each micro-batch goes through the ML_batch_scan.py path: build_df features, encoding,
+   isolation forest score, the three models and the majority vote with the trusted filters.
+4. Results go to the sink right away: Elasticsearch through the export path of elasticsearch_export.py
+   (results_export.py: incidents, retention and rollups), or an NDJSON file.
+5. A failed Elasticsearch export is retried with backoff under the same batch id. A micro-batch
+   that still fails (or fails to score) is appended to a dead-letter NDJSON file
+   (STREAM_DEAD_LETTER, default ../data/stream_dead_letter.ndjson) and counted as failed_events in
+   the summary; replay it with --source replay --path <dead-letter file>.
+6. BatchSizer sizes the batches from a latency target (STREAM_TARGET_P99_S, default 10 s from
+   ingest to export). It learns the fixed and per-row cost of a batch and shrinks the batch window
+   when the observed p99 goes over the target.
+
+Note: flow features (flows per minute, unique ports, port entropy) are computed within a micro-batch,
+so very small batches see less context than a 5-minute scan. STREAM_MIN_ROWS keeps a floor.
+
+Usage:
+    python src/stream_scorer.py --source file --path ../data/live_logs.ndjson --sink es
+    cat logs.ndjson | python src/stream_scorer.py --source stdin --sink ndjson --output ../data/stream_out.ndjson
+"""
+
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import numpy as np
+import ML_batch_scan as scan
+import model_registry
+
+TARGET_P99_S = float(os.getenv("STREAM_TARGET_P99_S", 10))
+MAX_WAIT_S = float(os.getenv("STREAM_MAX_WAIT_S", 2))
+MIN_ROWS = int(os.getenv("STREAM_MIN_ROWS", 50))
+MAX_ROWS = int(os.getenv("STREAM_MAX_ROWS", 20000))
+SINK_RETRIES = int(os.getenv("STREAM_SINK_RETRIES", 3))
+SINK_BACKOFF_S = float(os.getenv("STREAM_SINK_BACKOFF_S", 1))
+DEAD_LETTER_PATH = os.getenv("STREAM_DEAD_LETTER", "../data/stream_dead_letter.ndjson")
+
+# Marks the end of a finite source
+END_OF_STREAM = object()
+
+
+class BatchSizer:
+    """Chooses the batch window and row limit from the end-to-end latency target.
+
+    Latency of an event = time waiting for the batch to close + time to score and export the batch.
+    Half of the headroom budget goes to waiting, the rest to processing. The headroom starts at
+    50% of the target and shrinks when the observed p99 exceeds the target.
+    """
+
+    def __init__(self, target_p99_s=TARGET_P99_S, max_wait_s=MAX_WAIT_S, min_rows=MIN_ROWS, max_rows=MAX_ROWS):
+        self.target_p99_s = target_p99_s
+        self.max_wait_s = max_wait_s
+        self.min_rows = min_rows
+        self.max_rows_cap = max_rows
+        self.headroom = 0.5
+        self._costs = deque(maxlen=20)
+        self._latencies = deque(maxlen=5000)
+
+    def observe(self, rows, process_s, latencies_s):
+        self._costs.append((rows, process_s))
+        self._latencies.extend(latencies_s)
+        p99 = self.p99()
+        if p99 is not None and p99 > self.target_p99_s:
+            self.headroom = max(0.1, self.headroom * 0.8)
+        elif p99 is not None and p99 < self.target_p99_s * 0.5:
+            self.headroom = min(0.5, self.headroom * 1.05)
+
+    def p99(self):
+        return float(np.percentile(self._latencies, 99)) if self._latencies else None
+
+    def cost_model(self):
+        """(fixed seconds per batch, seconds per row) from recent batches."""
+        if not self._costs:
+            return 0.0, 0.0
+        rows, seconds = np.array(self._costs, dtype=float).T
+        if len(set(rows)) >= 3:
+            per_row, fixed = np.polyfit(rows, seconds, 1)
+            if per_row > 0:
+                return max(0.0, float(fixed)), float(per_row)
+        return 0.0, float(seconds.sum() / max(rows.sum(), 1))
+
+    def limits(self):
+        """(max wait in seconds, max rows) for the next batch."""
+        budget = self.target_p99_s * self.headroom
+        max_wait = min(self.max_wait_s, budget / 2)
+        fixed, per_row = self.cost_model()
+        if per_row <= 0:
+            return max_wait, self.max_rows_cap
+        rows = int((budget - max_wait - fixed) / per_row)
+        return max_wait, max(self.min_rows, min(self.max_rows_cap, rows))
+
+
+PIT_KEEP_ALIVE = "1m"
+
+
+def parse_line(line):
+    """Document of one NDJSON line, or None (with a warning) when the line is not a JSON object."""
+    try:
+        doc = json.loads(line)
+    except json.JSONDecodeError as e:
+        print(f"Skipping malformed line ({e}): {line.strip()[:200]}")
+        return None
+    if not isinstance(doc, dict):
+        print(f"Skipping line that is not a JSON object: {line.strip()[:200]}")
+        return None
+    return doc
+
+
+# Sources: each runs on its own thread and puts (document, ingest time) on the queue
+def read_stream(stream, out, stop):
+    for line in stream:
+        if stop.is_set():
+            break
+        if line.strip():
+            doc = parse_line(line)
+            if doc is not None:
+                out.put((doc, time.time()))
+    out.put(END_OF_STREAM)
+
+
+def tail_file(path, out, stop, poll_s=0.2, from_start=True):
+    with open(path, "r", encoding="utf-8") as f:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        buffer = ""
+        while not stop.is_set():
+            chunk = f.readline()
+            if not chunk:
+                time.sleep(poll_s)
+                continue
+            buffer += chunk
+            if buffer.endswith("\n"):  # Only whole lines, a writer may be halfway through one
+                doc = parse_line(buffer) if buffer.strip() else None
+                if doc is not None:
+                    out.put((doc, time.time()))
+                buffer = ""
+
+
+def replay(documents, out, stop, eps):
+    """Put documents on the queue at a fixed rate of eps events per second."""
+    start = time.perf_counter()
+    for i, doc in enumerate(documents):
+        if stop.is_set():
+            break
+        delay = start + i / eps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        out.put((doc, time.time()))
+    out.put(END_OF_STREAM)
+
+
+def pit_pages(es, index, query, page_size=1000, keep_alive=PIT_KEEP_ALIVE):
+    """Pages of hits oldest first under one point in time, with _shard_doc as tiebreaker for equal timestamps."""
+    pit_id = es.open_point_in_time(index=index, keep_alive=keep_alive)["id"]
+    search_after = None
+    try:
+        while True:
+            params = {"query": query, "size": page_size, "pit": {"id": pit_id, "keep_alive": keep_alive},
+                      "sort": [{"@timestamp": {"order": "asc", "unmapped_type": "date"}}, {"_shard_doc": "asc"}]}
+            if search_after is not None:
+                params["search_after"] = search_after
+            resp = es.search(**params)
+            pit_id = resp.get("pit_id", pit_id)
+            hits = resp["hits"]["hits"]
+            if hits:
+                yield hits
+            if len(hits) < page_size:
+                break
+            search_after = hits[-1]["sort"]
+    finally:
+        try:
+            es.close_point_in_time(id=pit_id)
+        except Exception as e:
+            print(f"Could not close point in time: {e}")
+
+
+def poll_elasticsearch(es, index, out, stop, poll_s=2.0, page_size=1000, start_time="now-1m"):
+    """Follow new documents with a @timestamp cursor.
+
+    Every poll reads everything from the cursor on under a point in time, so a timestamp shared by
+    more than page_size documents cannot stall the cursor. The next poll starts again at the newest
+    timestamp; ids seen at that timestamp are kept to skip duplicates. The cursor is the hit's sort
+    value (epoch millis), so one instant written as "...:00Z" or "...:00.000Z" is one cursor position.
+    """
+    cursor, seen_at_cursor = None, set()
+    while not stop.is_set():
+        time_range = {"gte": start_time} if cursor is None else {"gte": cursor, "format": "epoch_millis"}
+        try:
+            for hits in pit_pages(es, index, {"range": {"@timestamp": time_range}}, page_size):
+                for hit in hits:
+                    if hit["_id"] not in seen_at_cursor:
+                        out.put((hit, time.time()))
+                last_ts = hits[-1]["sort"][0]
+                if last_ts != cursor:
+                    cursor, seen_at_cursor = last_ts, set()
+                seen_at_cursor.update(h["_id"] for h in hits if h["sort"][0] == cursor)
+                if stop.is_set():
+                    break
+        except Exception as e:
+            print(f"Elasticsearch poll failed: {e}")
+        stop.wait(poll_s)
+
+
+# Sinks
+def to_export_frame(df):
+    """Same document shape as elasticsearch_export.py."""
+    df = df.drop(columns=[c for c in ("_ingest_time", "_input_row") if c in df.columns])
+    df.columns = [col.replace(".", "_") for col in df.columns]
+    df["user_feedback"] = df.get("user_feedback", "unknown")
+    df["reviewed"] = df.get("reviewed", False)
+    df["batch_timestamp"] = datetime.utcnow().isoformat()
+    return df.fillna("unknown")
+
+
+def to_records(df):
+    """Rows as ML_batch_scan.py writes them to JSON, the input of the export path."""
+    df = df.drop(columns=[c for c in ("_ingest_time", "_input_row") if c in df.columns])
+    return json.loads(df.to_json(orient="records"))
+
+
+class ElasticsearchSink:
+    """Every micro-batch goes through the export path of the batch pipeline (results_export.py):
+    incidents, anomaly documents, retention and rollups, with the same deterministic ids.
+
+    A failed export is retried with exponential backoff. Retries keep the batch id, so incidents
+    and rollups count the batch once even when an attempt got halfway.
+    """
+
+    def __init__(self, es, batch_prefix="stream", retries=SINK_RETRIES, backoff_s=SINK_BACKOFF_S):
+        self.es = es
+        self.batch_prefix = batch_prefix
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.batches = 0
+
+    def write(self, df_all, df_anomalies):
+        from results_export import export_batch
+        self.batches += 1
+        batch_id = f"{self.batch_prefix}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{self.batches}"
+        records, full_records = to_records(df_anomalies), to_records(df_all)
+        for attempt in range(self.retries + 1):
+            try:
+                return export_batch(self.es, records, full_records, batch_id, verbose=False)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff_s * 2 ** attempt
+                print(f"Export of {batch_id} failed ({e}), retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+
+class NdjsonSink:
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, df_all, df_anomalies):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in to_export_frame(df_all).to_dict("records"):
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+def write_dead_letter(path, documents):
+    """Append the raw documents of a failed micro-batch as NDJSON, readable by the replay source."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for doc in documents:
+            f.write(json.dumps(doc, default=str) + "\n")
+
+
+def score_documents(documents, ingest_times, bundle):
+    """Score one micro-batch. Returns (all scored rows, anomalies) with the ingest time per row."""
+    df = scan.documents_to_frame(documents)
+    df["_ingest_time"] = ingest_times
+    df = scan.prepare_features(df, verbose=False)
+    if df.empty:
+        return df, df
+    df, _, anomaly_mask = scan.score(df, bundle)
+    # Same flag as the batch scan, the retention policy keeps these rows in full
+    df["predicted_anomaly"] = anomaly_mask
+    df["user_feedback"] = None
+    df["reviewed"] = False
+    return df, df[anomaly_mask].copy()
+
+
+def run_stream(source, sink, bundle_source, sizer=None, stop=None, score=score_documents, report_every=20,
+               dead_letter=DEAD_LETTER_PATH):
+    """Consume the source queue in micro-batches until END_OF_STREAM or stop is set.
+
+    Args:
+        source (queue.Queue): (document, ingest time) pairs from one of the source functions.
+        sink: Object with write(df_all, df_anomalies).
+        bundle_source: Object with get() returning the model bundle, e.g. ModelReloader.
+        sizer (BatchSizer, optional): Batch sizing from the latency target.
+        stop (threading.Event, optional): Set to stop after the current batch.
+        score (callable, optional): Function(documents, ingest_times, bundle) -> (df_all, df_anomalies).
+        dead_letter (str, optional): NDJSON file for the documents of failed micro-batches; None drops them.
+
+    Returns:
+        dict: Summary with events, failed events, batches and end-to-end latency percentiles in seconds.
+    """
+    sizer = sizer or BatchSizer()
+    stop = stop or threading.Event()
+    latencies, batch_rows, events, anomalies, failed_events = [], [], 0, 0, 0
+    finished = False
+
+    while not finished and not stop.is_set():
+        max_wait, max_rows = sizer.limits()
+        try:
+            item = source.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if item is END_OF_STREAM:
+            break
+        batch = [item]
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = source.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is END_OF_STREAM:
+                finished = True
+                break
+            batch.append(item)
+
+        start = time.perf_counter()
+        documents, ingest_times = [d for d, _ in batch], [t for _, t in batch]
+        try:
+            df_all, df_anomalies = score(documents, ingest_times, bundle_source.get())
+            sink.write(df_all, df_anomalies)
+        except Exception as e:
+            failed_events += len(batch)
+            print(f"Micro-batch of {len(batch)} events failed: {e}")
+            if dead_letter:
+                try:
+                    write_dead_letter(dead_letter, documents)
+                    print(f"{len(batch)} events written to {dead_letter} for replay")
+                except OSError as write_error:
+                    print(f"Dead-letter write failed, {len(batch)} events lost: {write_error}")
+            continue
+        done = time.time()
+        batch_latencies = [done - t for t in ingest_times]
+        sizer.observe(len(batch), time.perf_counter() - start, batch_latencies)
+
+        latencies.extend(batch_latencies)
+        batch_rows.append(len(batch))
+        events += len(batch)
+        anomalies += len(df_anomalies)
+        if len(batch_rows) % report_every == 0:
+            print(f"{events} events | {len(batch_rows)} batches | last batch {len(batch)} rows "
+                  f"| p99 {sizer.p99():.2f}s | window {max_wait:.2f}s / {max_rows} rows")
+
+    summary = {"events": events, "failed_events": failed_events, "batches": len(batch_rows), "anomalies": anomalies,
+               "batch_rows_mean": round(float(np.mean(batch_rows)), 1) if batch_rows else 0}
+    if latencies:
+        p50, p99 = np.percentile(latencies, [50, 99])
+        summary.update({"latency_p50_s": round(float(p50), 3), "latency_p99_s": round(float(p99), 3),
+                        "latency_max_s": round(float(max(latencies)), 3)})
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score log documents in micro-batches as they arrive.")
+    parser.add_argument("--source", choices=["stdin", "file", "replay", "es"], default="stdin")
+    parser.add_argument("--path", help="NDJSON file for the file and replay sources.")
+    parser.add_argument("--eps", type=float, default=100.0, help="Events per second for the replay source.")
+    parser.add_argument("--index", default="logs-*", help="Index pattern for the es source.")
+    parser.add_argument("--sink", choices=["es", "ndjson"], default="es")
+    parser.add_argument("--output", default="../data/stream_scored.ndjson", help="Output file for the ndjson sink.")
+    parser.add_argument("--target-p99", type=float, default=TARGET_P99_S)
+    parser.add_argument("--dead-letter", default=DEAD_LETTER_PATH, help="NDJSON file for events of failed micro-batches.")
+    args = parser.parse_args()
+
+    es = None
+    if args.source == "es" or args.sink == "es":
+        from dotenv import load_dotenv
+        from elasticsearch import Elasticsearch
+        load_dotenv()
+        es = Elasticsearch(os.getenv("ES_HOST"), api_key=os.getenv("ES_API_KEY"), verify_certs=True)
+
+    source, stop = queue.Queue(maxsize=MAX_ROWS * 2), threading.Event()
+    if args.source == "stdin":
+        target, target_args = read_stream, (sys.stdin, source, stop)
+    elif args.source == "file":
+        target, target_args = tail_file, (args.path, source, stop)
+    elif args.source == "replay":
+        with open(args.path, encoding="utf-8") as f:
+            documents = [doc for doc in (parse_line(line) for line in f if line.strip()) if doc is not None]
+        target, target_args = replay, (documents, source, stop, args.eps)
+    else:
+        target, target_args = poll_elasticsearch, (es, args.index, source, stop)
+    threading.Thread(target=target, args=target_args, name="stream-source", daemon=True).start()
+
+    sink = ElasticsearchSink(es) if args.sink == "es" else NdjsonSink(args.output)
+    reloader = model_registry.ModelReloader(scan.load_bundle, fallback=scan.MODEL_DIR)
+    try:
+        summary = run_stream(source, sink, reloader, BatchSizer(target_p99_s=args.target_p99), stop,
+                             dead_letter=args.dead_letter)
+    except KeyboardInterrupt:
+        stop.set()
+        print("Stream stopped.")
+        return
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
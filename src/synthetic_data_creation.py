@@ -14,7 +14,7 @@ What this script does:
 3. Simulates vertical scans  and horizontal scans.
 4. Simulates spikes to single destination ip like ddos patterns.
 5. Creates records with unusual ip pairings using predefined category violations.
-6. Performs inline feature engineering like port entropy and bytes ratio.
+6. Performs feature engineering like port entropy and bytes ratio via log_features.py.
 7. Builds a combined dataset labeled for anomaly detection use.
 8. Exports the full dataset as json for further use by ML_model_training.py script.
 
@@ -30,8 +30,8 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
-from scipy.stats import entropy
 import hashlib
+from log_features import build_features
 
 # Configuration
 random.seed(42)
@@ -293,55 +293,16 @@ def generate_unusual_pairs(n):
 def build_df(base_df):
     """Add all engineered features and synthetic metadata fields to the dataset.
 
+    The feature code lives in log_features.py. The global generators seeded above are passed on
+    so the generated dataset stays the same.
+
     Args:
         base_df (pd.DataFrame): The input DataFrame.
 
     Returns:
         pd.DataFrame: The DataFrame with added features.
     """
-    base_df["@timestamp"] = pd.to_datetime(base_df["@timestamp"])
-    df = base_df.copy()
-    df["timestamp_minute"] = df["@timestamp"].dt.floor('min')
-
-    # After extracting timestamp_minute, convert @timestamp to ISO 8601 string
-    df["@timestamp"] = df["@timestamp"].apply(
-        lambda ts: ts.strftime('%Y-%m-%dT%H:%M:%S.%f') + f"{random.randint(0, 999):03d}Z"
-    )
-    # Flow statistics: how many flows/IP/minute and unique port spread
-    df["flow_count_per_minute"] = df.groupby(["source.ip", "timestamp_minute"])["session.id"].transform('count')
-    df["unique_dst_ports"] = df.groupby(["source.ip", "timestamp_minute"])["destination.port"].transform('nunique')
-
-    # Traffic shape metrics
-    df["bytes_ratio"] = df["session.iflow_bytes"] / (df["session.iflow_pkts"] + 1)
-
-    # Port entropy
-    def port_entropy(x):
-        value_counts = x.value_counts(normalize=True)
-        return entropy(value_counts)
-
-    entropy_series = df.groupby(["source.ip", "timestamp_minute"])["destination.port"].transform(port_entropy)
-    df["port_entropy"] = entropy_series
-
-    # Synthetic metadata fields
-    df["flow.duration"] = np.random.randint(10, 1000, len(df))
-    df["tcp.flags"] = np.random.choice(["SYN", "ACK", "RST", "FIN", "PSH"], len(df))
-    df["agent.version"] = np.random.choice(["8.17.1", "8.16.2", "8.15.0"], len(df))
-    df["fleet.action.type"] = np.random.choice(["POLICY_CHANGE", "ENROLL", "ACKNOWLEDGE", "NONE"], len(df),
-                                              p=[0.2, 0.2, 0.2, 0.4])
-    df["message"] = np.random.choice([
-        "component model updated",
-        "Updating running component model",
-        "Action delivered to agent on checkin",
-        "component started",
-        "heartbeat"
-    ], len(df))
-    df["msg_code"] = df["message"].astype("category").cat.codes
-    df["version_action_pair"] = df["agent.version"] + "-" + df["fleet.action.type"]
-    df["proto_port_pair"] = df["network.transport"] + "-" + df["destination.port"].astype(str)
-    df["bytes_per_pkt"] = df["session.iflow_bytes"] / (df["session.iflow_pkts"] + 1)
-    df["is_suspicious_ratio"] = (df["bytes_per_pkt"] < 2) | (df["bytes_per_pkt"] > 1000)
-    df["user_feedback"] = 0
-    return df
+    return build_features(base_df, rng=np.random, py_rng=random)
 
 
 # Combine traffic generation
@@ -0,0 +1,132 @@
+"""
+Script: training_scheduler.py
+Author: Moussa El Bazioui and Laurens Rasschaert
+Project: Bachelorproef — Data-driven anomaly detection on network logs
+
+Purpose:
+Runs model fits at the same time in a process pool under a total CPU budget.
+Used by ML_model_training.py and retrain_pipeline/retrain_models.py.
+
+What it does:
+1. Splits the core budget over the models using a weight per model (at least one thread each).
+2. Gives every model an explicit thread count (n_jobs for RF/XGBoost, BLAS/OpenMP limits for the rest).
+3. Fits each model in its own worker process and measures fit time and the peak memory of the process.
+   The peak is per process (ru_maxrss): it includes what the worker inherited from the caller and any
+   earlier fit in the same process, so it is an upper bound for the model, not its own footprint.
+4. Falls back to fitting one after another when processes cannot be forked.
+
+The budget comes from TRAIN_CPU_BUDGET and defaults to all cores of the machine.
+"""
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
+from pipeline_metrics import peak_rss_mb, stage
+
+# Relative share of the core budget per model. Tree ensembles scale with threads, the linear model does not.
+DEFAULT_WEIGHTS = {"random_forest": 2, "xgboost": 2, "logistic_regression": 1}
+
+
+def cpu_budget():
+    return max(1, int(os.getenv("TRAIN_CPU_BUDGET", os.cpu_count() or 1)))
+
+
+def allocate_threads(names, budget, weights=None):
+    """Divide the core budget over the models. Every model gets at least one thread.
+
+    Args:
+        names (list): Model names.
+        budget (int): Total number of cores that may be used at once.
+        weights (dict, optional): Relative share per model name. Defaults to DEFAULT_WEIGHTS.
+
+    Returns:
+        dict: Thread count per model name.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    if len(names) >= budget:
+        return {name: 1 for name in names}
+
+    shares = {name: weights.get(name, 1) for name in names}
+    total = sum(shares.values())
+    threads = {name: max(1, int(budget * share / total)) for name, share in shares.items()}
+
+    # Hand out cores lost to rounding, biggest share first
+    spare = budget - sum(threads.values())
+    for name in sorted(names, key=lambda n: shares[n], reverse=True):
+        if spare <= 0:
+            break
+        threads[name] += 1
+        spare -= 1
+    return threads
+
+
+def apply_thread_count(model, n_threads):
+    """Set the thread count on the model itself when it supports one."""
+    estimators = [step for _, step in model.steps] if hasattr(model, "steps") else [model]
+    for estimator in estimators:
+        if "n_jobs" in estimator.get_params():
+            estimator.set_params(n_jobs=n_threads)
+
+
+def _default_fit(model, X, y, **fit_kwargs):
+    model.fit(X, y, **fit_kwargs)
+    return model
+
+
+def _run_fit(name, job, n_threads):
+    model = job["model"]
+    fit = job.get("fit", _default_fit)
+    with threadpool_limits(limits=n_threads):
+        apply_thread_count(model, n_threads)
+        start = time.perf_counter()
+        model = fit(model, job["X"], job["y"], **job.get("fit_kwargs", {})) or model
+        fit_seconds = time.perf_counter() - start
+
+    # Do not bake the runner's thread count into the saved artifact
+    apply_thread_count(model, None)
+    return name, model, {
+        "threads": n_threads,
+        "fit_seconds": round(fit_seconds, 3),
+        "process_peak_rss_mb": peak_rss_mb(),
+        "rows": len(job["X"]),
+    }
+
+
+def run_fits(jobs, budget=None, weights=None):
+    """Fit several models concurrently under a total core budget.
+
+    Args:
+        jobs (dict): Model name mapped to a dict with "model", "X", "y" and optionally
+            "fit" (callable(model, X, y, **kwargs) returning the fitted model) and "fit_kwargs".
+        budget (int, optional): Total cores to use. Defaults to cpu_budget().
+        weights (dict, optional): Relative share per model name.
+
+    Returns:
+        tuple: (fitted models by name, fit stats by name)
+    """
+    budget = budget or cpu_budget()
+    threads = allocate_threads(list(jobs), budget, weights)
+    workers = min(len(jobs), budget)
+
+    models, stats = {}, {}
+    with stage("fit_models", rows=sum(len(job["X"]) for job in jobs.values())):
+        # Worker processes are forked so the calling script is not imported again
+        if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+                futures = [pool.submit(_run_fit, name, job, threads[name]) for name, job in jobs.items()]
+                for future in futures:
+                    name, model, model_stats = future.result()
+                    models[name] = model
+                    stats[name] = model_stats
+        else:
+            for name, job in jobs.items():
+                name, model, model_stats = _run_fit(name, job, threads[name])
+                models[name] = model
+                stats[name] = model_stats
+
+    for name, model_stats in stats.items():
+        print(f"{name:<19} | threads {model_stats['threads']:>2} | fit {model_stats['fit_seconds']:7.2f}s "
+              f"| process peak RSS {model_stats['process_peak_rss_mb']} MB")
+    return models, {"cpu_budget": budget, "parallel_workers": workers, "models": stats}
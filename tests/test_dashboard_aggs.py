@@ -0,0 +1,48 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.streamlit")))
+from core.dashboard_aggs import build_dashboard_query, parse_dashboard_response, pick_interval
+
+START = datetime(2025, 6, 1)
+HOUR_MS = 1748736000000  # 2025-06-01T00:00:00Z
+
+
+class TestDashboardAggs(unittest.TestCase):
+    def test_one_size_zero_request_with_all_aggregations(self):
+        body = build_dashboard_query(START, START + timedelta(days=5), min_score=0.5, only_with_feedback=True)
+        self.assertEqual(body["size"], 0)
+        self.assertEqual(set(body["aggs"]), {"over_time", "top_source_ips", "score_hist", "feedback",
+                                             "avg_score", "unique_source_ips"})
+        self.assertEqual(body["aggs"]["over_time"]["date_histogram"]["fixed_interval"], "1h")
+        self.assertIn({"range": {"model_score": {"gte": 0.5}}}, body["query"]["bool"]["must"])
+        self.assertIn({"exists": {"field": "user_feedback"}}, body["query"]["bool"]["must"])
+
+        months = build_dashboard_query(START, START + timedelta(days=90))
+        self.assertEqual(months["aggs"]["over_time"]["date_histogram"]["fixed_interval"], "1d")
+        self.assertEqual(pick_interval(START, START + timedelta(days=365)), timedelta(days=7))
+
+    def test_parse_response(self):
+        response = {
+            "took": 12,
+            "hits": {"total": {"value": 7, "relation": "eq"}},
+            "aggregations": {
+                "over_time": {"buckets": [{"key": HOUR_MS, "doc_count": 5}, {"key": HOUR_MS + 3600000, "doc_count": 2}]},
+                "top_source_ips": {"buckets": [{"key": "10.0.0.1", "doc_count": 6}]},
+                "score_hist": {"buckets": [{"key": 0.9000000001, "doc_count": 7}]},
+                "feedback": {"buckets": {"correct": {"doc_count": 1}, "incorrect": {"doc_count": 0},
+                                         "unknown": {"doc_count": 6}}},
+                "avg_score": {"value": 0.91},
+                "unique_source_ips": {"value": 2},
+            },
+        }
+        summary = parse_dashboard_response(response)
+        self.assertEqual(summary["total"], 7)
+        self.assertEqual(summary["over_time"][1]["time"], datetime(2025, 6, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(summary["score_hist"], [{"score": 0.9, "count": 7}])
+        self.assertEqual(summary["feedback"], [{"Feedback": "correct", "Count": 1}, {"Feedback": "unknown", "Count": 6}])
+
+
+if __name__ == "__main__":
+    unittest.main()
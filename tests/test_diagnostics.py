@@ -0,0 +1,90 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.streamlit")))
+from core.diagnostics import Diagnostics, InstrumentedES
+from core.query_cache import CachedSearch, QueryCache
+
+
+class FakeES:
+    def __init__(self):
+        self.calls = []
+
+    def search(self, **params):
+        self.calls.append(params)
+        response = {"took": 7, "hits": {"total": {"value": 42}, "hits": [{"_id": "a"}, {"_id": "b"}]}}
+        if params.get("profile") or params.get("body", {}).get("profile"):
+            response["profile"] = {"shards": [{"searches": [{"query": [
+                {"type": "BooleanQuery", "description": "+user_feedback.keyword:unknown", "time_in_nanos": 3000000,
+                 "children": [{"type": "TermQuery", "description": "user_feedback.keyword:unknown",
+                               "time_in_nanos": 1000000}]}]}]}]}
+        return response
+
+    def get(self, index, id):
+        return {"_id": id, "found": True, "_source": {"source_ip": "10.0.0.1"}}
+
+    def close_point_in_time(self, id):
+        return {"succeeded": True}
+
+
+class TestDiagnostics(unittest.TestCase):
+    def test_records_searches_cache_and_phases(self):
+        diagnostics = Diagnostics(max_reruns=2)
+        es = InstrumentedES(FakeES(), diagnostics)
+        search_es = CachedSearch(es, QueryCache(), on_lookup=diagnostics.cache_lookup)
+        body = {"query": {"match_all": {}}, "size": 2}
+
+        diagnostics.start_rerun()
+        search_es.search(index="network-anomalies", body=body)
+        search_es.search(index="network-anomalies", body=body)
+        es.get(index="network-anomalies", id="a")
+        with diagnostics.phase("grouping"):
+            es.search(pit={"id": "p"}, query={"match_all": {}}, size=2)
+        rerun = diagnostics.finish_rerun()
+
+        self.assertEqual((rerun["cache_hits"], rerun["cache_misses"]), (1, 1))
+        self.assertEqual([q["operation"] for q in rerun["queries"]], ["search", "get", "search"])
+        search = rerun["queries"][0]
+        self.assertEqual((search["took_ms"], search["hits"], search["total_hits"]), (7, 2, 42))
+        self.assertIn('"match_all"', search["body"])
+        self.assertGreater(search["payload_bytes"], 0)
+        self.assertEqual(rerun["queries"][1]["hits"], 1)
+        self.assertIn('"pit"', rerun["queries"][2]["body"])
+        self.assertEqual(rerun["es_took_ms"], 14)
+        self.assertIn("grouping", rerun["phases"])
+        self.assertIsNone(search["profile"])
+        # Passes other calls through untouched
+        self.assertEqual(es.close_point_in_time(id="p"), {"succeeded": True})
+
+    def test_only_last_reruns_are_kept(self):
+        diagnostics = Diagnostics(max_reruns=2)
+        for _ in range(3):
+            diagnostics.start_rerun()
+        diagnostics.finish_rerun()
+        self.assertEqual(len(diagnostics.reruns), 2)
+        self.assertTrue(diagnostics.reruns[0]["interrupted"])
+        self.assertFalse(diagnostics.reruns[1]["interrupted"])
+
+    def test_slow_searches_are_profiled(self):
+        fake = FakeES()
+        diagnostics = Diagnostics(slow_query_ms=0, profile_slow=True)
+        es = InstrumentedES(fake, diagnostics)
+        diagnostics.start_rerun()
+        es.search(index="network-anomalies", body={"query": {"match_all": {}}})
+        rerun = diagnostics.finish_rerun()
+        self.assertTrue(fake.calls[-1]["body"]["profile"])
+        profile = rerun["queries"][0]["profile"]
+        self.assertEqual([node["type"] for node in profile], ["BooleanQuery", "TermQuery"])
+        self.assertEqual(profile[0]["time_ms"], 3.0)
+
+    def test_nothing_recorded_while_off(self):
+        diagnostics = Diagnostics()
+        es = InstrumentedES(FakeES(), diagnostics)
+        es.search(index="network-anomalies", body={"query": {"match_all": {}}})
+        with diagnostics.phase("rendering"):
+            pass
+        self.assertEqual(len(diagnostics.reruns), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import os
+import shutil
+import sys
+import pandas as pd
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+from feature_cache import cached_feature_matrix, cache_key, evict, save_arrays, load_arrays, ENCODER_CONFIG
+
+CATEGORICAL = ["source.ip", "network.transport"]
+NUMERIC = ["destination.port", "session.iflow_bytes"]
+
+
+class TestFeatureCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = os.path.join(os.path.dirname(__file__), "test_feature_cache")
+        self.df = pd.DataFrame({
+            "source.ip": [f"10.0.0.{i % 7}" for i in range(60)],
+            "network.transport": ["tcp", "udp"] * 30,
+            "destination.port": [53, 443, "unknown"] * 20,
+            "session.iflow_bytes": range(60),
+            "label": [0, 1] * 30,
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_second_call_is_a_hit_with_same_matrix(self):
+        X1, y1, _, hit1 = cached_feature_matrix(self.df, CATEGORICAL, NUMERIC, label="label", cache_dir=self.cache_dir)
+        X2, y2, encoder, hit2 = cached_feature_matrix(self.df, CATEGORICAL, NUMERIC, label="label", cache_dir=self.cache_dir)
+
+        self.assertFalse(hit1)
+        self.assertTrue(hit2)
+        pd.testing.assert_frame_equal(X1, X2)
+        self.assertEqual(list(y2), list(self.df["label"]))
+        self.assertIn("isoforest_score", X2.columns)
+        # The cached encoder still encodes new rows
+        self.assertEqual(encoder.transform(self.df[CATEGORICAL].astype(str)).shape[1], ENCODER_CONFIG["n_components"])
+
+    def test_key_depends_on_data_schema_and_config(self):
+        base = cache_key(self.df, CATEGORICAL, NUMERIC, "label")
+        changed = self.df.copy()
+        changed.loc[0, "session.iflow_bytes"] = 999
+        self.assertNotEqual(base, cache_key(changed, CATEGORICAL, NUMERIC, "label"))
+        self.assertNotEqual(base, cache_key(self.df, CATEGORICAL, NUMERIC[:1], "label"))
+        self.assertNotEqual(base, cache_key(self.df, CATEGORICAL, NUMERIC, "label", config={**ENCODER_CONFIG, "n_components": 16}))
+
+    def test_eviction_by_size(self):
+        cached_feature_matrix(self.df, CATEGORICAL, NUMERIC, label="label", cache_dir=self.cache_dir)
+        removed = evict(self.cache_dir, max_mb=0)
+        self.assertEqual(len(removed), 1)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_arrays_roundtrip_memory_mapped(self):
+        X = pd.DataFrame({"a": [1.0, 2.0], "b": [3.0, 4.0]})
+        save_arrays(self.cache_dir, X, [0, 1])
+        X_loaded, y_loaded = load_arrays(self.cache_dir)
+        pd.testing.assert_frame_equal(X, X_loaded)
+        self.assertEqual(list(y_loaded), [0, 1])
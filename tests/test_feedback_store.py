@@ -0,0 +1,53 @@
+import unittest
+import os
+import shutil
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../retrain_pipeline")))
+from feedback_store import holdout_mask, hits_to_frame, append_partition, list_partitions, read_feedback
+
+
+class TestFeedbackStore(unittest.TestCase):
+    def setUp(self):
+        self.store_dir = os.path.join(os.path.dirname(__file__), "test_feedback_store_dedup")
+
+    def tearDown(self):
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+
+    def _hit(self, doc_id, feedback, ts, **fields):
+        return {"_id": doc_id, "_source": {"user_feedback": feedback, "feedback_timestamp": ts, **fields}}
+
+    def test_later_feedback_wins(self):
+        append_partition(hits_to_frame([
+            self._hit("a", "correct", "2025-06-01T10:00:00+00:00", source_port=80),
+            self._hit("b", "correct", "2025-06-01T10:05:00+00:00", source_port="unknown"),
+        ]), "20250601T100000", 0, store_dir=self.store_dir)
+        append_partition(hits_to_frame([
+            self._hit("a", "incorrect", "2025-06-02T09:00:00+00:00", source_port=80),
+        ]), "20250602T090000", 0, store_dir=self.store_dir)
+
+        df = read_feedback(store_dir=self.store_dir).set_index("_id")
+        self.assertEqual(len(df), 2)
+        self.assertEqual(df.loc["a", "user_feedback"], "incorrect")
+        self.assertEqual(df.loc["b", "user_feedback"], "correct")
+
+    def test_column_projection(self):
+        append_partition(hits_to_frame([
+            self._hit("a", "correct", "2025-06-01T10:00:00+00:00", source_ip="10.0.0.1", message="heartbeat"),
+        ]), "20250601T100000", 0, store_dir=self.store_dir)
+
+        df = read_feedback(columns=["source_ip", "destination_ip"], store_dir=self.store_dir)
+        self.assertIn("source_ip", df.columns)
+        self.assertNotIn("message", df.columns)
+        # Columns never exported come back empty instead of failing
+        self.assertTrue(df["destination_ip"].isna().all())
+
+    def test_empty_store(self):
+        self.assertEqual(list_partitions(self.store_dir), [])
+        self.assertTrue(read_feedback(columns=["source_ip"], store_dir=self.store_dir).empty)
+
+    def test_holdout_is_stable_as_the_store_grows(self):
+        ids = [f"doc{i}" for i in range(2000)]
+        first = holdout_mask(ids)
+        grown = holdout_mask(ids + [f"new{i}" for i in range(3000)])
+        self.assertTrue((grown[:2000] == first).all())
+        self.assertAlmostEqual(first.mean(), 0.2, delta=0.03)
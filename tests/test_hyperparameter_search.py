@@ -0,0 +1,48 @@
+import unittest
+import os
+import sys
+import time
+import pandas as pd
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../retrain_pipeline")))
+from hyperparameter_search import SEARCH_SPACES, successive_halving, objective, search_split
+
+
+class TestHyperparameterSearch(unittest.TestCase):
+    def setUp(self):
+        X, y = make_classification(n_samples=1200, n_features=8, random_state=42)
+        self.X_train, self.y_train = pd.DataFrame(X[:900]), pd.Series(y[:900])
+        self.X_val, self.y_val = pd.DataFrame(X[900:]), pd.Series(y[900:])
+
+    def test_objective_penalizes_latency_and_size(self):
+        self.assertGreater(objective(0.9, 1, 1), objective(0.9, 50, 1))
+        self.assertGreater(objective(0.9, 1, 1), objective(0.9, 1, 20))
+
+    def test_search_split_stays_inside_training_rows(self):
+        X_fit, X_search_val, y_fit, y_search_val = search_split(self.X_train, self.y_train)
+        self.assertEqual(len(X_fit) + len(X_search_val), len(self.X_train))
+        self.assertFalse(set(X_fit.index) & set(X_search_val.index))
+        self.assertTrue(set(X_search_val.index) <= set(self.X_train.index))
+        self.assertEqual(y_search_val.nunique(), 2)
+
+    def test_halving_returns_config_from_space(self):
+        best, trials = successive_halving("random_forest", RandomForestClassifier(random_state=42),
+                                          self.X_train, self.y_train, self.X_val, self.y_val,
+                                          deadline=time.monotonic() + 60, n_configs=6)
+        for key, value in best.items():
+            self.assertIn(value, SEARCH_SPACES["random_forest"][key])
+        # Later rungs get more rows and fewer configs
+        rungs = sorted({t["rung"] for t in trials})
+        self.assertGreater(len(rungs), 1)
+        first = [t for t in trials if t["rung"] == rungs[0]]
+        last = [t for t in trials if t["rung"] == rungs[-1]]
+        self.assertLess(len(last), len(first))
+        self.assertGreater(last[0]["rows"], first[0]["rows"])
+
+    def test_expired_budget_keeps_defaults(self):
+        best, trials = successive_halving("random_forest", RandomForestClassifier(random_state=42),
+                                          self.X_train, self.y_train, self.X_val, self.y_val,
+                                          deadline=time.monotonic() - 1)
+        self.assertIsNone(best)
+        self.assertEqual(trials, [])
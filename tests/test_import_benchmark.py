@@ -0,0 +1,37 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+from import_benchmark import parse_importtime, summarize, check, measure
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       500 |        500 | site
+import time:       120 |        120 |   _io
+import time:       300 |       2500 |     numpy.core
+import time:      4000 |       9000 |   pandas
+import time:       800 |      10300 | my_script
+"""
+
+
+class TestImportBenchmark(unittest.TestCase):
+    def test_parse_and_summarize(self):
+        entries = parse_importtime(SAMPLE)
+        self.assertEqual([e["module"] for e in entries], ["site", "_io", "numpy.core", "pandas", "my_script"])
+        self.assertEqual(entries[2]["depth"], 2)
+
+        report = summarize(entries, "my_script")
+        self.assertEqual(report["total_ms"], 10.3)
+        self.assertEqual(report["top_packages"][0], {"package": "pandas", "cumulative_ms": 9.0})
+        self.assertNotIn("site", [row["package"] for row in report["top_packages"]])
+        self.assertEqual(report["heavy_loaded"], ["numpy", "pandas"])
+        self.assertEqual(len(check(report, budget_ms=5, lazy=["pandas"])), 2)
+        self.assertEqual(check(report, budget_ms=50, lazy=["sklearn"]), [])
+
+    def test_batch_scan_import_is_lean(self):
+        report = measure("ML_batch_scan", runs=1)
+        for package in ("pandas", "sklearn", "scipy", "xgboost", "category_encoders", "joblib"):
+            self.assertNotIn(package, report["heavy_loaded"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+from incidents import assign_incidents, build_incident_actions, log_doc_id, segment_alerts, upsert_incidents
+from send_mail import incident_mail
+
+
+def alert(minute, second=0, src="10.0.0.1", score=0.9):
+    return {"@timestamp": f"2025-06-01T10:{minute:02d}:{second:02d}.000000123Z", "session.id": f"s{minute}-{second}-{src}",
+            "source.ip": src, "destination.ip": "10.0.0.9", "network.transport": "tcp", "destination.port": 22,
+            "model_score": score, "RF_score": score}
+
+
+class FakeIndices:
+    def __init__(self):
+        self.created = []
+
+    def exists(self, index):
+        return bool(self.created)
+
+    def create(self, index, mappings):
+        self.created.append(index)
+
+
+class FakeES:
+    """Answers the latest-incident lookup; fake_streaming_bulk answers the upserts."""
+
+    def __init__(self, latest_hits=()):
+        self.indices = FakeIndices()
+        self.latest_hits = list(latest_hits)
+        self.searches = []
+        self.actions = []
+
+    def search(self, index, body):
+        self.searches.append(body)
+        return {"hits": {"hits": self.latest_hits}}
+
+
+def fake_streaming_bulk(es, actions, **kwargs):
+    for action in actions:
+        es.actions.append(action)
+        result = "updated" if any(h["_id"] == action["_id"] for h in es.latest_hits) else "created"
+        yield True, {"update": {"_id": action["_id"], "_index": action["_index"], "status": 200, "result": result}}
+
+
+class TestIncidents(unittest.TestCase):
+    def test_segments_split_on_gap(self):
+        rows = [alert(0), alert(10), alert(59, 59), alert(5, src="10.0.0.2")]
+        segments = segment_alerts(rows, gap_s=1800)
+        self.assertEqual(sorted((s["signature"]["source_ip"], len(s["rows"])) for s in segments),
+                         [("10.0.0.1", 1), ("10.0.0.1", 2), ("10.0.0.2", 1)])
+        first = [s for s in segments if s["signature"]["source_ip"] == "10.0.0.1"][0]
+        self.assertEqual((first["first_seen"], first["last_seen"]), ("2025-06-01T10:00:00Z", "2025-06-01T10:10:00Z"))
+
+    def test_continues_active_incident(self):
+        segments = segment_alerts([alert(20)], gap_s=1800)
+        sig = segments[0]["signature_id"]
+        assign_incidents(segments, {sig: {"_id": "existing", "last_seen": "2025-06-01T10:00:00Z"}}, gap_s=1800)
+        self.assertEqual(segments[0]["incident_id"], "existing")
+        assign_incidents(segments, {sig: {"_id": "existing", "last_seen": "2025-06-01T09:00:00Z"}}, gap_s=1800)
+        self.assertEqual(segments[0]["incident_id"], f"{sig}-20250601T102000")
+
+    def test_actions_are_scripted_upserts(self):
+        rows = [alert(0, score=0.8), alert(1, score=0.95)]
+        segments = assign_incidents(segment_alerts(rows), {})
+        action = build_incident_actions(segments, "run-1", "network-anomalies-all-realtime", max_refs=1)[0]
+        self.assertTrue(action["scripted_upsert"])
+        params = action["script"]["params"]
+        self.assertEqual((params["count"], params["batch_id"]), (2, "run-1"))
+        self.assertEqual(params["max_scores"]["model_score"], 0.95)
+        self.assertEqual(params["members"], [{"index": "network-anomalies-all-realtime", "id": log_doc_id(rows[0])}])
+        # The row that is not referenced still counts as overflow
+        self.assertEqual(params["extra_overflow"], 1)
+
+    def test_member_ids_match_export_field_names(self):
+        row = alert(3)
+        exported = {key.replace(".", "_"): value for key, value in row.items()}
+        self.assertEqual(log_doc_id(row), log_doc_id(exported))
+
+    @patch("incidents.streaming_bulk", fake_streaming_bulk)
+    def test_sustained_attack_updates_one_incident(self):
+        rows = [alert(minute, second) for minute in range(5) for second in range(0, 60, 5)]
+        es = FakeES()
+        summary = upsert_incidents(es, rows, "run-1", "network-anomalies-all-realtime")
+        self.assertEqual((summary["alerts"], len(summary["incidents"]), summary["created"]), (60, 1, 1))
+        self.assertEqual(len(es.actions), 1)
+        self.assertEqual(es.indices.created, ["network-incidents"])
+        self.assertEqual(es.searches[0]["collapse"], {"field": "signature_id"})
+
+        # Next batch: the lookup finds the incident, so it is updated, not recreated
+        incident_id = summary["incidents"][0]["incident_id"]
+        es = FakeES([{"_id": incident_id, "_source": {"signature_id": incident_id.split("-")[0],
+                                                      "last_seen": "2025-06-01T10:04:55Z"}}])
+        next_batch = [alert(minute) for minute in range(5, 10)]
+        summary = upsert_incidents(es, next_batch, "run-2", "network-anomalies-all-realtime")
+        self.assertEqual((summary["created"], summary["updated"]), (0, 1))
+        self.assertEqual(summary["incidents"][0]["incident_id"], incident_id)
+
+    @patch("incidents.streaming_bulk", fake_streaming_bulk)
+    def test_alert_docs_only_for_referenced_members(self):
+        rows = [alert(minute, second) for minute in range(25) for second in range(0, 60, 6)]
+        summary = upsert_incidents(FakeES(), rows, "run-1", "network-anomalies-realtime")
+        members = summary["alert_doc_ids"]
+        self.assertEqual(members, [log_doc_id(row) for row in rows[:200]])
+
+        incident_id = summary["incidents"][0]["incident_id"]
+        full = FakeES([{"_id": incident_id, "_source": {"signature_id": incident_id.split("-")[0],
+                                                        "last_seen": "2025-06-01T10:24:54Z",
+                                                        "members": [{"index": "network-anomalies-realtime", "id": doc_id}
+                                                                    for doc_id in members]}}])
+        # The incident is full: the next batch only adds to the counters
+        summary = upsert_incidents(full, [alert(minute) for minute in range(25, 30)], "run-2", "network-anomalies-realtime")
+        self.assertEqual(summary["alert_doc_ids"], [])
+        self.assertEqual((full.actions[0]["script"]["params"]["members"], full.actions[0]["script"]["params"]["extra_overflow"]), ([], 5))
+        # Rerunning the first batch writes the documents of its members again
+        self.assertEqual(upsert_incidents(full, rows, "run-1", "network-anomalies-realtime")["alert_doc_ids"], members)
+
+    def test_mail_only_for_new_incidents(self):
+        ongoing = {"incidents": [{"incident_id": "a", "signature": "x", "alerts": 60, "first_seen": "t0",
+                                  "last_seen": "t1", "max_model_score": 0.9, "result": "updated"}]}
+        self.assertIsNone(incident_mail(ongoing))
+        ongoing["incidents"].append({**ongoing["incidents"][0], "incident_id": "b", "result": "created"})
+        subject, body = incident_mail(ongoing)
+        self.assertIn("1 new incident", subject)
+        self.assertIn("received 60 more alerts", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
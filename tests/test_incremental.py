@@ -0,0 +1,41 @@
+import unittest
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../retrain_pipeline")))
+from sklearn.ensemble import RandomForestClassifier
+from xgboost import XGBClassifier
+from incremental import forest_can_grow, booster_can_grow, warm_start_forest
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(60, 3))
+        self.y = (self.X[:, 0] > 0).astype(int)
+
+    def test_warm_start_adds_trees(self):
+        model = RandomForestClassifier(n_estimators=5, random_state=0).fit(self.X, self.y)
+        warm_start_forest(model, self.X, self.y, step=3)
+        self.assertEqual(len(model.estimators_), 8)
+
+    def test_tree_count_is_capped(self):
+        model = RandomForestClassifier(n_estimators=5, random_state=0).fit(self.X, self.y)
+        grown = 0
+        while forest_can_grow(model, step=3, max_trees=12):
+            warm_start_forest(model, self.X, self.y, step=3)
+            grown += 1
+        # 5 -> 8 -> 11, one more would pass the cap
+        self.assertEqual((grown, len(model.estimators_)), (2, 11))
+        self.assertFalse(forest_can_grow(model, step=3, max_trees=12))
+
+    def test_boosting_rounds_are_capped(self):
+        model = XGBClassifier(n_estimators=10, eval_metric="logloss").fit(self.X, self.y)
+        self.assertTrue(booster_can_grow(model, step=5, max_rounds=15))
+        grown = XGBClassifier(n_estimators=5, eval_metric="logloss").fit(self.X, self.y, xgb_model=model.get_booster())
+        self.assertEqual(grown.get_booster().num_boosted_rounds(), 15)
+        self.assertFalse(booster_can_grow(grown, step=5, max_rounds=15))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from datetime import datetime, timezone
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.streamlit")))
+from core.live_refresh import LiveView
+
+BASE_QUERY = {"match_all": {}}
+
+
+def doc(i, second, src="10.0.0.1", rf=0.5, short=False):
+    timestamp = f"2025-06-01T10:00:{second:02d}Z" if short else f"2025-06-01T10:00:{second:02d}.000000000Z"
+    return {"_id": f"doc{i}", "_index": "network-anomalies", "_source": {
+        "@timestamp": timestamp, "source_ip": src, "destination_ip": "10.0.0.9",
+        "network_transport": "tcp", "RF_score": rf}}
+
+
+def millis(source):
+    # What Elasticsearch sorts on: the instant, whatever the string form
+    return int(datetime(2025, 6, 1, 10, 0, int(source["@timestamp"][17:19]), tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class FakeES:
+    """Answers the cursor query, the PIT walk, the group page and the polls from one list of documents."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.bodies = []
+
+    def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit1"}
+
+    def close_point_in_time(self, id):
+        pass
+
+    def search(self, index=None, body=None, **params):
+        body = body or params
+        self.bodies.append(body)
+        if "aggs" in body:
+            bucket = {"key": {"source_ip": "10.0.0.1", "destination_ip": "10.0.0.9", "network_transport": "tcp",
+                              "minute": 1748772000000}, "doc_count": 2,
+                      "first_seen": {"value": 1748772000000}, "last_seen": {"value": 1748772010000}}
+            for score in ("RF", "ISO", "XGBoost", "Logistic", "Model score"):
+                bucket[score] = {"value": 0.5 if score == "RF" else 0}
+            return {"aggregations": {"groups": {"buckets": [bucket]}}}
+        order = body["sort"][0]["@timestamp"]["order"]
+        docs = sorted(self.docs, key=lambda d: millis(d["_source"]), reverse=order == "desc")
+        ranges = body["query"].get("bool", {}).get("filter", [])
+        for clause in ranges:
+            gte, lte = clause["range"]["@timestamp"].get("gte"), clause["range"]["@timestamp"].get("lte")
+            if gte:
+                docs = [d for d in docs if millis(d["_source"]) >= gte]
+            if lte:
+                docs = [d for d in docs if millis(d["_source"]) <= lte]
+        docs = [{**d, "sort": [millis(d["_source"]), d["_id"]]} for d in docs]
+        if "search_after" in body:
+            start = [d["sort"] for d in docs].index(body["search_after"]) + 1
+            docs = docs[start:]
+        return {"hits": {"hits": docs[:body["size"]]}}
+
+
+class TestLiveRefresh(unittest.TestCase):
+    def test_polls_only_merge_new_documents(self):
+        es = FakeES([doc(1, 0), doc(2, 10)])
+        live = LiveView.start(es, "network-anomalies", BASE_QUERY, "sig", page_size=50, after_key=None)
+        self.assertEqual(live.cursor, 1748772010000)
+        page_body = next(body for body in es.bodies if "aggs" in body)
+        self.assertEqual(page_body["query"]["bool"]["filter"][0]["range"]["@timestamp"], {"lte": live.cursor, "format": "epoch_millis"})
+
+        # Nothing new: the document at the cursor was already counted by the page
+        self.assertEqual(live.poll(es, "network-anomalies", BASE_QUERY), 0)
+
+        # doc3 is at the cursor instant, written without fraction digits
+        es.docs += [doc(3, 10, rf=1.0, short=True), doc(4, 20, src="10.0.0.2", rf=0.9)]
+        self.assertEqual(live.poll(es, "network-anomalies", BASE_QUERY), 2)
+        self.assertEqual(es.bodies[-1]["query"]["bool"]["filter"][0]["range"]["@timestamp"],
+                         {"gte": 1748772010000, "format": "epoch_millis"})
+        self.assertIn("_source", es.bodies[-1])
+
+        page_group = live.page_groups()[0]
+        self.assertEqual(page_group["count"], 3)
+        self.assertAlmostEqual(page_group["scores"]["RF"], (0.5 * 2 + 1.0) / 3)
+        self.assertEqual(page_group["live_updates"], 1)
+        new_group = live.new_groups()[0]
+        self.assertEqual((new_group["source_ip"], new_group["count"]), ("10.0.0.2", 1))
+        self.assertEqual(new_group["minute"], datetime(2025, 6, 1, 10, 0))
+        self.assertEqual(live.cursor, 1748772020000)
+        self.assertEqual(live.poll(es, "network-anomalies", BASE_QUERY), 0)
+
+    def test_cursor_ids_cover_a_burst_at_the_newest_timestamp(self):
+        es = FakeES([doc(0, 0)] + [doc(i, 10) for i in range(1, 1201)])
+        live = LiveView.start(es, "network-anomalies", BASE_QUERY, "sig", page_size=50, after_key=None)
+        self.assertEqual(len(live._seen), 1200)
+        self.assertEqual(live.poll(es, "network-anomalies", BASE_QUERY, batch_size=2000), 0)
+
+    def test_full_batches_keep_paging(self):
+        es = FakeES([doc(0, 0)])
+        live = LiveView.start(es, "network-anomalies", BASE_QUERY, "sig", page_size=50, after_key=None)
+        es.docs += [doc(i, i) for i in range(1, 8)]
+        self.assertEqual(live.poll(es, "network-anomalies", BASE_QUERY, batch_size=3), 7)
+        self.assertEqual(live.page_groups()[0]["count"], 2 + 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import model_registry as registry
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.registry_dir = Path(self.tmp.name) / "registry"
+        self.fallback = Path(self.tmp.name) / "models"
+        self.fallback.mkdir()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def publish(self, value):
+        return registry.publish({name: {"value": value} for name in registry.MODEL_NAMES},
+                                {"run": value}, registry_dir=self.registry_dir)
+
+    def test_publish_is_immutable_and_not_current(self):
+        version = self.publish("v1")
+        self.assertIsNone(registry.current_version(self.registry_dir))
+        self.assertEqual(registry.list_versions(self.registry_dir), [version])
+        self.assertEqual(registry.verify_version(version, self.registry_dir), [])
+        model_file = registry.version_dir(version, self.registry_dir) / "xgboost_model.pkl"
+        self.assertFalse(model_file.stat().st_mode & stat.S_IWUSR)
+
+    def test_promote_and_rollback_flip_the_pointer(self):
+        v1 = self.publish("v1")
+        registry.set_current(v1, registry_dir=self.registry_dir)
+        v2 = self.publish("v2")
+        self.assertEqual(registry.read_manifest(v2, self.registry_dir)["parent"], v1)
+
+        registry.set_current(v2, registry_dir=self.registry_dir)
+        self.assertEqual(registry.current_version(self.registry_dir), v2)
+        self.assertEqual(registry.rollback(registry_dir=self.registry_dir), v1)
+        self.assertEqual(registry.current_model_dir(self.registry_dir, self.fallback),
+                         registry.version_dir(v1, self.registry_dir))
+
+    def test_lfs_pointer_is_not_published(self):
+        pointer = self.fallback / "xgboost_model.pkl"
+        pointer.write_text("version https://git-lfs.github.com/spec/v1\noid sha256:abc\nsize 123\n")
+        with self.assertRaises(ValueError):
+            registry.publish({"xgboost": pointer}, registry_dir=self.registry_dir)
+        self.assertEqual(registry.list_versions(self.registry_dir), [])
+
+    def test_feedback_cutoffs_come_from_the_current_version(self):
+        self.assertEqual(registry.deployed_feedback_cutoffs(self.registry_dir), {})
+        cutoffs = {name: "2025-06-03T10:59:00+00:00" for name in registry.MODEL_NAMES}
+        version = registry.publish({name: {"value": "v1"} for name in registry.MODEL_NAMES},
+                                   {"feedback_cutoffs": cutoffs}, registry_dir=self.registry_dir)
+        # A published but not promoted version does not move the cutoffs
+        self.assertEqual(registry.deployed_feedback_cutoffs(self.registry_dir), {})
+        registry.set_current(version, registry_dir=self.registry_dir)
+        self.assertEqual(registry.deployed_feedback_cutoffs(self.registry_dir), cutoffs)
+
+    def test_unknown_version_is_rejected(self):
+        with self.assertRaises(ValueError):
+            registry.set_current("missing", registry_dir=self.registry_dir)
+
+    def test_reloader_picks_up_new_version_between_batches(self):
+        loads = []
+
+        def load(model_dir):
+            loads.append(Path(model_dir).name)
+            return Path(model_dir).name
+
+        reloader = registry.ModelReloader(load, self.registry_dir, self.fallback)
+        self.assertEqual(reloader.get(), "models")
+        self.assertEqual(reloader.get(), "models")
+
+        v1 = self.publish("v1")
+        registry.set_current(v1, registry_dir=self.registry_dir)
+        self.assertEqual(reloader.get(), v1)
+        self.assertEqual(loads, ["models", v1])
+        self.assertEqual(reloader.reloads, 1)
+
+    def test_reloader_keeps_old_bundle_when_reload_fails(self):
+        def load(model_dir):
+            if Path(model_dir).name != "models":
+                raise OSError("broken")
+            return "old"
+
+        reloader = registry.ModelReloader(load, self.registry_dir, self.fallback)
+        self.assertEqual(reloader.get(), "old")
+        registry.set_current(self.publish("v1"), registry_dir=self.registry_dir)
+        self.assertEqual(reloader.get(), "old")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import pipeline_metrics
+from pipeline_metrics import PipelineRun, stage, count, add_bytes, es_took
+
+
+class TestPipelineMetrics(unittest.TestCase):
+    def tearDown(self):
+        pipeline_metrics._active_run = None
+
+    def test_stage_is_a_no_op_without_active_run(self):
+        with stage("build_df", rows=10) as timer:
+            timer.rows = 20
+        count("ignored")
+        self.assertIsNone(pipeline_metrics.active_run())
+
+    def test_run_record_aggregates_stages_and_counters(self):
+        run = PipelineRun("test_script", run_id="r1")
+        pipeline_metrics._active_run = run
+        for _ in range(2):
+            with stage("encoding", rows=50):
+                pass
+        with stage("es_fetch") as timer:
+            timer.rows = 7
+        count("pages", 3)
+        add_bytes(bytes_in=100, bytes_out=40)
+        es_took({"took": 12})
+        es_took({"took": 5})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metrics.jsonl")
+            record = run.finish(metrics_file=path)
+            self.assertIsNone(run.finish(metrics_file=path))  # Written once
+            with open(path, encoding="utf-8") as f:
+                lines = f.readlines()
+
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["run_id"], "r1")
+        self.assertEqual(record["stages"]["encoding"]["calls"], 2)
+        self.assertEqual(record["stages"]["encoding"]["rows"], 100)
+        self.assertEqual(record["stages"]["es_fetch"]["rows"], 7)
+        self.assertEqual(record["counters"], {"pages": 3})
+        self.assertEqual((record["bytes_in"], record["bytes_out"], record["es_took_ms"]), (100, 40, 17))
+        self.assertIsNone(pipeline_metrics.active_run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+from profiling import RunProfiler, profiling_enabled
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+class TestProfiling(unittest.TestCase):
+    def test_switch_from_argv(self):
+        self.assertTrue(profiling_enabled(["script.py", "--profile"]))
+        self.assertFalse(profiling_enabled(["script.py", "--mode", "full"]))
+
+    def test_reports_written_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = RunProfiler("unit_test", out_dir=tmp).start()
+            busy(200000)
+            blocks = [bytearray(1024) for _ in range(100)]
+            summary = profiler.stop()
+            self.assertIsNone(profiler.stop())
+
+            for name in ("profile.prof", "profile.txt", "allocations.txt", "summary.json"):
+                self.assertTrue((profiler.out_dir / name).exists(), name)
+            with open(profiler.out_dir / "summary.json", encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["script"], "unit_test")
+        self.assertTrue(any("busy" in row["function"] or "genexpr" in row["function"] for row in summary["hot_functions"]))
+        self.assertEqual(len(blocks), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.streamlit")))
+from core.query_cache import QueryCache, CachedSearch
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.es = MagicMock()
+        self.es.search.side_effect = lambda index, body: {"index": index, "size": body.get("size")}
+        self.clock = FakeClock()
+        self.cache = QueryCache(ttl_s=60, clock=self.clock)
+
+    def test_key_ignores_dict_order_and_expires(self):
+        first = self.cache.search(self.es, "network-anomalies", {"size": 10, "query": {"match_all": {}}})
+        again = self.cache.search(self.es, "network-anomalies", {"query": {"match_all": {}}, "size": 10})
+        self.assertIs(first, again)
+        self.cache.search(self.es, "network-anomalies", {"size": 20, "query": {"match_all": {}}})
+        self.assertEqual(self.es.search.call_count, 2)
+
+        self.clock.now = 61
+        self.cache.search(self.es, "network-anomalies", {"size": 10, "query": {"match_all": {}}})
+        self.assertEqual(self.es.search.call_count, 3)
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 3))
+        self.assertAlmostEqual(stats["hit_rate"], 0.25)
+        self.assertIsNotNone(stats["es_p50_ms"])
+
+    def test_invalidate_only_touched_indexes(self):
+        search = CachedSearch(self.es, self.cache)
+        search.search(index="network-anomalies", body={"size": 1})
+        search.search(index=["network-anomalies-all", "network-anomalies"], body={"size": 1})
+        search.search(index="pipeline-metrics", body={"size": 1})
+
+        self.assertEqual(self.cache.invalidate(["network-anomalies"]), 2)
+        search.search(index="pipeline-metrics", body={"size": 1})
+        search.search(index="network-anomalies", body={"size": 1})
+        self.assertEqual(self.es.search.call_count, 4)
+        self.assertEqual(self.cache.stats()["invalidated"], 2)
+
+    def test_oldest_entry_evicted(self):
+        cache = QueryCache(ttl_s=60, max_entries=2, clock=self.clock)
+        for size in (1, 2, 3):
+            cache.search(self.es, "network-anomalies", {"size": size})
+        cache.search(self.es, "network-anomalies", {"size": 1})
+        self.assertEqual(self.es.search.call_count, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
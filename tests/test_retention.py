@@ -0,0 +1,71 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+from retention import apply_retention, build_rollup_actions, build_rollups, is_flagged, rollup_doc_id
+
+
+def log(i, second=0, port=443, score=0.05, flagged=False, src="10.0.0.1", transport="tcp"):
+    return {"@timestamp": f"2025-06-01T10:0{i % 2}:{second:02d}.000000123Z", "session.id": f"s{i}",
+            "source.ip": src, "destination.ip": "10.0.0.9", "network.transport": transport,
+            "destination.port": port, "session.iflow_bytes": 100, "session.iflow_pkts": 2,
+            "model_score": score, "RF_score": score, "predicted_anomaly": flagged}
+
+
+class TestRetention(unittest.TestCase):
+    def test_keeps_flagged_near_threshold_and_sample(self):
+        records = [log(0, flagged=True, score=0.9), log(1, score=0.4)] + [log(i) for i in range(2, 202)] + \
+                  [log(300, port=22, transport="udp")]
+        full, rollups, stats = apply_retention(records, near_threshold=0.3, sample_rate=0.0, sample_min=1)
+
+        reasons = sorted(row["retention_reason"] for row in full)
+        # One sampled row for each of the two strata (tcp/443 and udp/22)
+        self.assertEqual(reasons, ["flagged", "near_threshold", "sample", "sample"])
+        self.assertEqual(stats["rolled_up_rows"], 199)
+        self.assertEqual(sum(doc["log_count"] for doc in rollups), 199)
+        self.assertEqual(stats["docs_indexed"], len(full) + len(rollups))
+        self.assertEqual(stats["docs_saved"], len(records) - stats["docs_indexed"])
+        self.assertGreater(stats["bytes_saved"], 0)
+
+    def test_sampling_is_stable(self):
+        records = [log(i) for i in range(500)]
+        first, _, _ = apply_retention(records, sample_rate=0.1, sample_min=0)
+        second, _, _ = apply_retention(list(reversed(records)), sample_rate=0.1, sample_min=0)
+        self.assertEqual({r["session.id"] for r in first}, {r["session.id"] for r in second})
+        self.assertTrue(0 < len(first) < 150)
+
+    def test_rollups_per_minute_and_key(self):
+        rows = [log(0, 1, score=0.1), log(2, 30, score=0.3), log(1, 5), log(4, 10, src="10.0.0.2")]
+        docs = {(d["@timestamp"], d["source_ip"]): d for d in build_rollups(rows)}
+        self.assertEqual(set(docs), {("2025-06-01T10:00:00Z", "10.0.0.1"), ("2025-06-01T10:01:00Z", "10.0.0.1"),
+                                     ("2025-06-01T10:00:00Z", "10.0.0.2")})
+        doc = docs[("2025-06-01T10:00:00Z", "10.0.0.1")]
+        self.assertEqual((doc["log_count"], doc["bytes_sum"], doc["packets_sum"]), (2, 200, 4))
+        self.assertEqual((doc["destination_port"], doc["network_transport"]), (443, "tcp"))
+        self.assertAlmostEqual(doc["model_score_avg"], 0.2)
+        self.assertEqual((doc["model_score_min"], doc["model_score_max"]), (0.1, 0.3))
+        self.assertEqual(doc["first_seen"], "2025-06-01T10:00:01.000000123Z")
+        self.assertEqual(doc["last_seen"], "2025-06-01T10:00:30.000000123Z")
+        self.assertNotIn("XGB_score_avg", doc)
+
+    def test_majority_vote_without_flag_column(self):
+        self.assertTrue(is_flagged({"RF_pred": 1, "LOG_pred": 0, "XGB_pred": 1}))
+        self.assertFalse(is_flagged({"RF_pred": 1, "LOG_pred": 0, "XGB_pred": 0}))
+
+
+    def test_rollup_ids_are_deterministic_per_minute_and_key(self):
+        first = build_rollups([log(i, second=i) for i in range(0, 10, 2)])
+        second = build_rollups([log(i, second=i) for i in range(10, 20, 2)])
+        other_port = build_rollups([log(0, port=22)])
+        # Same minute and key in another batch: same document, merged by the upsert script
+        self.assertEqual(rollup_doc_id(first[0]), rollup_doc_id(second[0]))
+        self.assertNotEqual(rollup_doc_id(first[0]), rollup_doc_id(other_port[0]))
+
+        action = build_rollup_actions(first, "run-1", "network-anomalies-rollup-realtime")[0]
+        self.assertEqual((action["_op_type"], action["_id"]), ("update", rollup_doc_id(first[0])))
+        self.assertTrue(action["scripted_upsert"])
+        params = action["script"]["params"]
+        self.assertEqual((params["batch_id"], params["doc"]["log_count"]), ("run-1", 5))
+
+if __name__ == "__main__":
+    unittest.main()
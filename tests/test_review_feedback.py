@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.streamlit")))
+from core.feedback import build_feedback_actions, build_promotion_actions, submit_feedback, FeedbackWriter
+
+ITEMS = [("doc1", {"source_ip": "10.0.0.1", "_origin_index": "network-anomalies-all"}),
+         ("doc2", {"source_ip": "10.0.0.2", "_origin_index": "network-anomalies-all"})]
+NOW = "2025-06-01T10:00:00+00:00"
+
+
+class TestReviewFeedback(unittest.TestCase):
+    def test_feedback_actions_one_update_per_doc(self):
+        actions = build_feedback_actions(ITEMS, "network-anomalies", "correct", NOW)
+        self.assertEqual([a["_id"] for a in actions], ["doc1", "doc2"])
+        self.assertTrue(all(a["_op_type"] == "update" for a in actions))
+        self.assertEqual(actions[0]["doc"]["user_feedback"], "correct")
+        with self.assertRaises(ValueError):
+            build_feedback_actions(ITEMS, "network-anomalies", "suspicious", NOW)
+
+    def test_promotion_actions_are_index_update_pairs(self):
+        actions = build_promotion_actions(ITEMS, "network-anomalies", "network-anomalies-all", NOW)
+        self.assertEqual([a["_op_type"] for a in actions], ["index", "update", "index", "update"])
+        # App bookkeeping fields are not copied into the anomaly index
+        self.assertNotIn("_origin_index", actions[0]["_source"])
+        self.assertEqual(actions[1]["_id"], "doc1")
+
+    @patch("core.feedback.bulk")
+    def test_submit_feedback_single_bulk_and_failures(self, mock_bulk):
+        mock_bulk.return_value = (1, [{"update": {"_index": "network-anomalies", "_id": "doc2", "status": 404,
+                                                  "error": {"type": "document_missing_exception", "reason": "missing"}}}])
+        actions = build_feedback_actions(ITEMS, "network-anomalies", "incorrect", NOW)
+
+        result = submit_feedback(MagicMock(), actions, "Mark as normal")
+
+        mock_bulk.assert_called_once()
+        self.assertEqual(mock_bulk.call_args.kwargs["chunk_size"], len(actions))
+        self.assertEqual(result["succeeded"], 1)
+        self.assertEqual(result["failed"][0]["id"], "doc2")
+        self.assertEqual(result["failed"][0]["reason"], "missing")
+        self.assertGreaterEqual(result["latency_ms"], 0)
+
+    @patch("core.feedback.bulk")
+    def test_writer_runs_in_background(self, mock_bulk):
+        mock_bulk.return_value = (2, [])
+        writer = FeedbackWriter(MagicMock())
+
+        writer.submit(build_feedback_actions(ITEMS, "network-anomalies", "correct", NOW), "Mark as suspicious")
+        self.assertTrue(writer.flush(timeout=5))
+
+        results = writer.drain_results()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["doc_ids"], ["doc1", "doc2"])
+        self.assertIn("queue_wait_ms", results[0])
+        self.assertEqual(writer.drain_results(), [])
@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.streamlit")))
+from core.grouping import (build_group_aggregation, fetch_group_page, fetch_group_members,
+                           group_member_query, groups_from_hits, score_filter, log_table_rows, fetch_log)
+
+BASE_QUERY = {"bool": {"must": [{"term": {"user_feedback.keyword": "unknown"}}]}}
+MINUTE_MS = 1748772000000  # 2025-06-01T10:00:00Z
+
+
+def bucket(src, count, rf=0.8):
+    return {
+        "key": {"source_ip": src, "destination_ip": "10.0.0.9", "network_transport": None, "minute": MINUTE_MS},
+        "doc_count": count,
+        "RF": {"value": rf}, "ISO": {"value": 0.4}, "XGBoost": {"value": None}, "Logistic": {"value": 0.6},
+        "Model score": {"value": 0.7},
+        "first_seen": {"value": MINUTE_MS + 1000}, "last_seen": {"value": MINUTE_MS + 59000},
+    }
+
+
+class TestReviewGrouping(unittest.TestCase):
+    def test_aggregation_pages_with_after_key(self):
+        agg = build_group_aggregation(page_size=2, after_key={"source_ip": "10.0.0.1"})["groups"]
+        self.assertEqual(agg["composite"]["after"], {"source_ip": "10.0.0.1"})
+        self.assertEqual(list(agg["composite"]["sources"][-1]), ["minute"])
+        self.assertEqual(agg["aggs"]["RF"], {"avg": {"field": "RF_score", "missing": 0}})
+
+        es = MagicMock()
+        es.search.return_value = {"aggregations": {"groups": {
+            "after_key": {"source_ip": "10.0.0.2"}, "buckets": [bucket("10.0.0.1", 3), bucket("10.0.0.2", 1)]}}}
+        groups, after_key = fetch_group_page(es, "network-anomalies", BASE_QUERY, page_size=2)
+        self.assertEqual(es.search.call_args.kwargs["body"]["size"], 0)
+        self.assertEqual(after_key, {"source_ip": "10.0.0.2"})
+        self.assertEqual(groups[0]["minute"], datetime(2025, 6, 1, 10, 0))
+        self.assertEqual(groups[0]["count"], 3)
+        self.assertAlmostEqual(groups[0]["scores"]["Average of all"], (0.8 + 0.4 + 0 + 0.6) / 4)
+
+        # A short page is the last one
+        es.search.return_value["aggregations"]["groups"]["buckets"] = [bucket("10.0.0.3", 2)]
+        _, after_key = fetch_group_page(es, "network-anomalies", BASE_QUERY, page_size=2)
+        self.assertIsNone(after_key)
+
+    def test_members_fetched_for_one_group(self):
+        es = MagicMock()
+        es.search.return_value = {"hits": {"hits": [{"_id": "doc1", "_index": "network-anomalies", "_source": {"RF_score": 0.9}}]}}
+        group = {"source_ip": "10.0.0.1", "destination_ip": "10.0.0.9", "network_transport": None,
+                 "minute": datetime(2025, 6, 1, 10, 0)}
+
+        items = fetch_group_members(es, "network-anomalies", BASE_QUERY, group, size=25)
+
+        self.assertEqual(items, [("doc1", {"RF_score": 0.9, "_origin_index": "network-anomalies"})])
+        query = group_member_query(BASE_QUERY, group)
+        self.assertEqual(query["bool"]["must"], [BASE_QUERY])
+        self.assertIn({"term": {"source_ip.keyword": "10.0.0.1"}}, query["bool"]["filter"])
+        self.assertIn({"bool": {"must_not": {"exists": {"field": "network_transport.keyword"}}}}, query["bool"]["filter"])
+        self.assertEqual(query["bool"]["filter"][0]["range"]["@timestamp"],
+                         {"gte": "2025-06-01T10:00:00Z", "lt": "2025-06-01T10:01:00Z"})
+        self.assertEqual(es.search.call_args.kwargs["body"]["size"], 25)
+
+    def test_all_members_walk_past_the_search_window(self):
+        hits = [{"_id": f"doc{i}", "_index": "network-anomalies", "_source": {}, "sort": [i]} for i in range(2500)]
+        es = MagicMock()
+        es.open_point_in_time.return_value = {"id": "pit1"}
+
+        def search(**params):
+            start = params["search_after"][0] + 1 if "search_after" in params else 0
+            return {"pit_id": "pit1", "hits": {"hits": hits[start:start + params["size"]]}}
+        es.search.side_effect = search
+        group = {"source_ip": "10.0.0.1", "destination_ip": "10.0.0.9", "network_transport": "tcp",
+                 "minute": datetime(2025, 6, 1, 10, 0)}
+
+        items = fetch_group_members(es, "network-anomalies", BASE_QUERY, group)
+
+        self.assertEqual(len(items), 2500)
+        self.assertEqual(items[-1][0], "doc2499")
+        self.assertEqual(es.search.call_count, 3)
+        es.close_point_in_time.assert_called_once_with(id="pit1")
+
+    def test_score_filter_is_a_query_clause(self):
+        self.assertIsNone(score_filter("No filtering", 0.5))
+        self.assertEqual(score_filter("XGBoost", 0.7), {"range": {"XGB_score": {"gte": 0.7}}})
+        self.assertEqual(score_filter("Model score", 0.7), {"range": {"model_score": {"gte": 0.7}}})
+        script = score_filter("Average of all", 0.8)["script"]["script"]
+        self.assertEqual(script["params"], {"fields": ["RF_score", "isoforest_score", "XGB_score", "LOG_score"], "min_score": 0.8})
+
+    def test_compact_rows_and_full_log_on_request(self):
+        items = [("doc1", {"@timestamp": "2025-06-01T10:00:05Z", "source_ip": "10.0.0.1", "message": "x" * 500,
+                           "_origin_index": "network-anomalies-all"})]
+        rows = log_table_rows(items, "network-anomalies-all")
+        self.assertEqual(rows[0]["id"], "doc1")
+        self.assertEqual(rows[0]["status"], "Unflagged (evaluated)")
+        self.assertNotIn("message", rows[0])
+
+        es = MagicMock()
+        es.get.return_value = {"_source": {"message": "full"}}
+        self.assertEqual(fetch_log(es, "network-anomalies", "doc1"), {"message": "full"})
+        es.get.assert_called_once_with(index="network-anomalies", id="doc1")
+
+    def test_groups_from_hits(self):
+        hits = [
+            {"_id": "a", "_index": "network-anomalies", "_source": {
+                "@timestamp": "2025-06-01T10:00:05.123456789Z", "source_ip": "10.0.0.1", "RF_score": 0.5}},
+            {"_id": "b", "_index": "network-anomalies", "_source": {
+                "@timestamp": "2025-06-01T10:00:40.000000000Z", "source_ip": "10.0.0.1", "RF_score": "unknown"}},
+        ]
+        groups = groups_from_hits(hits)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0]["count"], 2)
+        self.assertEqual(groups[0]["minute"], datetime(2025, 6, 1, 10, 0))
+        self.assertEqual(groups[0]["scores"]["RF"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
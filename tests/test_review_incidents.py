@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.streamlit")))
+from core.incidents import build_incident_query, incident_member_query, submit_incident_feedback
+
+INCIDENT = {"signature": {"source_ip": "10.0.0.5", "destination_ip": "172.16.0.1", "network_transport": None},
+            "first_seen": "2025-06-01T10:00:00Z", "last_seen": "2025-06-01T11:30:00Z", "member_overflow": 4800,
+            "members": [{"index": "network-anomalies-realtime", "id": "a"}]}
+
+
+class FakeES:
+    def __init__(self):
+        self.by_query = []
+
+    def update_by_query(self, **params):
+        self.by_query.append(params)
+        return {"total": 5000, "updated": 5000, "failures": []}
+
+
+class TestReviewIncidents(unittest.TestCase):
+    def test_query_filters(self):
+        query = build_incident_query(datetime(2025, 6, 1), datetime(2025, 6, 2), only_unreviewed=True, min_score=0.8)
+        filters = query["query"]["bool"]["filter"]
+        self.assertIn({"term": {"reviewed": False}}, filters)
+        self.assertIn({"range": {"max_scores.model_score": {"gte": 0.8}}}, filters)
+        self.assertEqual(len(build_incident_query(datetime(2025, 6, 1), datetime(2025, 6, 2), False)["query"]["bool"]["filter"]), 2)
+
+    def test_member_query_matches_signature_and_time_range(self):
+        filters = incident_member_query(INCIDENT)["bool"]["filter"]
+        self.assertIn({"term": {"source_ip.keyword": "10.0.0.5"}}, filters)
+        # Missing signature values are exported as "unknown"
+        self.assertIn({"term": {"network_transport.keyword": "unknown"}}, filters)
+        self.assertIn({"range": {"@timestamp": {"gte": "2025-06-01T10:00:00Z", "lt": "2025-06-01T11:30:00Z||+1s"}}}, filters)
+
+    @patch("core.feedback.bulk")
+    def test_feedback_labels_incident_and_all_members(self, mock_bulk):
+        mock_bulk.return_value = (1, [])
+        es = FakeES()
+        result = submit_incident_feedback(es, "inc-1", INCIDENT, "incorrect", "2025-06-01T12:00:00", "test",
+                                          member_indexes=["network-anomalies", "network-anomalies-all"],
+                                          incident_index="network-incidents")
+        actions = mock_bulk.call_args.args[1]
+        self.assertEqual([(a["_index"], a["_id"], a["doc"]["alerts_since_review"]) for a in actions],
+                         [("network-incidents", "inc-1", 0)])
+        # One query labels the referenced members and the 4800 past the cap
+        call = es.by_query[0]
+        self.assertEqual(call["index"], "network-anomalies,network-anomalies-all")
+        self.assertEqual(call["script"]["params"], {"user_feedback": "incorrect", "feedback_time": "2025-06-01T12:00:00",
+                                                    "incident_id": "inc-1"})
+        self.assertEqual((result["items"], result["succeeded"], result["failed"]), (5001, 5001, []))
+        self.assertEqual(result["indexes"], ["network-anomalies", "network-anomalies-all", "network-incidents"])
+        with self.assertRaises(ValueError):
+            submit_incident_feedback(es, "inc-1", INCIDENT, "maybe", "2025-06-01T12:00:00", "test")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.streamlit")))
+from elasticsearch.exceptions import NotFoundError
+from core.pagination import LogPager, PagerCache
+
+
+class FakeES:
+    """Serves 23 hits sorted newest first and applies search_after like Elasticsearch."""
+
+    def __init__(self, n=23):
+        self.hits = [{"_id": f"doc{i}", "_index": "network-anomalies", "_source": {"n": i},
+                      "sort": [1000 - i, i]} for i in range(n)]
+        self.searches = []
+        self.opened, self.closed = 0, []
+        self.expire_next = False
+
+    def open_point_in_time(self, index, keep_alive):
+        self.opened += 1
+        return {"id": f"pit{self.opened}"}
+
+    def close_point_in_time(self, id):
+        self.closed.append(id)
+
+    def search(self, **params):
+        self.searches.append(params)
+        if self.expire_next:
+            self.expire_next = False
+            raise NotFoundError("search_context_missing_exception", meta=None, body={})
+        after = params.get("search_after")
+        hits = [h for h in self.hits if after is None or h["sort"] < after]
+        return {"pit_id": params["pit"]["id"], "hits": {"hits": hits[:params["size"]]}}
+
+
+class TestReviewPagination(unittest.TestCase):
+    def test_pages_forward_and_back_under_one_pit(self):
+        es = FakeES()
+        pager = LogPager(es, "network-anomalies", {"match_all": {}}, page_size=10)
+
+        self.assertEqual([h["_id"] for h in pager.page()][:2], ["doc0", "doc1"])
+        second = pager.next()
+        self.assertEqual(second[0]["_id"], "doc10")
+        third = pager.next()
+        self.assertEqual([h["_id"] for h in third], ["doc20", "doc21", "doc22"])
+        self.assertFalse(pager.has_next())
+        self.assertEqual(pager.previous()[0]["_id"], "doc10")
+
+        self.assertEqual(es.opened, 1)
+        self.assertEqual(es.searches[1]["search_after"], [991, 9])
+        self.assertEqual(es.searches[0]["sort"][1], {"_shard_doc": "desc"})
+        pager.close()
+        self.assertEqual(es.closed, ["pit1"])
+
+    def test_source_filtering(self):
+        es = FakeES()
+        pager = LogPager(es, "network-anomalies", {"match_all": {}}, page_size=10, prefetch=False,
+                         source_fields=["@timestamp", "source_ip"])
+        pager.page()
+        self.assertEqual(es.searches[0]["_source"], ["@timestamp", "source_ip"])
+        pager.close()
+
+    def test_next_page_is_prefetched(self):
+        es = FakeES()
+        pager = LogPager(es, "network-anomalies", {"match_all": {}}, page_size=10)
+        pager.page()
+        pager._next.result(timeout=5)
+        self.assertEqual(len(es.searches), 2)
+        pager.next()
+        # Moving on used the prefetched page and started fetching the one after it
+        pager._next.result(timeout=5)
+        self.assertEqual(len(es.searches), 3)
+        pager.close()
+
+    def test_history_is_bounded_and_expired_pit_reopened(self):
+        es = FakeES(n=60)
+        pager = LogPager(es, "network-anomalies", {"match_all": {}}, page_size=5, max_history=3, prefetch=False)
+        pager.page()
+        for _ in range(5):
+            pager.next()
+        self.assertEqual(len(pager._cursors), 3)
+        pager.previous()
+        pager.previous()
+        self.assertFalse(pager.has_previous())
+
+        es.expire_next = True
+        pager.next()
+        self.assertEqual(es.opened, 2)
+        self.assertEqual(pager.page()[0]["_id"], "doc20")
+        pager.close()
+
+    def test_pager_cache_closes_dropped_pagers(self):
+        es = FakeES()
+        cache = PagerCache(max_open=2)
+        pagers = []
+        for key in ("a", "b", "c"):
+            pagers.append(cache.get(key, lambda: LogPager(es, "network-anomalies", {"match_all": {}}, prefetch=False)))
+            pagers[-1].page()
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(pagers[0].pit_id)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(len(es.closed), 3)
+
+
+    def test_dropped_pager_resumes_on_its_page(self):
+        es = FakeES()
+        cache = PagerCache(max_open=2)
+        make = lambda: LogPager(es, "network-anomalies", {"match_all": {}}, page_size=5, prefetch=False)
+        first = cache.get("a", make)
+        first.page()
+        first.next()
+        # Four groups open on every rerun: "a" is dropped and its PIT closed each time
+        for _ in range(2):
+            for key in ("b", "c", "d", "a"):
+                cache.get(key, make).page()
+        pager = cache.get("a", make)
+        self.assertEqual(pager.page_number, 1)
+        self.assertEqual(pager.page()[0]["_id"], "doc5")
+        cache.clear()
+        self.assertEqual(es.opened, len(es.closed))
+
+
+if __name__ == "__main__":
+    unittest.main()
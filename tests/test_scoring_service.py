@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from sklearn.linear_model import LogisticRegression
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import ML_batch_scan as scan
+from feature_cache import encode_features
+from model_registry import ModelReloader
+from scoring_service import BatchScorer, make_server, score_remote
+
+
+def make_documents(n, offset=0):
+    return [{"_source": {
+        "@timestamp": f"2025-05-01T10:{(i // 20) % 60:02d}:00Z",
+        "source": {"ip": f"10.0.0.{i % 7}", "port": 40000 + i},
+        "destination": {"ip": "172.16.0.1", "port": 22 + i % 5},
+        "network": {"transport": "tcp"},
+        "event": {"action": "flow_started"},
+        "session": {"id": f"s{offset + i}", "iflow_bytes": 100 + 37 * i, "iflow_pkts": 1 + i % 4},
+    }} for i in range(n)]
+
+
+class TestScoringService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Small but real bundle so the full feature + encode + vote path runs offline
+        df = scan.prepare_features(scan.records_to_frame(make_documents(120)), verbose=False)
+        df[scan.ENCODER_INPUT_COLUMNS] = df[scan.ENCODER_INPUT_COLUMNS].astype(str)
+        X, encoder = encode_features(df, scan.ENCODER_INPUT_COLUMNS, scan.NUMERIC_COLUMNS)
+        y = (df["session.iflow_bytes"] > df["session.iflow_bytes"].median()).astype(int)
+        model = LogisticRegression(max_iter=500).fit(X, y)
+        cls.bundle = {"xgb": model, "encoder": encoder, "xgb_columns": list(X.columns), "rf": model, "log": model}
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        reloader = ModelReloader(lambda _: self.bundle, registry_dir=self.tmp.name, fallback=self.tmp.name)
+        self.scorer = BatchScorer(reloader, max_batch_rows=10000, max_wait_ms=50)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_results_follow_input_order_and_mark_dropped_rows(self):
+        documents = make_documents(30)
+        del documents[3]["_source"]["network"]
+        results = self.scorer.score(documents, timeout=30)
+        self.assertEqual(len(results), 30)
+        self.assertFalse(results[3]["scored"])
+        self.assertTrue(all(r["scored"] for i, r in enumerate(results) if i != 3))
+        self.assertIn("model_score", results[0])
+        self.assertEqual(results[0]["votes"], 3 * results[0]["RF_pred"])
+
+    def test_concurrent_requests_share_batches(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            outputs = list(pool.map(lambda i: self.scorer.score(make_documents(25, offset=i * 25), timeout=30), range(8)))
+        self.assertTrue(all(len(o) == 25 for o in outputs))
+        stats = self.scorer.stats.snapshot()
+        self.assertEqual(stats["requests"], 8)
+        self.assertLess(stats["batches"], 8)
+        self.assertIn("latency_p99_ms", stats)
+
+    def test_http_endpoints(self):
+        server = make_server(self.scorer, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            response = score_remote(make_documents(10), url=url)
+            self.assertEqual(len(response["results"]), 10)
+            from urllib.request import urlopen
+            with urlopen(f"{url}/stats") as r:
+                self.assertEqual(json.load(r)["requests"], 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
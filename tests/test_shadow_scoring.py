@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+from shadow_scoring import sample_positions, compare, run_shadow
+
+
+class TestShadowScoring(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = pd.DataFrame(rng.normal(size=(300, 3)), columns=["a", "b", "isoforest_score"])
+        y = (self.X["a"] > 0).astype(int)
+        self.df = pd.DataFrame({
+            "destination.port": [80] * 300,
+            "source.ip": ["1.1.1.1"] * 300,
+            "destination.ip": ["2.2.2.2"] * 300,
+            "RF_pred": y, "LOG_pred": y, "XGB_pred": y,
+        })
+        self.deployed_alerts = y.to_numpy().astype(bool)
+
+        self.tmp = tempfile.TemporaryDirectory()
+        model = LogisticRegression().fit(self.X, y)
+        joblib.dump(model, os.path.join(self.tmp.name, "random_forest_candidate.pkl"))
+        joblib.dump(model, os.path.join(self.tmp.name, "logistic_regression_candidate.pkl"))
+        joblib.dump({"model": model, "encoder": None, "columns": list(self.X.columns)},
+                    os.path.join(self.tmp.name, "xgboost_candidate.pkl"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_sample_positions_caps_rows(self):
+        self.assertEqual(len(sample_positions(50, 100)), 50)
+        positions = sample_positions(1000, 100)
+        self.assertEqual(len(positions), 100)
+        self.assertEqual(len(set(positions)), 100)
+
+    def test_compare_counts_alert_delta(self):
+        preds = pd.DataFrame({"RF_pred": [1, 0], "LOG_pred": [1, 0], "XGB_pred": [0, 0]})
+        metrics = compare(preds, preds, np.array([True, False]), np.array([True, True]))
+        self.assertEqual(metrics["agreement_rf"], 1.0)
+        self.assertEqual(metrics["agreement_vote"], 0.5)
+        self.assertEqual(metrics["alerts_delta"], 1)
+        self.assertEqual(metrics["alerts_only_candidate"], 1)
+
+    def test_run_shadow_writes_metrics_without_touching_batch(self):
+        metrics_file = os.path.join(self.tmp.name, "shadow.jsonl")
+        columns_before = list(self.df.columns)
+        record = run_shadow(self.df, self.X, self.deployed_alerts, self.tmp.name,
+                            max_rows=100, threads=1, metrics_file=metrics_file, es_index=None)
+
+        self.assertEqual(record["scored_rows"], 100)
+        self.assertTrue(record["sampled"])
+        self.assertGreater(record["agreement_vote"], 0.8)
+        self.assertEqual(list(self.df.columns), columns_before)
+        with open(metrics_file, encoding="utf-8") as f:
+            self.assertEqual(json.loads(f.readline())["batch_rows"], 300)
+
+    def test_run_shadow_skips_missing_bundle(self):
+        self.assertIsNone(run_shadow(self.df, self.X, self.deployed_alerts, os.path.join(self.tmp.name, "nope")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+import io
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import ML_batch_scan as scan
+from feature_cache import encode_features
+from stream_scorer import BatchSizer, ElasticsearchSink, END_OF_STREAM, poll_elasticsearch, read_stream, replay, run_stream
+
+
+def make_documents(n):
+    return [{
+        "@timestamp": f"2025-05-01T10:{(i // 20) % 60:02d}:00Z",
+        "source": {"ip": f"10.0.0.{i % 7}", "port": 40000 + i},
+        "destination": {"ip": "172.16.0.1", "port": 22 + i % 5},
+        "network": {"transport": "tcp"},
+        "event": {"action": "flow_started"},
+        "session": {"id": f"s{i}", "iflow_bytes": 100 + 37 * i, "iflow_pkts": 1 + i % 4},
+    } for i in range(n)]
+
+
+class ListSink:
+    def __init__(self):
+        self.rows = 0
+
+    def write(self, df_all, df_anomalies):
+        self.rows += len(df_all)
+
+
+class FixedBundle:
+    def __init__(self, bundle):
+        self.bundle = bundle
+
+    def get(self):
+        return self.bundle
+
+
+def replay_source(documents, eps):
+    source, stop = queue.Queue(), threading.Event()
+    threading.Thread(target=replay, args=(documents, source, stop, eps), daemon=True).start()
+    return source
+
+
+def millis(ts):
+    return int(pd.Timestamp(ts).timestamp() * 1000)
+
+
+class FakePitES:
+    """Logs sorted on (@timestamp, _shard_doc) behind a point in time, with search_after like Elasticsearch."""
+
+    def __init__(self, timestamps):
+        self.docs = []
+        for ts in timestamps:
+            self.add(ts)
+        self.closed = []
+
+    def add(self, ts):
+        i = len(self.docs)
+        # Elasticsearch sorts on the instant (epoch millis), whatever the string form
+        self.docs.append({"_id": f"doc{i}", "_source": {"@timestamp": ts}, "sort": [millis(ts), i]})
+
+    def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit"}
+
+    def close_point_in_time(self, id):
+        self.closed.append(id)
+
+    def search(self, **params):
+        time_range = params["query"]["range"]["@timestamp"]
+        gte = time_range["gte"] if time_range.get("format") == "epoch_millis" else millis(time_range["gte"])
+        after = params.get("search_after")
+        hits = [d for d in self.docs if d["sort"][0] >= gte and (after is None or d["sort"] > after)]
+        return {"pit_id": "pit", "hits": {"hits": hits[:params["size"]]}}
+
+
+def drain(source):
+    items = []
+    while not source.empty():
+        items.append(source.get())
+    return items
+
+
+class TestStreamScorer(unittest.TestCase):
+    def test_batch_sizer_fits_rows_in_budget(self):
+        sizer = BatchSizer(target_p99_s=2.0, max_wait_s=1.0, min_rows=10, max_rows=100000)
+        for rows in (100, 200, 400, 800):
+            sizer.observe(rows, 0.1 + rows * 0.001, [0.5])
+        max_wait, max_rows = sizer.limits()
+        self.assertLessEqual(max_wait, 0.5)
+        self.assertAlmostEqual(max_rows, (1.0 - max_wait - 0.1) / 0.001, delta=5)
+
+    def test_batch_sizer_shrinks_window_over_target(self):
+        sizer = BatchSizer(target_p99_s=1.0)
+        before = sizer.limits()[0]
+        sizer.observe(100, 0.5, [3.0] * 10)
+        self.assertLess(sizer.limits()[0], before)
+
+    def test_replay_at_fixed_rate_meets_latency_target(self):
+        def slow_score(documents, ingest_times, bundle):
+            time.sleep(0.01 + 0.0005 * len(documents))
+            return pd.DataFrame({"x": range(len(documents))}), pd.DataFrame()
+
+        sink = ListSink()
+        summary = run_stream(replay_source([{}] * 400, eps=400), sink, FixedBundle(None),
+                             BatchSizer(target_p99_s=0.5, max_wait_s=0.2), score=slow_score)
+        self.assertEqual(summary["events"], 400)
+        self.assertEqual(sink.rows, 400)
+        self.assertGreater(summary["batches"], 1)
+        self.assertLess(summary["latency_p99_s"], 0.5)
+
+    def test_replay_through_scan_path(self):
+        df = scan.prepare_features(pd.json_normalize(make_documents(120)), verbose=False)
+        df[scan.ENCODER_INPUT_COLUMNS] = df[scan.ENCODER_INPUT_COLUMNS].astype(str)
+        X, encoder = encode_features(df, scan.ENCODER_INPUT_COLUMNS, scan.NUMERIC_COLUMNS)
+        model = LogisticRegression(max_iter=500).fit(X, (df["session.iflow_pkts"] > 2).astype(int))
+        bundle = {"xgb": model, "encoder": encoder, "xgb_columns": list(X.columns), "rf": model, "log": model}
+
+        sink = ListSink()
+        summary = run_stream(replay_source(make_documents(150), eps=300), sink, FixedBundle(bundle),
+                             BatchSizer(target_p99_s=5.0, max_wait_s=0.2))
+        self.assertEqual(summary["events"], 150)
+        self.assertEqual(sink.rows, 150)
+
+
+    def test_malformed_lines_are_skipped(self):
+        source, stop = queue.Queue(), threading.Event()
+        read_stream(io.StringIO('{"a": 1}\nnot json\n[1, 2]\n{"b": 2}\n'), source, stop)
+        items = drain(source)
+        self.assertEqual([doc for doc, _ in items[:-1]], [{"a": 1}, {"b": 2}])
+        self.assertIs(items[-1], END_OF_STREAM)
+
+    def test_poll_gets_past_a_full_page_of_equal_timestamps(self):
+        es = FakePitES(["2025-05-01T10:00:00Z"] * 5 + ["2025-05-01T10:00:01Z"])
+        source, stop = queue.Queue(), threading.Event()
+        thread = threading.Thread(target=poll_elasticsearch, daemon=True,
+                                  args=(es, "logs-*", source, stop, 0.05, 2, "2025-05-01T10:00:00Z"))
+        thread.start()
+        time.sleep(0.2)
+        # Same instant as the cursor, written with fraction digits
+        es.add("2025-05-01T10:00:01.000Z")
+        time.sleep(0.2)
+        stop.set()
+        thread.join(timeout=2)
+        # Every document exactly once, also the one added at the cursor timestamp between polls
+        self.assertEqual(sorted(hit["_id"] for hit, _ in drain(source)), [f"doc{i}" for i in range(7)])
+        self.assertTrue(es.closed)
+
+    @patch("results_export.export_batch")
+    def test_es_sink_uses_the_export_path(self, export_batch):
+        df_all = pd.DataFrame({"@timestamp": ["2025-05-01T10:00:00Z"] * 2, "predicted_anomaly": [True, False],
+                               "_ingest_time": [1.0, 2.0], "_input_row": [0, 1]})
+        ElasticsearchSink(object()).write(df_all, df_all[df_all["predicted_anomaly"]])
+        _, records, full_records, batch_id = export_batch.call_args.args
+        self.assertEqual(len(records), 1)
+        self.assertEqual(full_records[1], {"@timestamp": "2025-05-01T10:00:00Z", "predicted_anomaly": False})
+        self.assertTrue(batch_id.startswith("stream-"))
+
+    @patch("results_export.export_batch")
+    def test_es_sink_retries_under_the_same_batch_id(self, export_batch):
+        export_batch.side_effect = [ConnectionError("es down"), ConnectionError("es down"), {"incidents": None}]
+        df_all = pd.DataFrame({"@timestamp": ["2025-05-01T10:00:00Z"], "predicted_anomaly": [False]})
+        ElasticsearchSink(object(), retries=3, backoff_s=0.001).write(df_all, df_all.iloc[:0])
+        batch_ids = {call.args[3] for call in export_batch.call_args_list}
+        self.assertEqual((export_batch.call_count, len(batch_ids)), (3, 1))
+
+    def test_failed_batches_go_to_the_dead_letter_file(self):
+        class FailingSink:
+            def write(self, df_all, df_anomalies):
+                raise ConnectionError("es down")
+
+        def fake_score(documents, ingest_times, bundle):
+            return pd.DataFrame({"x": range(len(documents))}), pd.DataFrame()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            dead_letter = os.path.join(tmp, "dead_letter.ndjson")
+            summary = run_stream(replay_source(make_documents(30), eps=1000), FailingSink(), FixedBundle(None),
+                                 score=fake_score, dead_letter=dead_letter)
+            with open(dead_letter, encoding="utf-8") as f:
+                spilled = [line for line in f if line.strip()]
+        self.assertEqual((summary["events"], summary["failed_events"]), (0, 30))
+        self.assertEqual(len(spilled), 30)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+import os
+import sys
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+from training_scheduler import allocate_threads, run_fits
+
+
+class TestTrainingScheduler(unittest.TestCase):
+    def test_allocation_stays_within_budget(self):
+        names = ["random_forest", "logistic_regression", "xgboost"]
+        for budget in [1, 2, 3, 4, 8, 16]:
+            threads = allocate_threads(names, budget)
+            self.assertTrue(all(n >= 1 for n in threads.values()))
+            self.assertLessEqual(sum(threads.values()), max(budget, len(names)))
+        threads = allocate_threads(names, 10)
+        self.assertGreater(threads["random_forest"], threads["logistic_regression"])
+
+    def test_run_fits_returns_models_and_stats(self):
+        X, y = make_classification(n_samples=200, n_features=10, random_state=42)
+        jobs = {
+            "random_forest": {"model": RandomForestClassifier(n_estimators=10, random_state=42), "X": X, "y": y},
+            "logistic_regression": {"model": LogisticRegression(max_iter=500), "X": X, "y": y},
+        }
+
+        models, stats = run_fits(jobs, budget=2)
+
+        self.assertEqual(set(models), {"random_forest", "logistic_regression"})
+        self.assertEqual(models["random_forest"].predict(X).shape, (200,))
+        # Thread count used for fitting is not kept on the saved model
+        self.assertIsNone(models["random_forest"].n_jobs)
+        for model_stats in stats["models"].values():
+            self.assertGreaterEqual(model_stats["fit_seconds"], 0)
+            self.assertIn("process_peak_rss_mb", model_stats)